@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK DA MIGRAÇÃO ZODB → POSTGRESQL
+Gera FileStorages sintéticos e mede cada estratégia do migrate_zodb.py
+(transações/s, MB/s e pico de memória do maior processo) contra um PostgreSQL local
+"""
+import sys
+import os
+import json
+import time
+import random
+import logging
+import argparse
+import resource
+import platform
+from importlib import metadata
+from concurrent.futures import ProcessPoolExecutor
+
+import transaction
+import ZODB
+from ZODB.FileStorage import FileStorage
+from BTrees.IOBTree import IOBTree
+from persistent.mapping import PersistentMapping
+
+import migrate_zodb
+
+logger = logging.getLogger(__name__)
+
+# Banco descartável: o benchmark apaga e recria este banco a cada estratégia
+BANCO_BENCHMARK = 'zodb_benchmark'
+
+ESTRATEGIAS = {
+    'padrao': lambda fs, banco, op: migrate_zodb.migrar_com_keep_history_true('main', fs, banco),
+    'lotes': lambda fs, banco, op: migrate_zodb.migrar_em_lotes('main', fs, banco),
+    'zodbconvert': lambda fs, banco, op: migrate_zodb.usar_zodbconvert('main', fs, banco),
+    'paralelo': lambda fs, banco, op: migrate_zodb.migrar_paralelo('main', fs, banco, workers=op.workers),
+    'retomavel': lambda fs, banco, op: migrate_zodb.migrar_retomavel(
+        'main', fs, banco, intervalo_checkpoint=op.intervalo_checkpoint),
+    'bulk': lambda fs, banco, op: migrate_zodb.migrar_bulk(
+        'main', fs, banco, tamanho_lote_mb=op.lote_mb),
+    'sem_historico': lambda fs, banco, op: migrate_zodb.migrar_sem_historico(
+        'main', fs, banco, tamanho_lote_mb=op.lote_mb),
+}
+
+def gerar_filestorage(caminho, tamanho_mb, objetos,
+                      objetos_por_transacao=100, proporcao_alteracoes=0.2, semente=0):
+    """Criar um FileStorage sintético com o tamanho e o número de objetos pedidos
+
+    Os objetos ficam numa IOBTree na raiz (todos alcançáveis). Depois da carga,
+    uma fração deles é regravada em transações separadas, gerando histórico.
+    Sem blobs: nenhuma estratégia copia registros de blob da origem.
+    """
+    for sufixo in ('', '.index', '.lock', '.tmp', '.old'):
+        if os.path.exists(caminho + sufixo):
+            os.remove(caminho + sufixo)
+
+    aleatorio = random.Random(semente)
+    tamanho_objeto = max(1, int(tamanho_mb * 1024 * 1024 / max(1, objetos) / (1 + proporcao_alteracoes)))
+
+    db = ZODB.DB(FileStorage(caminho))
+    try:
+        conn = db.open()
+        root = conn.root()
+        root['objetos'] = arvore = IOBTree()
+        transaction.commit()
+
+        for inicio in range(0, objetos, objetos_por_transacao):
+            for i in range(inicio, min(objetos, inicio + objetos_por_transacao)):
+                arvore[i] = PersistentMapping(dados=aleatorio.randbytes(tamanho_objeto))
+            transaction.get().note(f"carga {inicio}")
+            transaction.commit()
+
+        alterados = aleatorio.sample(range(objetos), int(objetos * proporcao_alteracoes))
+        for inicio in range(0, len(alterados), objetos_por_transacao):
+            for i in alterados[inicio:inicio + objetos_por_transacao]:
+                arvore[i]['dados'] = aleatorio.randbytes(tamanho_objeto)
+            transaction.get().note(f"alteração {inicio}")
+            transaction.commit()
+        conn.close()
+    finally:
+        db.close()
+
+def rss_maximo_mb():
+    """Pico de memória residente do maior processo: este ou um filho já encerrado (MB)
+
+    RUSAGE_CHILDREN dá o pico do maior filho, não a soma: no modo paralelo
+    não é o total dos workers somados.
+    """
+    proprio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    filhos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss: KB no Linux, bytes no macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return max(proprio, filhos) / divisor
+
+def executar_estrategia(estrategia, fs_caminho, postgres_config, relstorage_config, opcoes):
+    """Executar uma estratégia num processo novo (para medir o pico de memória isolado)"""
+    migrate_zodb.POSTGRES_CONFIG.update(postgres_config)
+    migrate_zodb.RELSTORAGE_MIGRACAO.update(relstorage_config)
+    if not migrate_zodb.limpar_bancos_completamente([BANCO_BENCHMARK]):
+        return {'sucesso': False, 'segundos': 0.0, 'rss_maior_processo_mb': rss_maximo_mb()}
+
+    start_time = time.time()
+    try:
+        sucesso = bool(ESTRATEGIAS[estrategia](fs_caminho, BANCO_BENCHMARK, opcoes))
+    except Exception as e:
+        logger.error(f"✗ {estrategia}: {e}")
+        sucesso = False
+    return {
+        'sucesso': sucesso,
+        'segundos': time.time() - start_time,
+        'rss_maior_processo_mb': rss_maximo_mb(),
+    }
+
+def medir(estrategia, fs_caminho, resumo, relstorage_config, opcoes):
+    """Métricas de uma estratégia sobre um FileStorage"""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        resultado = executor.submit(
+            executar_estrategia, estrategia, fs_caminho,
+            dict(migrate_zodb.POSTGRES_CONFIG), relstorage_config, opcoes).result()
+
+    segundos = resultado['segundos']
+    megabytes = resumo.tamanho / 1024 / 1024
+    return {
+        'estrategia': estrategia,
+        'sucesso': resultado['sucesso'],
+        'segundos': round(segundos, 3),
+        'transacoes': resumo.transacoes,
+        'megabytes': round(megabytes, 2),
+        'transacoes_por_segundo': round(resumo.transacoes / segundos, 1) if segundos else None,
+        'mb_por_segundo': round(megabytes / segundos, 2) if segundos else None,
+        'rss_maior_processo_mb': round(resultado['rss_maior_processo_mb'], 1),
+    }
+
+def versoes():
+    """Versões relevantes para comparar resultados entre releases"""
+    pacotes = {}
+    for pacote in ('ZODB', 'RelStorage'):
+        try:
+            pacotes[pacote] = metadata.version(pacote)
+        except metadata.PackageNotFoundError:
+            pacotes[pacote] = None
+    pacotes['psycopg2'] = migrate_zodb.psycopg2.__version__.split()[0]
+    pacotes['python'] = platform.python_version()
+    return pacotes
+
+def parse_args(argv=None):
+    """Opções de linha de comando"""
+    parser = argparse.ArgumentParser(description="Benchmark das estratégias de migração ZODB → PostgreSQL")
+    parser.add_argument('--estrategias', nargs='+', choices=list(ESTRATEGIAS),
+                        default=['padrao', 'paralelo', 'retomavel', 'bulk', 'sem_historico'],
+                        help="Estratégias a medir (padrão: todas, exceto lotes e zodbconvert)")
+    parser.add_argument('--tamanho-mb', type=float, default=50, help="Tamanho aproximado do FileStorage")
+    parser.add_argument('--objetos', type=int, default=10000, help="Número de objetos")
+    parser.add_argument('--objetos-por-transacao', type=int, default=100)
+    parser.add_argument('--proporcao-alteracoes', type=float, default=0.2,
+                        help="Fração dos objetos regravados depois da carga (histórico)")
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--arquivo', default='/tmp/benchmark_migracao.fs',
+                        help="FileStorage sintético (reaproveitado com --reusar)")
+    parser.add_argument('--reusar', action='store_true',
+                        help="Não gerar o FileStorage de novo se o arquivo já existir")
+    parser.add_argument('--repeticoes', type=int, default=1, help="Execuções por estratégia")
+    parser.add_argument('--host', default=None,
+                        help="Host (ou diretório do socket) do PostgreSQL local de teste")
+    parser.add_argument('--port', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None, help="Processos no modo paralelo")
+    parser.add_argument('--intervalo-checkpoint', type=int, default=500, help="Modo retomável")
+    parser.add_argument('--lote-mb', type=int, default=64, help="Modos bulk e sem_historico")
+    parser.add_argument('--cache-local-mb', type=int, default=None)
+    parser.add_argument('--commit-lock-timeout', type=int, default=None)
+    parser.add_argument('--saida', default=None,
+                        help="Acrescentar os resultados (JSON, uma linha por medição) neste arquivo")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    opcoes = parse_args(argv)
+    if opcoes.host:
+        migrate_zodb.POSTGRES_CONFIG['host'] = opcoes.host
+    if opcoes.port:
+        migrate_zodb.POSTGRES_CONFIG['port'] = opcoes.port
+
+    relstorage_config = dict(migrate_zodb.RELSTORAGE_MIGRACAO)
+    if opcoes.cache_local_mb is not None:
+        relstorage_config['cache_local_mb'] = opcoes.cache_local_mb
+    if opcoes.commit_lock_timeout is not None:
+        relstorage_config['commit_lock_timeout'] = opcoes.commit_lock_timeout
+
+    if not (opcoes.reusar and os.path.exists(opcoes.arquivo)):
+        logger.info(f"Gerando {opcoes.arquivo}: ~{opcoes.tamanho_mb} MB, {opcoes.objetos:,} objetos")
+        gerar_filestorage(opcoes.arquivo, opcoes.tamanho_mb, opcoes.objetos,
+                          opcoes.objetos_por_transacao, opcoes.proporcao_alteracoes, opcoes.semente)
+    resumo = migrate_zodb.escanear_filestorage(opcoes.arquivo)
+    logger.info(f"FileStorage: {resumo.tamanho / 1024 / 1024:.1f} MB, {resumo.transacoes:,} transações, "
+                f"{resumo.registros:,} registros")
+
+    parametros = {
+        'tamanho_mb': opcoes.tamanho_mb,
+        'objetos': opcoes.objetos,
+        'objetos_por_transacao': opcoes.objetos_por_transacao,
+        'proporcao_alteracoes': opcoes.proporcao_alteracoes,
+        'workers': opcoes.workers,
+        'intervalo_checkpoint': opcoes.intervalo_checkpoint,
+        'lote_mb': opcoes.lote_mb,
+        **relstorage_config,
+    }
+    ambiente = versoes()
+
+    resultados = []
+    for estrategia in opcoes.estrategias:
+        for repeticao in range(1, opcoes.repeticoes + 1):
+            logger.info(f"\n>>> {estrategia} ({repeticao}/{opcoes.repeticoes})")
+            medicao = medir(estrategia, opcoes.arquivo, resumo, relstorage_config, opcoes)
+            medicao.update(repeticao=repeticao, parametros=parametros, versoes=ambiente,
+                           data=time.strftime('%Y-%m-%dT%H:%M:%S'))
+            resultados.append(medicao)
+            if opcoes.saida:
+                with open(opcoes.saida, 'a') as saida:
+                    saida.write(json.dumps(medicao) + '\n')
+
+    print("\n" + "=" * 86)
+    print(f"{'ESTRATÉGIA':<15}{'OK':<5}{'SEGUNDOS':>10}{'TRANS/S':>12}{'MB/S':>10}{'RSS MAIOR PROC. MB':>20}")
+    print("=" * 86)
+    for medicao in resultados:
+        print(f"{medicao['estrategia']:<15}{'✓' if medicao['sucesso'] else '✗':<5}"
+              f"{medicao['segundos']:>10.2f}{medicao['transacoes_por_segundo'] or 0:>12.1f}"
+              f"{medicao['mb_por_segundo'] or 0:>10.2f}{medicao['rss_maior_processo_mb']:>20.1f}")
+
+    return all(medicao['sucesso'] for medicao in resultados)
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -10,9 +10,28 @@ import psycopg2
 import getpass
 import time
 import subprocess
-from ZODB.FileStorage import FileStorage
+import hashlib
+import io
+import struct
+import pickle
+import pickletools
+import mmap
+import random
+import argparse
+import bisect
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from psycopg2.extras import execute_values
+from ZODB.FileStorage import FileStorage, FileIterator
+from ZODB.FileStorage.format import (
+    TxnHeaderFromString, DataHeaderFromString, TRANS_HDR, TRANS_HDR_LEN, DATA_HDR, DATA_HDR_LEN)
+from ZODB.fsIndex import fsIndex
+from ZODB.utils import u64, p64, z64, get_pickle_metadata
+from ZODB.serialize import referencesf
+from ZODB.POSException import POSKeyError
+from ZODB.blob import is_blob_record, FilesystemHelper
 from relstorage.storage import RelStorage
 from relstorage.adapters.postgresql import PostgreSQLAdapter
+from relstorage.options import Options
 import ZODB
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -27,7 +46,48 @@ POSTGRES_CONFIG = {
     'zodbuser_password': 'openlegis'
 }
 
-def limpar_bancos_completamente():
+# Opções do RelStorage de destino durante a cópia (ajustáveis pelo benchmark_migracao.py)
+RELSTORAGE_MIGRACAO = {
+    'cache_local_mb': 100,
+    'commit_lock_timeout': 60,
+}
+
+# Tabelas auxiliares (UNLOGGED) usadas pela cópia paralela
+STAGING_TRANSACTION = 'migracao_transaction'
+STAGING_OBJECT_STATE = 'migracao_object_state'
+
+# Bancos configurados com keep-history false (ver zodbpack.conf)
+BANCOS_SEM_HISTORICO = ('sapl_documentos',)
+
+# Conteúdo de Files/Images grandes movido para blobs na migração sem histórico (--blobs)
+CLASSES_ARQUIVO = {
+    ('OFS.Image', 'File'),
+    ('OFS.Image', 'Image'),
+    ('Products.CMFDefault.File', 'File'),
+    ('Products.CMFDefault.Image', 'Image'),
+}
+CLASSE_PDATA = ('OFS.Image', 'Pdata')
+CLASSE_PDATA_BLOB = ('Products.CMFDefault.BlobPdata', 'BlobPdata')
+REGISTRO_BLOB = b'\x80\x03cZODB.blob\nBlob\nq\x00.\x80\x03N.'
+
+# Marca d'água da migração retomável (último tid gravado por FileStorage)
+CHECKPOINT_TABLE = 'migracao_checkpoint'
+
+def montar_dsn(banco_destino):
+    """DSN do RelStorage para o banco de destino"""
+    return f"dbname='{banco_destino}' user='{POSTGRES_CONFIG['zodbuser']}' host='{POSTGRES_CONFIG['host']}' port='{POSTGRES_CONFIG['port']}' password='{POSTGRES_CONFIG['zodbuser_password']}'"
+
+def conectar_destino(banco_destino):
+    """Conexão psycopg2 direta no banco de destino (usuário do ZODB)"""
+    return psycopg2.connect(
+        host=POSTGRES_CONFIG['host'],
+        port=POSTGRES_CONFIG['port'],
+        user=POSTGRES_CONFIG['zodbuser'],
+        password=POSTGRES_CONFIG['zodbuser_password'],
+        database=banco_destino
+    )
+
+def limpar_bancos_completamente(bancos=None):
     """Limpar completamente os bancos PostgreSQL"""
     try:
         conn_params = {
@@ -44,7 +104,7 @@ def limpar_bancos_completamente():
         conn.autocommit = True
         cursor = conn.cursor()
         
-        bancos = ['zodb', 'sapl_documentos']
+        bancos = bancos or ['zodb', 'sapl_documentos']
         
         for banco in bancos:
             logger.info(f"Limpando banco {banco}...")
@@ -141,8 +201,244 @@ def limpar_bancos_completamente():
         logger.error(f"✗ Erro limpeza bancos: {e}")
         return False
 
-def verificar_filestorage(fs_path):
-    """Verificar integridade do FileStorage"""
+def bancos_inexistentes(bancos):
+    """Bancos da lista que ainda não existem no PostgreSQL"""
+    conn_params = {
+        'host': POSTGRES_CONFIG['host'],
+        'port': POSTGRES_CONFIG['port'],
+        'user': POSTGRES_CONFIG['superuser'],
+        'database': 'postgres'
+    }
+    if POSTGRES_CONFIG['superuser_password']:
+        conn_params['password'] = POSTGRES_CONFIG['superuser_password']
+
+    conn = psycopg2.connect(**conn_params)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT datname FROM pg_database WHERE datname = ANY(%s)", (list(bancos),))
+        existentes = {linha[0] for linha in cursor.fetchall()}
+    finally:
+        conn.close()
+    return [banco for banco in bancos if banco not in existentes]
+
+def criar_bancos_inexistentes(bancos):
+    """Criar (vazios) os bancos da lista que ainda não existem, sem tocar nos demais"""
+    faltando = bancos_inexistentes(bancos)
+    if not faltando:
+        return True
+    logger.info(f"Bancos ainda não criados: {', '.join(faltando)}")
+    return limpar_bancos_completamente(faltando)
+
+class ResumoFileStorage:
+    """Resultado da passada única pelo FileStorage (ver escanear_filestorage)"""
+
+    def __init__(self, fs_caminho, tamanho):
+        self.fs_caminho = fs_caminho
+        self.tamanho = tamanho
+        self.transacoes = 0
+        self.registros = 0
+        self.objetos = None    # Objetos distintos, segundo o .index (se atualizado)
+        self.tids = []         # tid de cada transação, em ordem
+        self.posicoes = []     # Posição inicial de cada transação no arquivo
+        self.fim = 4           # Posição logo após a última transação
+
+    def bytes_ate(self, tid):
+        """Bytes do arquivo ocupados pelas transações com tid <= tid"""
+        indice = bisect.bisect_right(self.tids, tid)
+        if indice >= len(self.posicoes):
+            return self.fim - 4
+        return self.posicoes[indice] - 4
+
+_resumos = {}
+
+def escanear_filestorage(fs_caminho):
+    """Contar transações, registros e posições do FileStorage em uma única passada
+
+    Lê apenas os cabeçalhos de transação e de dados (sem os pickles). O número
+    de objetos vem do arquivo .index quando ele corresponde ao arquivo atual.
+    O resultado fica em cache enquanto o arquivo não mudar.
+    """
+    stat = os.stat(fs_caminho)
+    chave = (fs_caminho, stat.st_size, stat.st_mtime)
+    if chave in _resumos:
+        return _resumos[chave]
+
+    resumo = ResumoFileStorage(fs_caminho, stat.st_size)
+    with open(fs_caminho, 'rb') as f:
+        pos = 4
+        f.seek(pos)
+        while pos + TRANS_HDR_LEN <= resumo.tamanho:
+            th = TxnHeaderFromString(f.read(TRANS_HDR_LEN))
+            tend = pos + th.tlen
+            if th.status == 'c' or tend + 8 > resumo.tamanho:
+                # Transação em andamento ou arquivo truncado
+                break
+
+            if th.status != 'u':
+                resumo.tids.append(u64(th.tid))
+                resumo.posicoes.append(pos)
+                resumo.transacoes += 1
+
+            dpos = pos + th.headerlen()
+            while dpos < tend:
+                f.seek(dpos)
+                dh = DataHeaderFromString(f.read(DATA_HDR_LEN))
+                dpos += dh.recordlen()
+                resumo.registros += 1
+
+            pos = tend + 8
+            f.seek(pos)
+            if resumo.transacoes % 50000 == 0 and resumo.transacoes:
+                logger.info(f"  Transações lidas: {resumo.transacoes:,} "
+                            f"({pos/resumo.tamanho*100:.1f}%)")
+        resumo.fim = pos
+
+    index_caminho = fs_caminho + '.index'
+    if os.path.exists(index_caminho):
+        try:
+            info = fsIndex.load(index_caminho)
+            if isinstance(info, dict) and info.get('pos') == resumo.fim:
+                resumo.objetos = len(info['index'])
+        except Exception as e:
+            logger.debug(f"  Índice {index_caminho} ignorado: {e}")
+
+    _resumos[chave] = resumo
+    return resumo
+
+class ErroIntegridade(Exception):
+    """Registro inválido no FileStorage, com a posição (offset) em que foi encontrado"""
+
+    def __init__(self, pos, mensagem):
+        super().__init__(f"offset {pos:,}: {mensagem}")
+        self.pos = pos
+        self.mensagem = mensagem
+
+def encadear_transacoes(mapa, tamanho):
+    """Percorrer a cadeia de cabeçalhos de transação (sem os registros de dados)
+
+    Retorna (posições das transações, fim da última transação completa,
+    erro ou None). Uma transação com status 'c' no fim do arquivo é a que
+    estava sendo gravada e não conta como erro.
+    """
+    posicoes = []
+    ultimo_tid = b''
+    pos = 4
+    while pos < tamanho:
+        if pos + TRANS_HDR_LEN > tamanho:
+            return posicoes, pos, ErroIntegridade(pos, "cabeçalho de transação truncado")
+        tid, tlen, status, ulen, dlen, elen = struct.unpack_from(TRANS_HDR, mapa, pos)
+        if status == b'c':
+            if pos + tlen + 8 < tamanho:
+                return posicoes, pos, ErroIntegridade(pos, "transação em andamento (status 'c') antes do fim do arquivo")
+            break
+        if status not in b' pu':
+            return posicoes, pos, ErroIntegridade(pos, f"status de transação inválido {status!r}")
+        if tlen < TRANS_HDR_LEN + ulen + dlen + elen:
+            return posicoes, pos, ErroIntegridade(pos, f"tamanho de transação {tlen} menor que o cabeçalho")
+        if pos + tlen + 8 > tamanho:
+            return posicoes, pos, ErroIntegridade(pos, f"transação truncada (tamanho {tlen}, arquivo termina em {tamanho:,})")
+        if struct.unpack_from('>Q', mapa, pos + tlen)[0] != tlen:
+            return posicoes, pos, ErroIntegridade(pos + tlen, "tamanho redundante no fim da transação não confere")
+        if tid <= ultimo_tid:
+            return posicoes, pos, ErroIntegridade(pos, f"tid {u64(tid)} não é maior que o anterior {u64(ultimo_tid)}")
+        ultimo_tid = tid
+        posicoes.append(pos)
+        pos += tlen + 8
+    return posicoes, pos, None
+
+def validar_registro_anterior(mapa, pos_referencia, ref, oid, descricao):
+    """Conferir se um ponteiro (prev ou backpointer) aponta para um registro do mesmo oid"""
+    if ref < 4 or ref >= pos_referencia:
+        raise ErroIntegridade(pos_referencia, f"{descricao} {ref} fora do intervalo válido")
+    if struct.unpack_from('>8s', mapa, ref)[0] != oid:
+        raise ErroIntegridade(pos_referencia, f"{descricao} {ref} aponta para outro objeto")
+
+def validar_transacoes(fs_caminho, pos_inicio, pos_fim):
+    """Worker: validar os registros de dados das transações em [pos_inicio, pos_fim)
+
+    Retorna (transações, registros, erro ou None).
+    """
+    transacoes = 0
+    registros = 0
+    with open(fs_caminho, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+        pos = pos_inicio
+        try:
+            while pos < pos_fim:
+                tid, tlen, status, ulen, dlen, elen = struct.unpack_from(TRANS_HDR, mapa, pos)
+                tend = pos + tlen
+                dpos = pos + TRANS_HDR_LEN + ulen + dlen + elen
+                while dpos < tend:
+                    if dpos + DATA_HDR_LEN > tend:
+                        raise ErroIntegridade(dpos, "cabeçalho de dados ultrapassa o fim da transação")
+                    oid, dtid, prev, tloc, vlen, plen = struct.unpack_from(DATA_HDR, mapa, dpos)
+                    if dtid != tid:
+                        raise ErroIntegridade(dpos, f"tid do registro {u64(dtid)} difere do da transação {u64(tid)}")
+                    if tloc != pos:
+                        raise ErroIntegridade(dpos, f"posição da transação no registro ({tloc}) difere de {pos}")
+                    if vlen:
+                        raise ErroIntegridade(dpos, "registro com versão (não suportado)")
+                    if prev:
+                        validar_registro_anterior(mapa, dpos, prev, oid, "prev")
+                    tamanho_registro = DATA_HDR_LEN + (plen or 8)
+                    if dpos + tamanho_registro > tend:
+                        raise ErroIntegridade(dpos, f"registro de {plen} bytes ultrapassa o fim da transação")
+                    if not plen:
+                        backpointer = struct.unpack_from('>Q', mapa, dpos + DATA_HDR_LEN)[0]
+                        if backpointer:
+                            validar_registro_anterior(mapa, dpos, backpointer, oid, "backpointer")
+                    dpos += tamanho_registro
+                    registros += 1
+                if dpos != tend:
+                    raise ErroIntegridade(pos, "registros de dados não preenchem a transação")
+                transacoes += 1
+                pos = tend + 8
+        except ErroIntegridade as e:
+            return transacoes, registros, (e.pos, e.mensagem)
+    return transacoes, registros, None
+
+def verificar_integridade(fs_caminho, workers=None):
+    """Validar cabeçalhos, tamanhos e ponteiros de todo o FileStorage
+
+    A cadeia de transações é percorrida só pelos cabeçalhos; os registros de
+    dados são validados em paralelo, em trechos de tamanho semelhante, com o
+    arquivo mapeado em memória. Retorna (transações, registros, erro), onde
+    erro é o primeiro ErroIntegridade encontrado (menor offset) ou None.
+    """
+    tamanho = os.path.getsize(fs_caminho)
+    with open(fs_caminho, 'rb') as f:
+        magica = f.read(4)
+        if magica not in (b'FS21', b'FS30'):
+            return 0, 0, ErroIntegridade(0, f"assinatura de FileStorage inválida {magica!r}")
+        if tamanho == 4:
+            return 0, 0, None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            posicoes, fim, erro = encadear_transacoes(mapa, tamanho)
+
+    workers = workers or os.cpu_count() or 1
+    num_trechos = min(len(posicoes), workers * 4)
+    trechos = []
+    if num_trechos:
+        alvo = (fim - 4) / num_trechos
+        limites = [posicoes[bisect.bisect_right(posicoes, 4 + int(alvo * i)) - 1] for i in range(num_trechos)]
+        limites = sorted(set(limites)) + [fim]
+        trechos = list(zip(limites[:-1], limites[1:]))
+
+    transacoes = 0
+    registros = 0
+    erros = [erro] if erro else []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futuros = [executor.submit(validar_transacoes, fs_caminho, inicio, fim_trecho)
+                   for inicio, fim_trecho in trechos]
+        for futuro in futuros:
+            num_transacoes, num_registros, erro_trecho = futuro.result()
+            transacoes += num_transacoes
+            registros += num_registros
+            if erro_trecho:
+                erros.append(ErroIntegridade(*erro_trecho))
+    return transacoes, registros, min(erros, key=lambda e: e.pos) if erros else None
+
+def verificar_filestorage(fs_path, workers=None):
+    """Verificar integridade do FileStorage (ver verificar_integridade)"""
     logger.info(f"Verificando {fs_path}...")
     
     try:
@@ -153,25 +449,104 @@ def verificar_filestorage(fs_path):
         tamanho = os.path.getsize(fs_path)
         logger.info(f"  Tamanho: {tamanho/1024/1024:.2f} MB")
         
-        # Testar abertura básica
-        fs = FileStorage(fs_path, read_only=True)
-        
-        # Verificar se tem transações
-        txn_count = 0
-        for _ in fs.iterator():
-            txn_count += 1
-            if txn_count % 1000 == 0:
-                logger.info(f"  Transações verificadas: {txn_count}")
-        
-        fs.close()
+        start_time = time.time()
+        transacoes, registros, erro = verificar_integridade(fs_path, workers)
+        if erro:
+            logger.error(f"✗ FileStorage corrompido no offset {erro.pos:,}: {erro.mensagem}")
+            logger.error(f"  {transacoes:,} transações validadas nos demais trechos")
+            return False
         
-        logger.info(f"✓ FileStorage OK: {txn_count} transações")
+        logger.info(f"✓ FileStorage OK: {transacoes:,} transações, "
+                    f"{registros:,} registros ({time.time() - start_time:.2f}s)")
         return True
         
     except Exception as e:
         logger.error(f"✗ Erro verificação: {e}")
         return False
 
+class Progresso:
+    """Progresso da cópia medido em bytes do FileStorage, com velocidade e ETA"""
+
+    def __init__(self, total_bytes, total_transacoes=0, bytes_iniciais=0):
+        self.total_bytes = total_bytes
+        self.total_transacoes = total_transacoes
+        self.bytes_iniciais = bytes_iniciais
+        self.bytes_processados = bytes_iniciais
+        self.processadas = 0
+        self.inicio = time.time()
+        self.ultimo_log = time.time()
+
+    def callback(self, bytes_transacao=0):
+        self.avancar(1, bytes_transacao)
+
+    def avancar(self, transacoes, num_bytes):
+        self.processadas += transacoes
+        self.bytes_processados += num_bytes
+        agora = time.time()
+
+        if self.processadas % 100 == 0 or (agora - self.ultimo_log) > 10:
+            self.log(agora)
+
+    def log(self, agora=None):
+        agora = agora or time.time()
+        decorrido = agora - self.inicio
+        copiados = self.bytes_processados - self.bytes_iniciais
+        velocidade = self.processadas / decorrido if decorrido > 0 else 0
+        mb_seg = copiados / 1024 / 1024 / decorrido if decorrido > 0 else 0
+        percentual = (self.bytes_processados / self.total_bytes) * 100 if self.total_bytes > 0 else 0
+
+        restante = self.total_bytes - self.bytes_processados
+        if copiados > 0 and restante > 0:
+            eta = time.strftime('%H:%M:%S', time.gmtime(restante * decorrido / copiados))
+        else:
+            eta = '--:--:--'
+
+        logger.info(
+            f"  Progresso: {self.processadas:,}/{self.total_transacoes:,} transações "
+            f"({percentual:.1f}%) - {velocidade:.1f} trans/seg, {mb_seg:.2f} MB/seg - ETA {eta}"
+        )
+        self.ultimo_log = agora
+
+class FonteComProgresso:
+    """FileStorage para copyTransactionsFrom que informa o Progresso a cada transação
+
+    O iterador declara len() com a contagem já feita pelo escaneamento, assim o
+    RelStorage não percorre o arquivo outra vez só para contar.
+    """
+
+    def __init__(self, storage, resumo, progresso):
+        self._storage = storage
+        self._resumo = resumo
+        self._progresso = progresso
+
+    def iterator(self, start=None, stop=None):
+        return IteradorComProgresso(self._storage.iterator(start, stop),
+                                    self._resumo.transacoes, self._progresso)
+
+    def __getattr__(self, name):
+        return getattr(self._storage, name)
+
+class IteradorComProgresso:
+
+    def __init__(self, iterator, total, progresso):
+        self._iterator = iterator
+        self._total = total
+        self._progresso = progresso
+
+    def __len__(self):
+        return self._total
+
+    def __iter__(self):
+        for txn in self._iterator:
+            # Transação inteira no arquivo: cabeçalho, registros e comprimento redundante
+            self._progresso.callback(txn._tend - txn._tpos + 8)
+            yield txn
+
+    def close(self):
+        close = getattr(self._iterator, 'close', None)
+        if close is not None:
+            close()
+
 def migrar_com_keep_history_true(nome, fs_caminho, banco_destino):
     """Migração SEMPRE com keep_history=True para evitar erro de foreign key"""
     logger.info(f"\n{'='*60}")
@@ -210,64 +585,24 @@ def migrar_com_keep_history_true(nome, fs_caminho, banco_destino):
             pack_gc=False,
             create=True,
             # Configurações mínimas para migração
-            cache_local_mb=100,
-            commit_lock_timeout=60,
+            **RELSTORAGE_MIGRACAO,
         )
         
-        # Estimar transações
+        # Contar transações (uma única passada, apenas cabeçalhos)
         logger.info("Contando transações...")
-        transaction_count = 0
-        
-        try:
-            # Tentar método mais rápido primeiro
-            iterator = source.iterator()
-            for txn in iterator:
-                transaction_count += 1
-                if transaction_count % 5000 == 0:
-                    logger.info(f"  Contadas: {transaction_count:,} transações")
-            
-            # Resetar posição
-            source._pos = 0
-            
-        except:
-            logger.warning("  Não foi possível contar transações precisamente")
-            # Estimativa baseada no tamanho
-            transaction_count = int(tamanho_mb / 0.5)  # Estimativa: 0.5MB por transação
+        resumo = escanear_filestorage(fs_caminho)
+        transaction_count = resumo.transacoes
         
-        logger.info(f"Transações estimadas: {transaction_count:,}")
+        logger.info(f"Transações: {transaction_count:,} ({resumo.registros:,} registros)")
         
         # Migrar
         logger.info("Iniciando migração (pode levar tempo)...")
         start_time = time.time()
         
-        # Monitor de progresso
-        class Progresso:
-            def __init__(self, total_estimado):
-                self.total_estimado = total_estimado
-                self.processadas = 0
-                self.inicio = time.time()
-                self.ultimo_log = time.time()
-            
-            def callback(self):
-                self.processadas += 1
-                agora = time.time()
-                
-                if self.processadas % 100 == 0 or (agora - self.ultimo_log) > 10:
-                    decorrido = agora - self.inicio
-                    velocidade = self.processadas / decorrido if decorrido > 0 else 0
-                    percentual = (self.processadas / self.total_estimado) * 100 if self.total_estimado > 0 else 0
-                    
-                    logger.info(
-                        f"  Progresso: {self.processadas:,}/{self.total_estimado:,} "
-                        f"({percentual:.1f}%) - {velocidade:.1f} trans/seg"
-                    )
-                    self.ultimo_log = agora
-        
-        progresso = Progresso(transaction_count)
-        
-        # Usar copyTransactionsFrom com callback se suportado
+        progresso = Progresso(resumo.fim - 4, transaction_count)
+        
         try:
-            destination.copyTransactionsFrom(source)
+            destination.copyTransactionsFrom(FonteComProgresso(source, resumo, progresso))
         except Exception as e:
             logger.error(f"Erro na migração: {e}")
             
@@ -363,6 +698,1354 @@ def usar_zodbconvert(nome, fs_caminho, banco_destino):
         logger.error(f"✗ Erro zodbconvert: {e}")
         return False
 
+def criar_schema_relstorage(nome, banco_destino, keep_history=True):
+    """Criar o schema do RelStorage no destino sem copiar dados"""
+    # O adaptador cria as tabelas conforme as suas próprias opções
+    options = Options(keep_history=keep_history, pack_gc=False, create_schema=True)
+    adapter = PostgreSQLAdapter(dsn=montar_dsn(banco_destino), options=options)
+    storage = RelStorage(adapter=adapter, name=nome, options=options)
+    storage.close()
+
+def segmentar_transacoes(fs_caminho, num_segmentos):
+    """Dividir o FileStorage em segmentos contíguos de tamanho (bytes) semelhante
+
+    Usa as posições do escaneamento. Cada segmento é devolvido como
+    (posição inicial, tid final, bytes) para ser aberto com
+    FileIterator(pos=..., stop=...).
+    """
+    resumo = escanear_filestorage(fs_caminho)
+    if not resumo.transacoes:
+        return []
+
+    alvo = max(1, (resumo.fim - 4) // max(1, num_segmentos))
+    posicoes = resumo.posicoes + [resumo.fim]
+
+    segmentos = []
+    inicio = 0
+    for i in range(1, resumo.transacoes + 1):
+        if posicoes[i] - posicoes[inicio] >= alvo or i == resumo.transacoes:
+            segmentos.append((posicoes[inicio], p64(resumo.tids[i - 1]),
+                              posicoes[i] - posicoes[inicio]))
+            inicio = i
+    return segmentos
+
+def preparar_staging(banco_destino):
+    """Criar as tabelas auxiliares onde os workers gravam em paralelo"""
+    conn = conectar_destino(banco_destino)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TRANSACTION}, {STAGING_OBJECT_STATE}")
+        cursor.execute(f"""
+            CREATE UNLOGGED TABLE {STAGING_TRANSACTION} (
+                tid         BIGINT NOT NULL,
+                is_empty    BOOLEAN NOT NULL,
+                username    BYTEA NOT NULL,
+                description BYTEA NOT NULL,
+                extension   BYTEA
+            )
+        """)
+        cursor.execute(f"""
+            CREATE UNLOGGED TABLE {STAGING_OBJECT_STATE} (
+                zoid        BIGINT NOT NULL,
+                tid         BIGINT NOT NULL,
+                md5         CHAR(32),
+                state_size  BIGINT NOT NULL,
+                state       BYTEA
+            )
+        """)
+        conn.commit()
+    finally:
+        conn.close()
+
+def descartar_staging(banco_destino):
+    """Remover as tabelas auxiliares da cópia paralela"""
+    try:
+        conn = conectar_destino(banco_destino)
+        conn.autocommit = True
+        conn.cursor().execute(f"DROP TABLE IF EXISTS {STAGING_TRANSACTION}, {STAGING_OBJECT_STATE}")
+        conn.close()
+    except Exception as e:
+        logger.warning(f"  Não foi possível remover tabelas auxiliares: {e}")
+
+def copiar_segmento(fs_caminho, banco_destino, pos_inicio, tid_fim, tamanho_lote=2000):
+    """Worker: copiar um segmento de transações para as tabelas auxiliares
+
+    Executado em processo separado, com seu próprio FileIterator e conexão.
+    Retorna (transações, registros) copiados.
+    """
+    conn = conectar_destino(banco_destino)
+    iterator = FileIterator(fs_caminho, stop=tid_fim, pos=pos_inicio)
+    transacoes = []
+    estados = []
+    total_txn = 0
+    total_registros = 0
+
+    def gravar():
+        cursor = conn.cursor()
+        if transacoes:
+            execute_values(
+                cursor,
+                f"INSERT INTO {STAGING_TRANSACTION} (tid, is_empty, username, description, extension) VALUES %s",
+                transacoes, page_size=len(transacoes))
+        if estados:
+            execute_values(
+                cursor,
+                f"INSERT INTO {STAGING_OBJECT_STATE} (zoid, tid, md5, state_size, state) VALUES %s",
+                estados, page_size=500)
+        conn.commit()
+        cursor.close()
+        del transacoes[:]
+        del estados[:]
+
+    try:
+        for txn in iterator:
+            tid = u64(txn.tid)
+            registros = 0
+            for record in txn:
+                data = record.data
+                if is_blob_record(data):
+                    raise ValueError(
+                        f"Registro de blob em oid {u64(record.oid)}: "
+                        f"cópia paralela não suporta blobs, use o modo padrão")
+                if data is None:
+                    estados.append((u64(record.oid), tid, None, 0, None))
+                else:
+                    estados.append((u64(record.oid), tid, hashlib.md5(data).hexdigest(),
+                                    len(data), psycopg2.Binary(data)))
+                registros += 1
+            transacoes.append((
+                tid,
+                registros == 0,
+                psycopg2.Binary(txn.user),
+                psycopg2.Binary(txn.description),
+                psycopg2.Binary(txn.extension_bytes),
+            ))
+            total_txn += 1
+            total_registros += registros
+            if len(estados) >= tamanho_lote:
+                gravar()
+        gravar()
+    finally:
+        iterator.close()
+        conn.close()
+
+    return total_txn, total_registros
+
+def consolidar_staging(banco_destino):
+    """Gravar o log de transações em ordem e mover os estados para o schema do RelStorage
+
+    Tudo em uma única transação do PostgreSQL: ou o banco recebe a cópia
+    inteira, ou nada.
+    """
+    conn = conectar_destino(banco_destino)
+    try:
+        cursor = conn.cursor()
+
+        logger.info("  Gravando log de transações em ordem...")
+        cursor.execute(f"""
+            INSERT INTO transaction (tid, packed, is_empty, username, description, extension)
+            SELECT tid, FALSE, is_empty, username, description, extension
+            FROM {STAGING_TRANSACTION}
+            ORDER BY tid
+        """)
+
+        logger.info("  Gravando estados dos objetos...")
+        cursor.execute(f"""
+            INSERT INTO object_state (zoid, tid, prev_tid, md5, state_size, state)
+            SELECT zoid, tid,
+                   COALESCE(LAG(tid) OVER (PARTITION BY zoid ORDER BY tid), 0),
+                   md5, state_size, state
+            FROM {STAGING_OBJECT_STATE}
+        """)
+
+        logger.info("  Atualizando current_object...")
+        cursor.execute(f"""
+            INSERT INTO current_object (zoid, tid)
+            SELECT DISTINCT ON (zoid) zoid, tid
+            FROM {STAGING_OBJECT_STATE}
+            ORDER BY zoid, tid DESC
+        """)
+
+        # Mesma conversão oid -> faixa usada pelo alocador do RelStorage (16 oids por valor)
+        cursor.execute("""
+            SELECT setval('zoid_seq', GREATEST((COALESCE(MAX(zoid), 0) + 15) / 16, 1))
+            FROM current_object
+        """)
+
+        cursor.execute(f"DROP TABLE {STAGING_TRANSACTION}, {STAGING_OBJECT_STATE}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def migrar_paralelo(nome, fs_caminho, banco_destino, workers=None):
+    """Migração paralela: segmentos do FileStorage copiados por vários processos"""
+    workers = workers or os.cpu_count() or 1
+
+    logger.info(f"\n{'='*60}")
+    logger.info(f"MIGRANDO (PARALELO): {nome} para {banco_destino}")
+    logger.info(f"Workers: {workers}")
+    logger.info(f"{'='*60}")
+
+    if not os.path.exists(fs_caminho):
+        logger.error(f"Arquivo não encontrado: {fs_caminho}")
+        return False
+
+    try:
+        logger.info("Criando schema do RelStorage (keep_history=True)...")
+        criar_schema_relstorage(nome, banco_destino)
+
+        # Mais segmentos que workers para equilibrar a carga
+        resumo = escanear_filestorage(fs_caminho)
+        segmentos = segmentar_transacoes(fs_caminho, workers * 4)
+        logger.info(f"Segmentos: {len(segmentos)} ({resumo.transacoes:,} transações)")
+
+        preparar_staging(banco_destino)
+
+        start_time = time.time()
+        total_txn = 0
+        total_registros = 0
+        progresso = Progresso(resumo.fim - 4, resumo.transacoes)
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futuros = {
+                executor.submit(copiar_segmento, fs_caminho, banco_destino, pos_inicio, tid_fim): num_bytes
+                for pos_inicio, tid_fim, num_bytes in segmentos
+            }
+            for futuro in as_completed(futuros):
+                num_txn, num_registros = futuro.result()
+                total_txn += num_txn
+                total_registros += num_registros
+                progresso.avancar(num_txn, futuros[futuro])
+                progresso.log()
+
+        logger.info("Consolidando no schema do RelStorage...")
+        consolidar_staging(banco_destino)
+
+        elapsed = time.time() - start_time
+        logger.info(f"\n✅ MIGRAÇÃO PARALELA CONCLUÍDA!")
+        logger.info(f"  Tempo: {elapsed:.2f} segundos")
+        logger.info(f"  Velocidade: {total_txn/elapsed:.1f} trans/seg" if elapsed > 0 else "N/A")
+
+        verificar_migracao(banco_destino)
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ Erro na migração paralela: {e}")
+        descartar_staging(banco_destino)
+
+        # A consolidação é atômica: o destino continua só com o schema vazio
+        logger.info("Tentando método sequencial...")
+        return migrar_com_keep_history_true(nome, fs_caminho, banco_destino)
+
+def preparar_checkpoint(banco_destino):
+    """Criar a tabela de checkpoint da migração retomável"""
+    conn = conectar_destino(banco_destino)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+                nome          TEXT PRIMARY KEY,
+                fs_caminho    TEXT NOT NULL,
+                ultimo_tid    BIGINT NOT NULL,
+                transacoes    BIGINT NOT NULL,
+                atualizado_em TIMESTAMP NOT NULL DEFAULT now()
+            )
+        """)
+        # Conteúdo de arquivos movido para blobs (--blobs): o destino não aceita sincronização
+        cursor.execute(f"ALTER TABLE {CHECKPOINT_TABLE} "
+                       f"ADD COLUMN IF NOT EXISTS com_blobs BOOLEAN NOT NULL DEFAULT false")
+        conn.commit()
+    finally:
+        conn.close()
+
+def ler_checkpoint(banco_destino, nome):
+    """Ler o checkpoint de um FileStorage: (fs_caminho, ultimo_tid, transacoes) ou None"""
+    try:
+        conn = conectar_destino(banco_destino)
+    except psycopg2.OperationalError:
+        # Banco ainda não existe
+        return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT to_regclass(%s)", (CHECKPOINT_TABLE,))
+        if cursor.fetchone()[0] is None:
+            return None
+        cursor.execute(
+            f"SELECT fs_caminho, ultimo_tid, transacoes FROM {CHECKPOINT_TABLE} WHERE nome = %s",
+            (nome,))
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+def destino_com_blobs(banco_destino, nome):
+    """Verificar se a cópia sem histórico moveu arquivos para blobs (ver DescarregadorBlobs)"""
+    conn = conectar_destino(banco_destino)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT to_regclass(%s)", (CHECKPOINT_TABLE,))
+        if cursor.fetchone()[0] is None:
+            return False
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_name = %s AND column_name = 'com_blobs'", (CHECKPOINT_TABLE,))
+        if cursor.fetchone() is None:
+            return False
+        cursor.execute(f"SELECT com_blobs FROM {CHECKPOINT_TABLE} WHERE nome = %s", (nome,))
+        linha = cursor.fetchone()
+        return bool(linha and linha[0])
+    finally:
+        conn.close()
+
+def gravar_checkpoint(conn, nome, fs_caminho, ultimo_tid, transacoes, com_blobs=False):
+    """Registrar o último tid efetivado no destino"""
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        INSERT INTO {CHECKPOINT_TABLE} (nome, fs_caminho, ultimo_tid, transacoes, com_blobs, atualizado_em)
+        VALUES (%s, %s, %s, %s, %s, now())
+        ON CONFLICT (nome) DO UPDATE SET
+            fs_caminho = EXCLUDED.fs_caminho,
+            ultimo_tid = EXCLUDED.ultimo_tid,
+            transacoes = EXCLUDED.transacoes,
+            com_blobs = {CHECKPOINT_TABLE}.com_blobs OR EXCLUDED.com_blobs,
+            atualizado_em = EXCLUDED.atualizado_em
+    """, (nome, fs_caminho, ultimo_tid, transacoes, com_blobs))
+    conn.commit()
+    cursor.close()
+
+def verificar_destino_ate_checkpoint(banco_destino, checkpoint):
+    """Conferir se o destino contém exatamente as transações até o checkpoint
+
+    Retorna (tid a partir do qual continuar, transações já copiadas) ou None
+    se o destino não for consistente com o checkpoint.
+    """
+    _, ultimo_tid, transacoes = checkpoint
+    conn = conectar_destino(banco_destino)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COUNT(*) FROM transaction WHERE tid > 0 AND tid <= %s", (ultimo_tid,))
+        copiadas = cursor.fetchone()[0]
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM transaction WHERE tid = %s)", (ultimo_tid,))
+        existe = cursor.fetchone()[0]
+        if copiadas != transacoes or (ultimo_tid and not existe):
+            logger.error(
+                f"✗ Destino inconsistente com o checkpoint: {copiadas:,} transações "
+                f"até o tid {ultimo_tid}, esperadas {transacoes:,}")
+            return None
+
+        # Transações efetivadas depois do último checkpoint também são válidas:
+        # o RelStorage grava cada transação de forma atômica
+        cursor.execute("SELECT MAX(tid), COUNT(*) FROM transaction WHERE tid > %s", (ultimo_tid,))
+        max_tid, extras = cursor.fetchone()
+        if extras:
+            logger.info(f"  {extras:,} transações efetivadas após o último checkpoint")
+            return max_tid, transacoes + extras
+        return ultimo_tid, transacoes
+    finally:
+        conn.close()
+
+def destino_tem_transacoes(banco_destino):
+    """Verificar se o destino já recebeu alguma transação (além do tid 0 do RelStorage)"""
+    conn = conectar_destino(banco_destino)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM transaction WHERE tid > 0)")
+        return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+def restaurar_transacao(destination, txn, modo):
+    """Gravar no destino uma transação da origem, preservando tid e backpointers"""
+    destination.tpc_begin(txn, txn.tid, txn.status)
+    for record in txn:
+        if is_blob_record(record.data):
+            raise ValueError(
+                f"Registro de blob em oid {u64(record.oid)}: "
+                f"modo {modo} não suporta blobs, use o modo padrão")
+        destination.restore(record.oid, record.tid, record.data, '',
+                            record.data_txn, txn)
+    destination.tpc_vote(txn)
+    destination.tpc_finish(txn)
+
+def migrar_retomavel(nome, fs_caminho, banco_destino, intervalo_checkpoint=500):
+    """Migração sequencial com checkpoint: retoma a partir do último tid gravado"""
+    logger.info(f"\n{'='*60}")
+    logger.info(f"MIGRANDO (RETOMÁVEL): {nome} para {banco_destino}")
+    logger.info(f"{'='*60}")
+
+    if not os.path.exists(fs_caminho):
+        logger.error(f"Arquivo não encontrado: {fs_caminho}")
+        return False
+
+    source = None
+    destination = None
+    conn_checkpoint = None
+    try:
+        source = FileStorage(fs_caminho, read_only=True)
+        destination = RelStorage(
+            adapter=PostgreSQLAdapter(dsn=montar_dsn(banco_destino)),
+            name=nome,
+            keep_history=True,
+            pack_gc=False,
+            create=True,
+            **RELSTORAGE_MIGRACAO,
+        )
+        preparar_checkpoint(banco_destino)
+
+        inicio = None
+        copiadas = 0
+        checkpoint = ler_checkpoint(banco_destino, nome)
+        if checkpoint:
+            if checkpoint[0] != fs_caminho:
+                logger.error(f"✗ Checkpoint pertence a outro arquivo: {checkpoint[0]}")
+                return False
+            logger.info(f"Checkpoint encontrado: tid {checkpoint[1]} ({checkpoint[2]:,} transações)")
+            verificado = verificar_destino_ate_checkpoint(banco_destino, checkpoint)
+            if verificado is None:
+                logger.error("  Limpe o banco e reinicie a migração sem --modo retomavel")
+                return False
+            ultimo_tid, copiadas = verificado
+            if ultimo_tid:
+                inicio = p64(ultimo_tid + 1)
+            logger.info(f"✓ Destino verificado, retomando após o tid {ultimo_tid}")
+        elif destino_tem_transacoes(banco_destino):
+            logger.error("✗ Destino já contém transações, mas não há checkpoint para retomar")
+            return False
+
+        conn_checkpoint = conectar_destino(banco_destino)
+        resumo = escanear_filestorage(fs_caminho)
+        bytes_copiados = resumo.bytes_ate(u64(inicio) - 1) if inicio else 0
+        progresso = Progresso(resumo.fim - 4, resumo.transacoes - copiadas, bytes_copiados)
+        start_time = time.time()
+        copiadas_agora = 0
+        ultimo_tid = None
+
+        for txn in source.iterator(start=inicio):
+            progresso.callback(txn._tend - txn._tpos + 8)
+            restaurar_transacao(destination, txn, 'retomável')
+
+            ultimo_tid = u64(txn.tid)
+            copiadas += 1
+            copiadas_agora += 1
+            if copiadas_agora % intervalo_checkpoint == 0:
+                gravar_checkpoint(conn_checkpoint, nome, fs_caminho, ultimo_tid, copiadas)
+                logger.info(f"  Checkpoint: {copiadas:,} transações (tid {ultimo_tid})")
+
+        if ultimo_tid is not None:
+            gravar_checkpoint(conn_checkpoint, nome, fs_caminho, ultimo_tid, copiadas)
+
+        elapsed = time.time() - start_time
+        logger.info(f"\n✅ MIGRAÇÃO CONCLUÍDA!")
+        logger.info(f"  Transações copiadas nesta execução: {copiadas_agora:,} (total {copiadas:,})")
+        logger.info(f"  Tempo: {elapsed:.2f} segundos")
+
+        verificar_migracao(banco_destino)
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ Erro na migração retomável: {e}")
+        logger.error("  Execute novamente com --modo retomavel para continuar do último checkpoint")
+        return False
+
+    finally:
+        if conn_checkpoint is not None:
+            conn_checkpoint.close()
+        if destination is not None:
+            destination.close()
+        if source is not None:
+            source.close()
+
+class BufferCopyBinario:
+    """Linhas de uma tabela no formato binário do COPY do PostgreSQL"""
+
+    CABECALHO = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+    TRAILER = struct.pack('!h', -1)
+
+    def __init__(self, tabela, colunas):
+        self.tabela = tabela
+        self.colunas = colunas
+        self.linhas = 0
+        self._buffer = io.BytesIO()
+        self._buffer.write(self.CABECALHO)
+
+    def linha(self, *campos):
+        write = self._buffer.write
+        write(struct.pack('!h', len(campos)))
+        for campo in campos:
+            if campo is None:
+                write(struct.pack('!i', -1))
+            elif isinstance(campo, bool):
+                write(struct.pack('!i?', 1, campo))
+            elif isinstance(campo, int):
+                write(struct.pack('!iq', 8, campo))
+            else:
+                write(struct.pack('!i', len(campo)))
+                write(campo)
+        self.linhas += 1
+
+    def tamanho(self):
+        return self._buffer.tell()
+
+    def enviar(self, cursor):
+        """Enviar as linhas acumuladas com COPY FROM STDIN e esvaziar o buffer"""
+        if not self.linhas:
+            return
+        self._buffer.write(self.TRAILER)
+        self._buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {self.tabela} ({', '.join(self.colunas)}) FROM STDIN WITH (FORMAT binary)",
+            self._buffer)
+        self._buffer = io.BytesIO()
+        self._buffer.write(self.CABECALHO)
+        self.linhas = 0
+
+def remover_restricoes(cursor, tabelas):
+    """Remover chaves, FKs e índices das tabelas, devolvendo o DDL para recriá-los"""
+    cursor.execute("""
+        SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid), contype
+        FROM pg_constraint
+        WHERE contype IN ('p', 'u', 'f')
+          AND (conrelid = ANY(%s::regclass[]) OR confrelid = ANY(%s::regclass[]))
+    """, (tabelas, tabelas))
+    restricoes = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        WHERE i.indrelid = ANY(%s::regclass[])
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+    """, (tabelas,))
+    indices = cursor.fetchall()
+
+    # FKs primeiro: elas dependem das chaves primárias
+    for tabela, nome, _, tipo in sorted(restricoes, key=lambda r: r[3] != 'f'):
+        cursor.execute(f'ALTER TABLE {tabela} DROP CONSTRAINT "{nome}"')
+    for nome, _ in indices:
+        cursor.execute(f"DROP INDEX {nome}")
+
+    chaves = [f'ALTER TABLE {t} ADD CONSTRAINT "{n}" {d}' for t, n, d, tipo in restricoes if tipo != 'f']
+    fks = [f'ALTER TABLE {t} ADD CONSTRAINT "{n}" {d}' for t, n, d, tipo in restricoes if tipo == 'f']
+    return chaves + [ddl for _, ddl in indices] + fks
+
+def migrar_bulk(nome, fs_caminho, banco_destino, tamanho_lote_mb=64):
+    """Carga em massa para destino vazio: COPY binário direto nas tabelas do RelStorage
+
+    Chaves, índices e FKs são removidos antes da carga e recriados no final;
+    prev_tid e current_object são calculados durante a leitura do arquivo.
+    """
+    logger.info(f"\n{'='*60}")
+    logger.info(f"MIGRANDO (BULK COPY): {nome} para {banco_destino}")
+    logger.info(f"{'='*60}")
+
+    if not os.path.exists(fs_caminho):
+        logger.error(f"Arquivo não encontrado: {fs_caminho}")
+        return False
+
+    conn = None
+    iterator = None
+    try:
+        logger.info("Criando schema do RelStorage (keep_history=True)...")
+        criar_schema_relstorage(nome, banco_destino)
+        if destino_tem_transacoes(banco_destino):
+            logger.error("✗ Carga em massa exige destino vazio")
+            return False
+
+        resumo = escanear_filestorage(fs_caminho)
+        progresso = Progresso(resumo.fim - 4, resumo.transacoes)
+
+        conn = conectar_destino(banco_destino)
+        cursor = conn.cursor()
+        cursor.execute("SET synchronous_commit = off")
+
+        logger.info("Removendo chaves, índices e FKs para a carga...")
+        ddl_restricoes = remover_restricoes(cursor, ['transaction', 'object_state', 'current_object'])
+        conn.commit()
+
+        transacoes = BufferCopyBinario(
+            'transaction', ('tid', 'packed', 'is_empty', 'username', 'description', 'extension'))
+        estados = BufferCopyBinario(
+            'object_state', ('zoid', 'tid', 'prev_tid', 'md5', 'state_size', 'state'))
+        limite = tamanho_lote_mb * 1024 * 1024
+
+        # oid -> tid da revisão mais recente (vira prev_tid e current_object)
+        ultima_revisao = {}
+        start_time = time.time()
+
+        iterator = FileIterator(fs_caminho)
+        for txn in iterator:
+            progresso.callback(txn._tend - txn._tpos + 8)
+            tid = u64(txn.tid)
+            registros = 0
+            for record in txn:
+                data = record.data
+                if is_blob_record(data):
+                    raise ValueError(
+                        f"Registro de blob em oid {u64(record.oid)}: "
+                        f"carga em massa não suporta blobs, use o modo padrão")
+                zoid = u64(record.oid)
+                prev_tid = ultima_revisao.get(zoid, 0)
+                ultima_revisao[zoid] = tid
+                if data is None:
+                    estados.linha(zoid, tid, prev_tid, None, 0, None)
+                else:
+                    estados.linha(zoid, tid, prev_tid, hashlib.md5(data).hexdigest().encode('ascii'),
+                                  len(data), data)
+                registros += 1
+            transacoes.linha(tid, False, registros == 0, txn.user, txn.description,
+                             txn.extension_bytes)
+
+            if estados.tamanho() + transacoes.tamanho() >= limite:
+                transacoes.enviar(cursor)
+                estados.enviar(cursor)
+                conn.commit()
+
+        transacoes.enviar(cursor)
+        estados.enviar(cursor)
+
+        logger.info(f"Gravando current_object ({len(ultima_revisao):,} objetos)...")
+        atuais = BufferCopyBinario('current_object', ('zoid', 'tid'))
+        for zoid, tid in ultima_revisao.items():
+            atuais.linha(zoid, tid)
+            if atuais.tamanho() >= limite:
+                atuais.enviar(cursor)
+        atuais.enviar(cursor)
+        conn.commit()
+
+        carga = time.time() - start_time
+        logger.info(f"✓ Carga concluída em {carga:.2f}s. Recriando chaves, índices e FKs...")
+        cursor.execute("SET maintenance_work_mem = '512MB'")
+        for ddl in ddl_restricoes:
+            logger.debug(f"  {ddl}")
+            cursor.execute(ddl)
+
+        # Mesma conversão oid -> faixa usada pelo alocador do RelStorage (16 oids por valor)
+        cursor.execute("SELECT setval('zoid_seq', GREATEST((%s + 15) / 16, 1))",
+                       (max(ultima_revisao, default=0),))
+        conn.commit()
+
+        conn.autocommit = True
+        cursor.execute("ANALYZE transaction")
+        cursor.execute("ANALYZE object_state")
+        cursor.execute("ANALYZE current_object")
+
+        # Entrega ao RelStorage: abrir o storage confirma que o schema está íntegro
+        storage = RelStorage(adapter=PostgreSQLAdapter(dsn=montar_dsn(banco_destino)),
+                             name=nome, keep_history=True, pack_gc=False, create=False)
+        storage.close()
+
+        elapsed = time.time() - start_time
+        logger.info(f"\n✅ CARGA EM MASSA CONCLUÍDA!")
+        logger.info(f"  Tempo: {elapsed:.2f} segundos (carga {carga:.2f}s)")
+        logger.info(f"  Velocidade: {resumo.transacoes/elapsed:.1f} trans/seg" if elapsed > 0 else "N/A")
+
+        verificar_migracao(banco_destino)
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ Erro na carga em massa: {e}")
+        logger.error("  O destino ficou incompleto: limpe o banco antes de tentar outro modo")
+        if conn is not None and not conn.closed and not conn.autocommit:
+            conn.rollback()
+        return False
+
+    finally:
+        if iterator is not None:
+            iterator.close()
+        if conn is not None:
+            conn.close()
+
+class ObjetoLido:
+    """Instância de classe não importável, lida de um pickle só para inspeção"""
+
+    def __init__(self, *args, **kw):
+        self.args = args
+
+    def __setstate__(self, state):
+        self.state = state
+
+class ReferenciaPersistente:
+    """Referência persistente (oid, classe) encontrada num pickle"""
+
+    def __init__(self, ref):
+        self.ref = ref
+
+    @property
+    def oid(self):
+        oid = self.ref[0] if isinstance(self.ref, tuple) else self.ref
+        if isinstance(oid, str):
+            oid = oid.encode('latin1')
+        return oid if isinstance(oid, bytes) and len(oid) == 8 else None
+
+class LeitorPickle(pickle.Unpickler):
+    """Unpickler que não importa classes da aplicação (OFS, Products...)"""
+
+    def find_class(self, module, name):
+        return type(name, (ObjetoLido,), {'__module__': module})
+
+    def persistent_load(self, ref):
+        return ReferenciaPersistente(ref)
+
+def ler_estado(data):
+    """Estado (segundo pickle) de um registro do ZODB"""
+    leitor = LeitorPickle(io.BytesIO(data), encoding='latin1')
+    leitor.load()
+    return leitor.load()
+
+def pickle_referencia(oid, modulo, classe):
+    """Opcodes de uma referência persistente (oid, classe), sem memo"""
+    return b'C\x08' + oid + b'c' + f"{modulo}\n{classe}\n".encode() + b'\x86Q'
+
+# Opcodes que formam o valor do atributo 'data' de um File/Image
+OPCODES_BYTES = {'SHORT_BINBYTES', 'BINBYTES', 'BINBYTES8', 'SHORT_BINSTRING', 'BINSTRING'}
+OPCODES_REFERENCIA = OPCODES_BYTES | {'GLOBAL', 'BINGET', 'LONG_BINGET', 'BINPUT', 'LONG_BINPUT',
+                                      'TUPLE1', 'TUPLE2', 'REDUCE', 'MARK', 'TUPLE'}
+OPCODES_CHAVE = {'SHORT_BINUNICODE', 'BINUNICODE', 'SHORT_BINSTRING', 'BINSTRING'}
+OPCODES_MEMO = {'BINPUT', 'LONG_BINPUT'}
+
+def trecho_do_atributo(data, atributo):
+    """(início, fim) no registro dos bytes do valor de um atributo do estado
+
+    Só reconhece valores simples (bytes ou referência persistente). Retorna
+    None se o valor não for encontrado nesse formato.
+    """
+    arquivo = io.BytesIO(data)
+    operacoes = list(pickletools.genops(arquivo))   # pickle da classe
+    inicio_estado = arquivo.tell()
+    operacoes = [(op.name, arg, inicio_estado + pos)
+                 for op, arg, pos in pickletools.genops(data[inicio_estado:])]
+    if any(nome == 'MEMOIZE' for nome, _, _ in operacoes):
+        # Protocolo 4: remover opcodes deslocaria os índices do memo
+        return None
+
+    for i, (nome, arg, pos) in enumerate(operacoes):
+        if nome not in OPCODES_CHAVE or arg not in (atributo, atributo.encode()):
+            continue
+        j = i + 1
+        if j < len(operacoes) and operacoes[j][0] in OPCODES_MEMO:
+            j += 1
+        if j >= len(operacoes):
+            return None
+        inicio = operacoes[j][2]
+        fim = None
+        for k in range(j, min(j + 10, len(operacoes))):
+            if operacoes[k][0] == 'BINPERSID':
+                fim = k
+                break
+            if operacoes[k][0] not in OPCODES_REFERENCIA:
+                break
+        if fim is None:
+            if operacoes[j][0] not in OPCODES_BYTES:
+                return None
+            fim = j
+        if fim + 1 < len(operacoes) and operacoes[fim + 1][0] in OPCODES_MEMO:
+            fim += 1
+        return inicio, operacoes[fim + 1][2]
+    return None
+
+class DescarregadorBlobs:
+    """Mover o conteúdo de Files/Images grandes para blobs num shared-blob-dir
+
+    O atributo 'data' (bytes ou cadeia de Pdata) é trocado por um BlobPdata,
+    que aponta para um ZODB Blob gravado no layout 'bushy' do blob-dir.
+    """
+
+    def __init__(self, source, blob_dir, limiar_bytes):
+        # Os oids novos vêm logo depois do maior oid da origem, os mesmos que o
+        # Zope usaria a seguir: o destino não aceita sincronização incremental
+        self.source = source
+        self.limiar = limiar_bytes
+        self.blobs = FilesystemHelper(blob_dir, layout_name='bushy')
+        self.blobs.create()
+        self.proximo_oid = u64(source._index.maxKey()) + 1 if len(source._index) else 1
+        self.descarregados = 0
+        self.bytes_descarregados = 0
+        self.pdatas_substituidos = 0
+        self.ignorados = 0
+
+    def _novo_oid(self):
+        oid = p64(self.proximo_oid)
+        self.proximo_oid += 1
+        return oid
+
+    def _gravar_conteudo(self, valor, destino, visitados):
+        """Gravar bytes ou cadeia de Pdata em destino; retorna (tamanho, oids da cadeia)"""
+        cadeia = []
+        tamanho = 0
+        with open(destino, 'wb') as arquivo:
+            while valor is not None:
+                if isinstance(valor, str):
+                    valor = valor.encode('latin1')
+                if isinstance(valor, bytes):
+                    arquivo.write(valor)
+                    tamanho += len(valor)
+                    break
+                if not isinstance(valor, ReferenciaPersistente) or valor.oid is None:
+                    return None
+                if valor.oid in visitados or valor.oid in cadeia:
+                    # Pdata compartilhado com outro objeto: manter como está
+                    return None
+                data, _ = self.source.load(valor.oid)
+                if get_pickle_metadata(data) != CLASSE_PDATA:
+                    return None
+                cadeia.append(valor.oid)
+                estado = ler_estado(data)
+                pedaco = estado.get('data', b'')
+                if isinstance(pedaco, str):
+                    pedaco = pedaco.encode('latin1')
+                arquivo.write(pedaco)
+                tamanho += len(pedaco)
+                valor = estado.get('next')
+        return tamanho, cadeia
+
+    def descarregar(self, oid, tid, data, visitados):
+        """Registros a gravar no lugar de um File/Image, ou None para copiar como está"""
+        estado = ler_estado(data)
+        if not isinstance(estado, dict) or estado.get('data') is None:
+            return None
+        tamanho_informado = estado.get('size')
+        if isinstance(tamanho_informado, int) and tamanho_informado < self.limiar:
+            return None
+        trecho = trecho_do_atributo(data, 'data')
+        if trecho is None:
+            self.ignorados += 1
+            return None
+
+        blob_oid = self._novo_oid()
+        destino = self.blobs.getBlobFilename(blob_oid, tid)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        gravado = self._gravar_conteudo(estado['data'], destino, visitados)
+        if gravado is None or gravado[0] < self.limiar:
+            os.remove(destino)
+            self.proximo_oid -= 1
+            if gravado is None:
+                self.ignorados += 1
+            return None
+        tamanho, cadeia = gravado
+
+        pdata_oid = self._novo_oid()
+        inicio, fim = trecho
+        novo = data[:inicio] + pickle_referencia(pdata_oid, *CLASSE_PDATA_BLOB) + data[fim:]
+        try:
+            # Ex.: BINGET de um valor do memo definido no trecho removido
+            novo_estado = ler_estado(novo)
+        except Exception:
+            novo_estado = None
+        if (not isinstance(novo_estado, dict) or set(novo_estado) != set(estado)
+                or not isinstance(novo_estado['data'], ReferenciaPersistente)
+                or novo_estado['data'].oid != pdata_oid):
+            os.remove(destino)
+            self.proximo_oid -= 2
+            self.ignorados += 1
+            return None
+
+        visitados.update(cadeia)
+        visitados.update((blob_oid, pdata_oid))
+        self.pdatas_substituidos += len(cadeia)
+        self.descarregados += 1
+        self.bytes_descarregados += tamanho
+        modulo, classe = CLASSE_PDATA_BLOB
+        pdata = (f"\x80\x03c{modulo}\n{classe}\nq\x00.".encode('latin1')
+                 + b'\x80\x03}X\x04\x00\x00\x00blob' + pickle_referencia(blob_oid, 'ZODB.blob', 'Blob') + b's.')
+        return [(oid, tid, novo), (pdata_oid, tid, pdata), (blob_oid, tid, REGISTRO_BLOB)]
+
+def migrar_sem_historico(nome, fs_caminho, banco_destino, tamanho_lote_mb=64,
+                         blob_dir=None, limiar_blob_kb=256):
+    """Copiar só a revisão atual dos objetos alcançáveis a partir da raiz
+
+    Grava direto no schema history-free (keep_history=False), com COPY binário.
+    Revisões antigas e objetos sem referência (lixo) não são copiados, dispensando
+    o pack posterior. Com blob_dir, o conteúdo de Files/Images a partir de
+    limiar_blob_kb vai para blobs nesse diretório (shared-blob-dir).
+    """
+    logger.info(f"\n{'='*60}")
+    logger.info(f"MIGRANDO (SEM HISTÓRICO): {nome} para {banco_destino}")
+    logger.info(f"{'='*60}")
+
+    if not os.path.exists(fs_caminho):
+        logger.error(f"Arquivo não encontrado: {fs_caminho}")
+        return False
+
+    source = None
+    conn = None
+    try:
+        logger.info("Criando schema do RelStorage (keep_history=False)...")
+        criar_schema_relstorage(nome, banco_destino, keep_history=False)
+
+        source = FileStorage(fs_caminho, read_only=True)
+        # Estado copiado: o da última transação efetivada quando a origem foi aberta
+        tid_origem = source.lastTransaction()
+        total_objetos = len(source)
+        descarregador = None
+        if blob_dir:
+            descarregador = DescarregadorBlobs(source, blob_dir, limiar_blob_kb * 1024)
+            logger.info(f"Conteúdo de arquivos com {limiar_blob_kb} KB ou mais irá para blobs em {blob_dir}")
+
+        conn = conectar_destino(banco_destino)
+        cursor = conn.cursor()
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM object_state)")
+        if cursor.fetchone()[0]:
+            logger.error("✗ Migração sem histórico exige destino vazio")
+            return False
+        cursor.execute("SET synchronous_commit = off")
+        ddl_restricoes = remover_restricoes(cursor, ['object_state'])
+        conn.commit()
+
+        estados = BufferCopyBinario('object_state', ('zoid', 'tid', 'state_size', 'state'))
+        limite = tamanho_lote_mb * 1024 * 1024
+
+        start_time = time.time()
+        ultimo_log = start_time
+        visitados = {z64}
+        pendentes = [z64]
+        copiados = 0
+        bytes_copiados = 0
+        ausentes = 0
+
+        while pendentes:
+            oid = pendentes.pop()
+            try:
+                data, tid = source.load(oid)
+            except POSKeyError:
+                ausentes += 1
+                logger.warning(f"  Referência para oid inexistente: {u64(oid)}")
+                continue
+            if is_blob_record(data):
+                raise ValueError(
+                    f"Registro de blob em oid {u64(oid)}: "
+                    f"migração sem histórico não suporta blobs, use o modo padrão")
+
+            registros = None
+            if descarregador is not None and get_pickle_metadata(data) in CLASSES_ARQUIVO:
+                registros = descarregador.descarregar(oid, tid, data, visitados)
+            if registros:
+                data = registros[0][2]
+            for oid_registro, tid_registro, data_registro in registros or [(oid, tid, data)]:
+                estados.linha(u64(oid_registro), u64(tid_registro), len(data_registro), data_registro)
+                bytes_copiados += len(data_registro)
+            copiados += 1
+
+            for ref in referencesf(data):
+                if ref not in visitados:
+                    visitados.add(ref)
+                    pendentes.append(ref)
+
+            if estados.tamanho() >= limite:
+                estados.enviar(cursor)
+                conn.commit()
+
+            agora = time.time()
+            if agora - ultimo_log > 10:
+                logger.info(
+                    f"  Progresso: {copiados:,}/{total_objetos:,} objetos - "
+                    f"{bytes_copiados/1024/1024:.1f} MB - {copiados/(agora - start_time):.1f} obj/seg")
+                ultimo_log = agora
+
+        estados.enviar(cursor)
+        conn.commit()
+
+        logger.info("Recriando chave e índices...")
+        for ddl in ddl_restricoes:
+            cursor.execute(ddl)
+        cursor.execute("SELECT setval('zoid_seq', GREATEST((%s + 15) / 16, 1))",
+                       (max((u64(oid) for oid in visitados), default=0),))
+        conn.commit()
+        conn.autocommit = True
+        cursor.execute("ANALYZE object_state")
+
+        options = Options(keep_history=False, create_schema=False)
+        storage = RelStorage(adapter=PostgreSQLAdapter(dsn=montar_dsn(banco_destino), options=options),
+                             name=nome, options=options)
+        storage.close()
+
+        # Ponto de partida da sincronização incremental (ver ultimo_tid_destino)
+        preparar_checkpoint(banco_destino)
+        gravar_checkpoint(conn, nome, fs_caminho, u64(tid_origem), 0,
+                          com_blobs=bool(descarregador and descarregador.descarregados))
+
+        elapsed = time.time() - start_time
+        logger.info(f"\n✅ MIGRAÇÃO SEM HISTÓRICO CONCLUÍDA!")
+        substituidos = descarregador.pdatas_substituidos if descarregador is not None else 0
+        logger.info(f"  Objetos copiados: {copiados:,} de {total_objetos:,} "
+                    f"({total_objetos - copiados - substituidos:,} sem referência descartados)")
+        if ausentes:
+            logger.warning(f"  Referências para objetos inexistentes: {ausentes:,}")
+        if descarregador is not None:
+            logger.info(f"  Arquivos movidos para blobs: {descarregador.descarregados:,} "
+                        f"({descarregador.bytes_descarregados/1024/1024:.2f} MB, "
+                        f"{substituidos:,} objetos Pdata substituídos)")
+            if descarregador.ignorados:
+                logger.warning(f"  Arquivos grandes mantidos no banco (formato não reconhecido): "
+                               f"{descarregador.ignorados:,}")
+        logger.info(f"  Dados: {bytes_copiados/1024/1024:.2f} MB "
+                    f"(arquivo de origem: {os.path.getsize(fs_caminho)/1024/1024:.2f} MB)")
+        logger.info(f"  Tempo: {elapsed:.2f} segundos")
+
+        verificar_migracao(banco_destino)
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ Erro na migração sem histórico: {e}")
+        if conn is not None and not conn.closed and not conn.autocommit:
+            conn.rollback()
+        return False
+
+    finally:
+        if conn is not None:
+            conn.close()
+        if source is not None:
+            source.close()
+
+def consulta_estado_atual(cursor):
+    """SELECT de (zoid, tid, md5 do estado) da revisão atual, conforme o schema do destino"""
+    cursor.execute("SELECT to_regclass('current_object')")
+    if cursor.fetchone()[0] is None:
+        # History-free: object_state só guarda a revisão atual
+        return "SELECT zoid, tid, md5(state) FROM object_state o WHERE TRUE"
+    return """
+        SELECT c.zoid, c.tid, md5(o.state)
+        FROM current_object c
+        JOIN object_state o ON o.zoid = c.zoid AND o.tid = c.tid
+        WHERE TRUE"""
+
+def destino_sem_historico(banco_destino):
+    """Se o schema do destino é history-free (sem a tabela current_object)"""
+    conn = conectar_destino(banco_destino)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT to_regclass('object_state'), to_regclass('current_object')")
+        tem_object_state, tem_current_object = cursor.fetchone()
+        return tem_object_state is not None and tem_current_object is None
+    finally:
+        conn.close()
+
+def estado_origem(source, oid):
+    """(tid, md5) da revisão atual de um oid no FileStorage; md5 None se o objeto foi desfeito"""
+    try:
+        data, tid = source.load(oid)
+    except POSKeyError:
+        return None
+    return u64(tid), hashlib.md5(data).hexdigest()
+
+def estado_na_posicao(mapa, pos):
+    """(tid, md5) do registro de dados em pos, como estado_origem, lendo do arquivo mapeado
+
+    Um registro sem dados (undo) segue o backpointer até a revisão que
+    guarda o estado; sem backpointer, o objeto foi desfeito (None).
+    """
+    _, tid, _, _, _, plen = struct.unpack_from(DATA_HDR, mapa, pos)
+    while not plen:
+        pos = struct.unpack_from('>Q', mapa, pos + DATA_HDR_LEN)[0]
+        if not pos:
+            return None
+        plen = struct.unpack_from(DATA_HDR, mapa, pos)[5]
+    inicio = pos + DATA_HDR_LEN
+    return u64(tid), hashlib.md5(mapa[inicio:inicio + plen]).hexdigest()
+
+class ResultadoVerificacao:
+    """Contadores e primeiras divergências de uma verificação oid -> (tid, hash)"""
+
+    LIMITE_DIVERGENCIAS = 20
+
+    def __init__(self):
+        self.verificados = 0
+        self.iguais = 0
+        self.ausentes = 0      # No FileStorage, não no destino
+        self.extras = 0        # No destino, não no FileStorage
+        self.tid_diferente = 0
+        self.hash_diferente = 0
+        self.divergencias = []
+
+    def comparar(self, zoid, origem, destino):
+        self.verificados += 1
+        if destino is None:
+            if origem is None:
+                self.iguais += 1
+                return
+            self.ausentes += 1
+            self._anotar(zoid, 'ausente no destino', origem, destino)
+        elif origem is None:
+            # Objeto desfeito na origem: no destino o estado fica NULL
+            if destino[1] is None:
+                self.iguais += 1
+                return
+            self.extras += 1
+            self._anotar(zoid, 'ausente na origem', origem, destino)
+        elif origem[0] != destino[0]:
+            self.tid_diferente += 1
+            self._anotar(zoid, 'tid diferente', origem, destino)
+        elif origem[1] != destino[1]:
+            self.hash_diferente += 1
+            self._anotar(zoid, 'estado diferente', origem, destino)
+        else:
+            self.iguais += 1
+
+    def _anotar(self, zoid, motivo, origem, destino):
+        if len(self.divergencias) < self.LIMITE_DIVERGENCIAS:
+            self.divergencias.append((zoid, motivo, origem, destino))
+
+    def somar(self, outro):
+        for campo in ('verificados', 'iguais', 'ausentes', 'extras', 'tid_diferente', 'hash_diferente'):
+            setattr(self, campo, getattr(self, campo) + getattr(outro, campo))
+        espaco = self.LIMITE_DIVERGENCIAS - len(self.divergencias)
+        self.divergencias.extend(outro.divergencias[:max(0, espaco)])
+
+    def divergentes(self):
+        return self.ausentes + self.extras + self.tid_diferente + self.hash_diferente
+
+def verificar_faixa_oids(fs_caminho, banco_destino, oid_inicio, oid_fim, posicoes):
+    """Worker: comparar todos os oids em [oid_inicio, oid_fim] entre origem e destino
+
+    posicoes são os (oid, posição no arquivo) da faixa, em ordem de oid,
+    tirados do índice pelo processo principal: o worker lê os registros do
+    arquivo mapeado, sem carregar o índice. Os dois lados são percorridos
+    em ordem de oid (merge); o destino é lido com cursor de servidor e o
+    hash do estado é calculado no PostgreSQL.
+    """
+    resultado = ResultadoVerificacao()
+    arquivo = open(fs_caminho, 'rb')
+    mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+    conn = conectar_destino(banco_destino)
+    try:
+        consulta = consulta_estado_atual(conn.cursor())
+        cursor = conn.cursor(name='verificacao')
+        cursor.itersize = 5000
+        cursor.execute(consulta + " AND o.zoid BETWEEN %s AND %s ORDER BY 1",
+                       (oid_inicio, oid_fim))
+
+        destino = next(cursor, None)
+        for zoid, pos in posicoes:
+            while destino is not None and destino[0] < zoid:
+                resultado.comparar(destino[0], None, (destino[1], destino[2]))
+                destino = next(cursor, None)
+            if destino is not None and destino[0] == zoid:
+                resultado.comparar(zoid, estado_na_posicao(mapa, pos), (destino[1], destino[2]))
+                destino = next(cursor, None)
+            else:
+                resultado.comparar(zoid, estado_na_posicao(mapa, pos), None)
+        while destino is not None:
+            resultado.comparar(destino[0], None, (destino[1], destino[2]))
+            destino = next(cursor, None)
+        cursor.close()
+    finally:
+        conn.close()
+        mapa.close()
+        arquivo.close()
+    return resultado
+
+def verificar_amostra(fs_caminho, banco_destino, tamanho_amostra):
+    """Comparar uma amostra aleatória de oids da origem com o destino"""
+    resultado = ResultadoVerificacao()
+    source = FileStorage(fs_caminho, read_only=True)
+    conn = conectar_destino(banco_destino)
+    try:
+        oids = list(source._index)
+        amostra = random.sample(oids, min(tamanho_amostra, len(oids)))
+        cursor = conn.cursor()
+        consulta = consulta_estado_atual(cursor)
+        for inicio in range(0, len(amostra), 1000):
+            lote = amostra[inicio:inicio + 1000]
+            cursor.execute(consulta + " AND o.zoid = ANY(%s)", ([u64(oid) for oid in lote],))
+            destino = {zoid: (tid, md5) for zoid, tid, md5 in cursor.fetchall()}
+            for oid in lote:
+                zoid = u64(oid)
+                resultado.comparar(zoid, estado_origem(source, oid), destino.get(zoid))
+    finally:
+        conn.close()
+        source.close()
+    return resultado
+
+def faixas_de_oids(fs_caminho, num_faixas):
+    """Dividir os oids da origem em faixas [início, fim] com quantidades semelhantes
+
+    O índice é percorrido uma só vez: cada faixa leva seus (oid, posição),
+    em ordem de oid, para o worker que a verifica.
+    """
+    source = FileStorage(fs_caminho, read_only=True)
+    try:
+        posicoes = [(u64(oid), pos) for oid, pos in source._index.iteritems()]
+    finally:
+        source.close()
+    if not posicoes:
+        return []
+
+    passo = max(1, len(posicoes) // num_faixas)
+    faixas = []
+    for i in range(0, len(posicoes), passo):
+        fim = posicoes[i + passo][0] - 1 if i + passo < len(posicoes) else 2 ** 63 - 1
+        faixas.append((0 if i == 0 else posicoes[i][0], fim, posicoes[i:i + passo]))
+    return faixas
+
+def verificar_checksums(nome, fs_caminho, banco_destino, modo='amostra', tamanho_amostra=1000, workers=None):
+    """Comparar origem e destino por oid -> (tid, hash do estado)
+
+    modo 'amostra': oids sorteados da origem; modo 'completa': todos os oids,
+    em paralelo por faixas de oid, incluindo objetos que só existem no destino.
+    """
+    logger.info(f"\n{'='*60}")
+    logger.info(f"VERIFICANDO ({modo.upper()}): {nome} em {banco_destino}")
+    logger.info(f"{'='*60}")
+
+    start_time = time.time()
+    try:
+        if modo == 'amostra':
+            resultado = verificar_amostra(fs_caminho, banco_destino, tamanho_amostra)
+        else:
+            workers = workers or os.cpu_count() or 1
+            resultado = ResultadoVerificacao()
+            faixas = faixas_de_oids(fs_caminho, workers * 4)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futuros = [
+                    executor.submit(verificar_faixa_oids, fs_caminho, banco_destino, inicio, fim, posicoes)
+                    for inicio, fim, posicoes in faixas
+                ]
+                for concluidas, futuro in enumerate(as_completed(futuros), 1):
+                    resultado.somar(futuro.result())
+                    logger.info(f"  Faixas: {concluidas}/{len(faixas)} - "
+                                f"{resultado.verificados:,} objetos verificados")
+    except Exception as e:
+        logger.error(f"✗ Erro na verificação: {e}")
+        return False
+
+    elapsed = time.time() - start_time
+    logger.info(f"  Objetos verificados: {resultado.verificados:,} em {elapsed:.2f}s")
+    logger.info(f"  Iguais: {resultado.iguais:,}")
+    if resultado.divergentes():
+        logger.warning(
+            f"  Divergências: {resultado.divergentes():,} "
+            f"(ausentes no destino: {resultado.ausentes:,}, ausentes na origem: {resultado.extras:,}, "
+            f"tid diferente: {resultado.tid_diferente:,}, estado diferente: {resultado.hash_diferente:,})")
+        for zoid, motivo, origem, destino in resultado.divergencias:
+            logger.warning(f"    oid {zoid}: {motivo} - origem {origem}, destino {destino}")
+        if not (resultado.extras or resultado.tid_diferente or resultado.hash_diferente) \
+                and destino_sem_historico(banco_destino):
+            logger.info("  Só há objetos ausentes no destino: esperado se ele foi migrado "
+                        "com --sem-historico (objetos sem referência não são copiados)")
+            return True
+        logger.error("✗ Destino diverge da origem")
+        return False
+
+    logger.info("✓ Destino confere com a origem")
+    return True
+
+def ultimo_tid_destino(banco_destino, nome):
+    """Último tid da origem já copiado para o destino (None se não houver dados) e se o schema guarda histórico
+
+    Com histórico, é o maior tid da tabela transaction. No history-free, o
+    MAX(tid) de object_state fica para trás quando as últimas transações só
+    tocaram objetos descartados (sem referência ou removidos), e elas seriam
+    copiadas de novo a cada passada; por isso o tid é lido do checkpoint,
+    gravado pela cópia sem histórico e por cada sincronização.
+    """
+    conn = conectar_destino(banco_destino)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT to_regclass('object_state'), to_regclass('transaction'), to_regclass(%s)",
+                       (CHECKPOINT_TABLE,))
+        tem_object_state, tem_transaction, tem_checkpoint = cursor.fetchone()
+        if tem_object_state is None:
+            return None, True
+        if tem_transaction is not None:
+            cursor.execute("SELECT MAX(tid) FROM transaction WHERE tid > 0")
+            return cursor.fetchone()[0], True
+        if tem_checkpoint is not None:
+            cursor.execute(f"SELECT ultimo_tid FROM {CHECKPOINT_TABLE} WHERE nome = %s", (nome,))
+            linha = cursor.fetchone()
+            if linha is not None:
+                return linha[0], False
+        # Destino copiado antes do checkpoint: aproximação pelos objetos gravados
+        cursor.execute("SELECT MAX(tid) FROM object_state")
+        return cursor.fetchone()[0], False
+    finally:
+        conn.close()
+
+def sincronizar_incremental(nome, fs_caminho, banco_destino, opcoes):
+    """Copiar só as transações gravadas na origem depois do último tid do destino
+
+    Pode rodar com o Zope ainda usando o FileStorage: o arquivo é reaberto
+    a cada passada e a transação em andamento no fim do arquivo é ignorada.
+    Se o destino estiver vazio, faz antes a cópia inicial pelo modo bulk.
+    """
+    logger.info(f"\n{'='*60}")
+    logger.info(f"SINCRONIZANDO (INCREMENTAL): {nome} para {banco_destino}")
+    logger.info(f"{'='*60}")
+
+    if not os.path.exists(fs_caminho):
+        logger.error(f"Arquivo não encontrado: {fs_caminho}")
+        return False
+
+    try:
+        ultimo_tid, keep_history = ultimo_tid_destino(banco_destino, nome)
+    except psycopg2.OperationalError:
+        ultimo_tid, keep_history = None, True
+    if ultimo_tid is None:
+        logger.info("Destino vazio: fazendo a cópia inicial")
+        if opcoes.sem_historico and banco_destino in BANCOS_SEM_HISTORICO:
+            return migrar_sem_historico(nome, fs_caminho, banco_destino)
+        return migrar_bulk(nome, fs_caminho, banco_destino)
+    if not keep_history and destino_com_blobs(banco_destino, nome):
+        logger.error("✗ O destino recebeu arquivos movidos para blobs (--blobs): os oids desses "
+                     "blobs são os próximos da origem e seriam sobrescritos pelas transações novas. "
+                     "Refaça a cópia completa com o Zope parado")
+        return False
+
+    source = None
+    destination = None
+    conn_checkpoint = None
+    try:
+        source = FileStorage(fs_caminho, read_only=True)
+        if not any(True for _ in source.iterator(start=p64(ultimo_tid), stop=p64(ultimo_tid))):
+            logger.error(f"✗ Tid {ultimo_tid} do destino não existe na origem "
+                         f"(a origem foi compactada ou é outro arquivo)")
+            return False
+
+        opcoes_relstorage = Options(keep_history=keep_history, pack_gc=False,
+                                    **RELSTORAGE_MIGRACAO)
+        destination = RelStorage(
+            adapter=PostgreSQLAdapter(dsn=montar_dsn(banco_destino), options=opcoes_relstorage),
+            name=nome,
+            options=opcoes_relstorage,
+        )
+
+        if not keep_history:
+            # Sem a tabela transaction, o tid copiado só fica registrado no checkpoint
+            preparar_checkpoint(banco_destino)
+            checkpoint = ler_checkpoint(banco_destino, nome)
+            transacoes = checkpoint[2] if checkpoint else 0
+            conn_checkpoint = conectar_destino(banco_destino)
+
+        start_time = time.time()
+        copiadas = 0
+        num_bytes = 0
+        for txn in source.iterator(start=p64(ultimo_tid + 1)):
+            restaurar_transacao(destination, txn, 'incremental')
+            copiadas += 1
+            num_bytes += txn._tend - txn._tpos + 8
+            if conn_checkpoint is not None:
+                gravar_checkpoint(conn_checkpoint, nome, fs_caminho, u64(txn.tid), transacoes + copiadas)
+
+        elapsed = time.time() - start_time
+        if copiadas:
+            logger.info(f"✓ {copiadas:,} transações novas ({num_bytes / 1024 / 1024:.1f} MB) "
+                        f"copiadas em {elapsed:.2f}s")
+        else:
+            logger.info("✓ Destino já está em dia com a origem")
+        return True
+
+    except Exception as e:
+        logger.error(f"✗ Erro na sincronização incremental: {e}")
+        return False
+
+    finally:
+        if conn_checkpoint is not None:
+            conn_checkpoint.close()
+        if destination is not None:
+            destination.close()
+        if source is not None:
+            source.close()
+
 def verificar_migracao(banco_destino):
     """Verificar se a migração foi bem sucedida"""
     try:
@@ -379,6 +2062,10 @@ def verificar_migracao(banco_destino):
         tabelas_essenciais = ['object_state', 'current_object', 'transaction']
         
         for tabela in tabelas_essenciais:
+            cursor.execute("SELECT to_regclass(%s)", (tabela,))
+            if cursor.fetchone()[0] is None:
+                # Schema history-free não tem current_object nem transaction
+                continue
             cursor.execute(f"SELECT COUNT(*) FROM {tabela}")
             count = cursor.fetchone()[0]
             logger.info(f"  {tabela}: {count:,} registros")
@@ -397,7 +2084,116 @@ def verificar_migracao(banco_destino):
         logger.warning(f"  Verificação incompleta: {e}")
         return False
 
-def main():
+def parse_args(argv=None):
+    """Opções de linha de comando"""
+    parser = argparse.ArgumentParser(description="Migração ZODB (FileStorage) → RelStorage/PostgreSQL")
+    parser.add_argument(
+        '--modo', choices=['padrao', 'paralelo', 'retomavel', 'bulk', 'incremental'], default='padrao',
+        help="padrao: copyTransactionsFrom sequencial; "
+             "paralelo: segmentos copiados por vários processos; "
+             "retomavel: cópia sequencial com checkpoint, continua de onde parou; "
+             "bulk: COPY binário direto nas tabelas (destino vazio); "
+             "incremental: copia só as transações novas desde o último tid do destino "
+             "(pode rodar com o Zope no ar; faz a cópia inicial se o destino estiver vazio)")
+    parser.add_argument(
+        '--sem-historico', action='store_true',
+        help="Copiar sapl_documentos só com as revisões atuais alcançáveis, "
+             "direto para o schema history-free (keep-history false)")
+    parser.add_argument(
+        '--blobs', metavar='DIRETORIO', default=None,
+        help="Com --sem-historico: mover o conteúdo de Files/Images grandes de sapl_documentos "
+             "para blobs neste diretório (use shared-blob-dir true no buildout.cfg); "
+             "o banco copiado assim não aceita --modo incremental")
+    parser.add_argument(
+        '--limiar-blob-kb', type=int, default=256,
+        help="Tamanho mínimo de um arquivo para ir para blob com --blobs (padrão: 256 KB)")
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help="Número de processos nos modos paralelos, na verificação e na checagem de integridade (padrão: número de CPUs)")
+    parser.add_argument(
+        '--intervalo', type=float, default=0,
+        help="No modo incremental, repetir a sincronização a cada N segundos até Ctrl+C "
+             "(padrão: uma única passada, a usada na virada final com o Zope parado)")
+    parser.add_argument(
+        '--integridade', nargs='+', metavar='ARQUIVO_FS', default=None,
+        help="Só verificar a integridade dos FileStorages indicados (ex.: backups) e sair")
+    parser.add_argument(
+        '--verificar', choices=['amostra', 'completa'], default=None,
+        help="Depois da migração, comparar oid -> (tid, hash do estado) entre origem e destino: "
+             "amostra: oids sorteados; completa: todos os oids, em paralelo")
+    parser.add_argument(
+        '--amostra', type=int, default=1000,
+        help="Quantidade de oids sorteados em --verificar amostra (padrão: 1000)")
+    parser.add_argument(
+        '--somente-verificar', action='store_true',
+        help="Não limpar nem migrar: só executar a verificação de --verificar (padrão: completa)")
+    opcoes = parser.parse_args(argv)
+    if opcoes.blobs and not opcoes.sem_historico:
+        parser.error("--blobs só pode ser usado com --sem-historico")
+    if opcoes.blobs and opcoes.modo == 'incremental':
+        # Os blobs recebem oids da origem ainda livres, que o Zope no ar vai usar
+        parser.error("--blobs não pode ser usado com --modo incremental: faça a cópia "
+                     "com o Zope parado")
+    return opcoes
+
+def migrar(nome, fs_caminho, banco_destino, opcoes):
+    """Migrar um FileStorage usando o modo escolhido na linha de comando"""
+    if opcoes.modo == 'incremental':
+        return sincronizar_incremental(nome, fs_caminho, banco_destino, opcoes)
+    if opcoes.sem_historico and banco_destino in BANCOS_SEM_HISTORICO:
+        return migrar_sem_historico(nome, fs_caminho, banco_destino, blob_dir=opcoes.blobs,
+                                    limiar_blob_kb=opcoes.limiar_blob_kb)
+    if opcoes.modo == 'paralelo':
+        return migrar_paralelo(nome, fs_caminho, banco_destino, workers=opcoes.workers)
+    if opcoes.modo == 'retomavel':
+        return migrar_retomavel(nome, fs_caminho, banco_destino)
+    if opcoes.modo == 'bulk':
+        return migrar_bulk(nome, fs_caminho, banco_destino)
+    return migrar_com_keep_history_true(nome, fs_caminho, banco_destino)
+
+def verificar(nome, fs_caminho, banco_destino, opcoes):
+    """Verificar um banco migrado usando o modo escolhido na linha de comando"""
+    return verificar_checksums(nome, fs_caminho, banco_destino, modo=opcoes.verificar,
+                               tamanho_amostra=opcoes.amostra, workers=opcoes.workers)
+
+ARQUIVOS_FILESTORAGE = {
+    'main': '/var/openlegis/SAGL5/var/filestorage/Data.fs',
+    'sapl_documentos': '/var/openlegis/SAGL5/var/filestorage/sapl_documentos.fs'
+}
+
+def sincronizar_continuamente(opcoes):
+    """Repetir a sincronização incremental dos dois bancos a cada opcoes.intervalo segundos"""
+    passada = 0
+    try:
+        while True:
+            passada += 1
+            logger.info(f"\nPassada incremental {passada}")
+            for nome, banco in (('main', 'zodb'), ('sapl_documentos', 'sapl_documentos')):
+                if os.path.exists(ARQUIVOS_FILESTORAGE[nome]):
+                    sincronizar_incremental(nome, ARQUIVOS_FILESTORAGE[nome], banco, opcoes)
+            time.sleep(opcoes.intervalo)
+    except KeyboardInterrupt:
+        logger.info("Sincronização contínua interrompida; pare o Zope e execute "
+                    "--modo incremental sem --intervalo para a virada final")
+    return True
+
+def somente_verificar(opcoes):
+    """Verificar os bancos já migrados, sem limpar nem migrar"""
+    sucesso = True
+    for nome, banco in (('main', 'zodb'), ('sapl_documentos', 'sapl_documentos')):
+        if not os.path.exists(ARQUIVOS_FILESTORAGE[nome]):
+            logger.warning(f"{ARQUIVOS_FILESTORAGE[nome]} não encontrado")
+            continue
+        sucesso = verificar(nome, ARQUIVOS_FILESTORAGE[nome], banco, opcoes) and sucesso
+    return sucesso
+
+def main(argv=None):
+    opcoes = parse_args(argv)
+
+    if opcoes.integridade:
+        resultados = [verificar_filestorage(caminho, opcoes.workers) for caminho in opcoes.integridade]
+        return all(resultados)
+
     print("=" * 80)
     print("MIGRAÇÃO ZODB → POSTGRESQL - CORREÇÃO PARA ERRO DE FOREIGN KEY")
     print("Solução: keep_history=True durante a migração")
@@ -419,12 +2215,37 @@ def main():
             password = getpass.getpass("Senha do PostgreSQL: ")
             POSTGRES_CONFIG['superuser_password'] = password
     
+    if opcoes.somente_verificar:
+        opcoes.verificar = opcoes.verificar or 'completa'
+        return somente_verificar(opcoes)
+    
+    if opcoes.modo == 'incremental' and opcoes.intervalo:
+        if not criar_bancos_inexistentes(['zodb', 'sapl_documentos']):
+            logger.error("Falha ao criar os bancos")
+            return False
+        return sincronizar_continuamente(opcoes)
+    
     # 1. Limpar bancos completamente
     print("\n" + "="*80)
     print("1. LIMPEZA COMPLETA DOS BANCOS")
     print("="*80)
     
-    if not limpar_bancos_completamente():
+    bancos = ['zodb', 'sapl_documentos']
+    if opcoes.modo == 'incremental':
+        # A sincronização incremental continua sobre o que já foi copiado;
+        # só os bancos que ainda não existem são criados (vazios)
+        bancos = bancos_inexistentes(bancos)
+        logger.info("Modo incremental: os bancos existentes não são limpos")
+    elif opcoes.modo == 'retomavel':
+        # Bancos com checkpoint são preservados para continuar a cópia
+        # (a cópia sem histórico também grava checkpoint, mas não é retomável)
+        bancos = [banco for nome, banco in (('main', 'zodb'), ('sapl_documentos', 'sapl_documentos'))
+                  if ler_checkpoint(banco, nome) is None
+                  or (opcoes.sem_historico and banco in BANCOS_SEM_HISTORICO)]
+        if len(bancos) < 2:
+            logger.info("Checkpoint encontrado: bancos com migração em andamento não serão limpos")
+    
+    if bancos and not limpar_bancos_completamente(bancos):
         logger.error("Falha na limpeza dos bancos")
         return False
     
@@ -433,13 +2254,10 @@ def main():
     print("2. VERIFICAÇÃO DOS ARQUIVOS")
     print("="*80)
     
-    arquivos = {
-        'main': '/var/openlegis/SAGL5/var/filestorage/Data.fs',
-        'sapl_documentos': '/var/openlegis/SAGL5/var/filestorage/sapl_documentos.fs'
-    }
+    arquivos = ARQUIVOS_FILESTORAGE
     
     for nome, caminho in arquivos.items():
-        if not verificar_filestorage(caminho):
+        if not verificar_filestorage(caminho, opcoes.workers):
             logger.warning(f"Problemas com {caminho}, continuando mesmo assim...")
     
     # 3. Migrar Data.fs (pequeno)
@@ -449,7 +2267,9 @@ def main():
     
     data_migrado = False
     if os.path.exists(arquivos['main']):
-        data_migrado = migrar_com_keep_history_true("main", arquivos['main'], "zodb")
+        data_migrado = migrar("main", arquivos['main'], "zodb", opcoes)
+        if data_migrado and opcoes.verificar:
+            data_migrado = verificar("main", arquivos['main'], "zodb", opcoes)
     else:
         logger.warning("Data.fs não encontrado")
         data_migrado = True  # Considerar OK
@@ -462,7 +2282,9 @@ def main():
     
     docs_migrado = False
     if os.path.exists(arquivos['sapl_documentos']):
-        docs_migrado = migrar_com_keep_history_true("sapl_documentos", arquivos['sapl_documentos'], "sapl_documentos")
+        docs_migrado = migrar("sapl_documentos", arquivos['sapl_documentos'], "sapl_documentos", opcoes)
+        if docs_migrado and opcoes.verificar:
+            docs_migrado = verificar("sapl_documentos", arquivos['sapl_documentos'], "sapl_documentos", opcoes)
     else:
         logger.warning("sapl_documentos.fs não encontrado")
         docs_migrado = True  # Considerar OK
@@ -491,6 +2313,14 @@ environment-vars =
         
         print(config)
         
+        if opcoes.sem_historico:
+            print("\n⚠️  IMPORTANTE: sapl_documentos foi migrado SEM histórico")
+            print("   Mantenha keep-history=false para sapl_documentos no buildout.cfg e no zodbpack.conf")
+            if opcoes.blobs:
+                print(f"   Arquivos grandes foram para blobs: acrescente em <relstorage> de sapl_documentos")
+                print(f"     blob-dir {opcoes.blobs}")
+                print(f"     shared-blob-dir true")
+        
         print("\n⚠️  IMPORTANTE:")
         print("1. Use keep-history=true em AMBOS os bancos no buildout.cfg")
         print("2. Isso evita o erro de foreign key durante a migração")
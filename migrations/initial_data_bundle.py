@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+"""
+Pacote pré-compilado dos dados iniciais do sistema.
+
+Compila o dump db_initial_data.sql uma única vez em um diretório com um
+arquivo JSON lines por tabela (um registro por linha) e um manifest.json
+com as colunas de cada tabela e o hash do SQL de origem. A migration de
+dados iniciais carrega esse pacote diretamente, sem reprocessar o SQL.
+
+O pacote gerado no build fica ao lado do SQL. Se ele não existir ou estiver
+desatualizado, a migration compila o pacote no diretório de cache
+(variável de ambiente SAGL_INITIAL_DATA_CACHE, padrão
+~/.cache/sagl/initial_data) e, se esse diretório não puder ser gravado,
+interpreta o SQL em memória.
+
+Uso (na raiz do projeto):
+    python migrations/initial_data_bundle.py [arquivo.sql] [diretorio_saida]
+"""
+import os
+import re
+import sys
+import json
+import hashlib
+import logging
+import argparse
+from pathlib import Path
+
+logger = logging.getLogger('alembic')
+
+# migrations/ -> raiz do projeto -> src/openlegis.sagl/...
+PROJECT_ROOT = Path(__file__).parent.parent
+SQL_FILE = PROJECT_ROOT / 'src' / 'openlegis.sagl' / 'openlegis' / 'sagl' / 'instalacao' / 'db_initial_data.sql'
+BUNDLE_DIR = SQL_FILE.with_suffix('.bundle')
+MANIFEST = 'manifest.json'
+BUNDLE_VERSION = 1
+CACHE_ENV = 'SAGL_INITIAL_DATA_CACHE'
+
+# Tokens do dump MySQL (comentários e espaços são descartados)
+_TOKEN = re.compile(r"""
+      (?P<skip>\s+|--[^\n]*|\#[^\n]*|/\*.*?\*/)
+    | (?P<string>'(?:[^'\\]|\\.|'')*')
+    | (?P<dstring>"(?:[^"\\]|\\.|"")*")
+    | (?P<ident>`(?:[^`]|``)*`)
+    | (?P<hex>0x[0-9A-Fa-f]*|[xX]'[0-9A-Fa-f]*')
+    | (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+    | (?P<word>\w+)
+    | (?P<punct>.)
+""", re.DOTALL | re.VERBOSE)
+
+# Escapes de string do MySQL (\% e \_ mantêm a barra)
+_ESCAPES = {'0': '\0', "'": "'", '"': '"', 'b': '\b', 'n': '\n', 'r': '\r',
+            't': '\t', 'Z': '\x1a', '\\': '\\', '%': '\\%', '_': '\\_'}
+_ESCAPE = re.compile(r"\\(.)", re.DOTALL)
+
+
+def _unquote(token: str) -> str:
+    """Remove as aspas de uma string SQL e resolve os escapes."""
+    quote = token[0]
+    body = token[1:-1].replace(quote * 2, quote)
+    return _ESCAPE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)), body)
+
+
+def _tokens(content: str):
+    """Gera (tipo, texto) para cada token significativo do dump."""
+    for match in _TOKEN.finditer(content):
+        kind = match.lastgroup
+        if kind != 'skip':
+            yield kind, match.group(kind)
+
+
+class _Statement:
+    """Tokens de um comando do dump, com leitura sequencial."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def expect(self, text):
+        kind, value = self.next()
+        if value != text:
+            raise ValueError(f"Esperado '{text}', encontrado '{value}'")
+
+    def identifier(self):
+        kind, value = self.next()
+        if kind == 'ident':
+            return value[1:-1].replace('``', '`')
+        if kind == 'word':
+            return value
+        raise ValueError(f"Identificador inválido: '{value}'")
+
+    def value(self):
+        """Lê um literal SQL e o converte para o tipo Python equivalente."""
+        kind, value = self.next()
+        binary = False
+        # Introdutores de charset: _binary 'abc', _utf8mb4 'abc'
+        if kind == 'word' and value.startswith('_') and self.peek()[0] in ('string', 'dstring', 'hex'):
+            binary = value.lower() == '_binary'
+            kind, value = self.next()
+        if kind in ('string', 'dstring'):
+            text = _unquote(value)
+            return text.encode('utf-8') if binary else text
+        if kind == 'hex':
+            digits = value[2:] if value.startswith('0x') else value[2:-1]
+            return bytes.fromhex(digits)
+        if kind == 'number':
+            if any(c in value for c in '.eE'):
+                # Mantém o literal: o MySQL converte sem perder precisão (DECIMAL)
+                return value
+            return int(value)
+        if kind == 'word':
+            upper = value.upper()
+            if upper == 'NULL':
+                return None
+            if upper in ('TRUE', 'FALSE'):
+                return int(upper == 'TRUE')
+        raise ValueError(f"Valor não suportado no dump: '{value}'")
+
+
+def _parse_insert(statement: _Statement):
+    """
+    Interpreta um INSERT [IGNORE] INTO `t` [(colunas)] VALUES (...), (...).
+
+    Returns:
+        Tupla (tabela, colunas ou None, lista de registros)
+    """
+    statement.next()  # INSERT
+    kind, value = statement.peek()
+    if value and value.upper() == 'IGNORE':
+        statement.next()
+    kind, value = statement.next()
+    if not value or value.upper() != 'INTO':
+        raise ValueError(f"Esperado INTO, encontrado '{value}'")
+    table = statement.identifier()
+
+    columns = None
+    if statement.peek()[1] == '(':
+        statement.next()
+        columns = [statement.identifier()]
+        while statement.peek()[1] == ',':
+            statement.next()
+            columns.append(statement.identifier())
+        statement.expect(')')
+
+    kind, value = statement.next()
+    if not value or value.upper() not in ('VALUES', 'VALUE'):
+        raise ValueError(f"Esperado VALUES, encontrado '{value}'")
+
+    rows = []
+    while True:
+        statement.expect('(')
+        row = [statement.value()]
+        while statement.peek()[1] == ',':
+            statement.next()
+            row.append(statement.value())
+        statement.expect(')')
+        rows.append(row)
+        if statement.peek()[1] != ',':
+            break
+        statement.next()
+
+    if statement.peek()[0] is not None:
+        raise ValueError(f"Conteúdo inesperado após VALUES: '{statement.peek()[1]}'")
+    return table, columns, rows
+
+
+def parse_sql_dump(content: str) -> dict:
+    """
+    Extrai os registros dos INSERTs de um dump MySQL.
+
+    Comandos que não são INSERT (SET, START TRANSACTION, COMMIT, ...) são
+    ignorados. Os INSERTs de uma mesma tabela são agrupados e devem usar a
+    mesma lista de colunas.
+
+    Args:
+        content: Conteúdo do arquivo SQL
+
+    Returns:
+        Dicionário tabela -> {'columns': lista ou None, 'rows': lista de registros},
+        na ordem em que as tabelas aparecem no dump
+    """
+    tables = {}
+    current = []
+
+    def flush():
+        if not current:
+            return
+        kind, value = current[0]
+        if kind == 'word' and value.upper() == 'INSERT':
+            table, columns, rows = _parse_insert(_Statement(current))
+            data = tables.setdefault(table, {'columns': columns, 'rows': []})
+            if data['columns'] != columns:
+                raise ValueError(f"Tabela {table}: INSERTs com listas de colunas diferentes")
+            data['rows'].extend(rows)
+        current.clear()
+
+    for token in _tokens(content):
+        if token == ('punct', ';'):
+            flush()
+        else:
+            current.append(token)
+    flush()
+    return tables
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return {'$hex': value.hex()}
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+def _decode(obj):
+    if '$hex' in obj:
+        return bytes.fromhex(obj['$hex'])
+    return obj
+
+
+def sql_hash(sql_file: Path) -> str:
+    """SHA-256 do arquivo SQL (identifica se o pacote está atualizado)."""
+    digest = hashlib.sha256()
+    with open(sql_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def table_file_name(table: str) -> str:
+    """Nome do arquivo JSON lines de uma tabela."""
+    return f"{table}.jsonl"
+
+
+def default_cache_dir() -> Path:
+    """Diretório de cache do pacote (SAGL_INITIAL_DATA_CACHE ou ~/.cache/sagl/initial_data)."""
+    configured = os.environ.get(CACHE_ENV)
+    if configured:
+        return Path(configured)
+    cache_home = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(cache_home) / 'sagl' / 'initial_data'
+
+
+def read_sql_dump(sql_file: Path) -> dict:
+    """Lê e interpreta o dump SQL (veja parse_sql_dump)."""
+    with open(sql_file, 'r', encoding='utf-8') as f:
+        return parse_sql_dump(f.read())
+
+
+def write_bundle(tables: dict, digest: str, bundle_dir: Path) -> dict:
+    """
+    Grava as tabelas de parse_sql_dump como pacote (um JSON lines por tabela).
+
+    Args:
+        tables: Resultado de parse_sql_dump
+        digest: SHA-256 do SQL de origem
+        bundle_dir: Diretório do pacote (criado se não existir)
+
+    Returns:
+        Manifest gravado (tabelas, colunas, número de registros e hash do SQL)
+    """
+    bundle_dir = Path(bundle_dir)
+    bundle_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {'version': BUNDLE_VERSION, 'sql_sha256': digest, 'tables': {}}
+    for table, data in tables.items():
+        with open(bundle_dir / table_file_name(table), 'w', encoding='utf-8') as f:
+            for row in data['rows']:
+                f.write(json.dumps(row, ensure_ascii=False, default=_encode))
+                f.write('\n')
+        manifest['tables'][table] = {'columns': data['columns'], 'rows': len(data['rows'])}
+
+    # Manifest por último: um pacote só é válido depois de gravado por completo
+    with open(bundle_dir / MANIFEST, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    return manifest
+
+
+def compile_bundle(sql_file: Path = SQL_FILE, bundle_dir: Path = BUNDLE_DIR) -> dict:
+    """
+    Compila o dump SQL em um pacote de dados (um JSON lines por tabela).
+
+    Args:
+        sql_file: Arquivo SQL de dados iniciais
+        bundle_dir: Diretório do pacote (criado se não existir)
+
+    Returns:
+        Manifest gravado (tabelas, colunas, número de registros e hash do SQL)
+    """
+    sql_file = Path(sql_file)
+    return write_bundle(read_sql_dump(sql_file), sql_hash(sql_file), bundle_dir)
+
+
+def read_manifest(bundle_dir: Path = BUNDLE_DIR):
+    """Lê o manifest do pacote (None se o pacote não existir)."""
+    try:
+        with open(Path(bundle_dir) / MANIFEST, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        # Pacote ausente, ilegível ou gravado pela metade
+        return None
+    if manifest.get('version') != BUNDLE_VERSION:
+        return None
+    return manifest
+
+
+def iter_table_rows(table: str, bundle_dir: Path = BUNDLE_DIR):
+    """Gera os registros (listas de valores) de uma tabela do pacote."""
+    with open(Path(bundle_dir) / table_file_name(table), 'r', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line, object_hook=_decode)
+
+
+class Bundle:
+    """
+    Pacote carregado: manifest e registros de cada tabela, lidos do
+    diretório do pacote ou, sem pacote gravado, mantidos em memória.
+    """
+
+    def __init__(self, manifest: dict, bundle_dir: Path = None, tables: dict = None):
+        self.manifest = manifest
+        self.bundle_dir = bundle_dir
+        self._tables = tables
+
+    @classmethod
+    def from_tables(cls, tables: dict, digest: str) -> 'Bundle':
+        """Pacote em memória, a partir do resultado de parse_sql_dump."""
+        manifest = {
+            'version': BUNDLE_VERSION,
+            'sql_sha256': digest,
+            'tables': {table: {'columns': data['columns'], 'rows': len(data['rows'])}
+                       for table, data in tables.items()},
+        }
+        return cls(manifest, tables=tables)
+
+    @property
+    def tables(self) -> dict:
+        """Tabela -> {'columns': lista ou None, 'rows': número de registros}."""
+        return self.manifest['tables']
+
+    def iter_rows(self, table: str):
+        """Gera os registros (listas de valores) de uma tabela."""
+        if self._tables is not None:
+            return iter(self._tables[table]['rows'])
+        return iter_table_rows(table, self.bundle_dir)
+
+
+def load_bundle(sql_file: Path = SQL_FILE, cache_dir: Path = None) -> Bundle:
+    """
+    Obtém um pacote atualizado, recompilando se necessário.
+
+    Usa o pacote gerado no build (ao lado do SQL) ou o do diretório de
+    cache, o que estiver atualizado. Se nenhum estiver, compila o pacote no
+    diretório de cache; se ele não puder ser gravado (implantação somente
+    leitura), interpreta o SQL em memória. Sem o arquivo SQL, usa o pacote
+    existente.
+
+    Args:
+        sql_file: Arquivo SQL de dados iniciais
+        cache_dir: Diretório de cache (None = default_cache_dir())
+
+    Returns:
+        Pacote carregado (Bundle)
+
+    Raises:
+        FileNotFoundError: Se não houver nem pacote nem arquivo SQL
+    """
+    sql_file = Path(sql_file)
+    cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+    locations = [sql_file.with_suffix('.bundle'), cache_dir]
+
+    if not sql_file.exists():
+        for location in locations:
+            manifest = read_manifest(location)
+            if manifest is not None:
+                return Bundle(manifest, location)
+        raise FileNotFoundError(f"Arquivo SQL não encontrado: {sql_file}")
+
+    digest = sql_hash(sql_file)
+    for location in locations:
+        manifest = read_manifest(location)
+        if manifest is not None and manifest.get('sql_sha256') == digest:
+            return Bundle(manifest, location)
+
+    tables = read_sql_dump(sql_file)
+    logger.info(f"Compilando pacote de dados iniciais em {cache_dir}...")
+    try:
+        return Bundle(write_bundle(tables, digest, cache_dir), cache_dir)
+    except OSError as e:
+        logger.warning(f"⚠️  Não foi possível gravar o pacote em {cache_dir}: {e}")
+        logger.warning(f"   Usando os dados interpretados em memória (defina {CACHE_ENV})")
+        return Bundle.from_tables(tables, digest)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compila db_initial_data.sql em um pacote JSON lines por tabela")
+    parser.add_argument('sql_file', nargs='?', default=str(SQL_FILE), help="Dump SQL de dados iniciais")
+    parser.add_argument('bundle_dir', nargs='?', default=None,
+                        help="Diretório do pacote (padrão: ao lado do SQL, com extensão .bundle)")
+    args = parser.parse_args(argv)
+
+    sql_file = Path(args.sql_file)
+    bundle_dir = Path(args.bundle_dir) if args.bundle_dir else sql_file.with_suffix('.bundle')
+    manifest = compile_bundle(sql_file, bundle_dir)
+    total = sum(table['rows'] for table in manifest['tables'].values())
+    print(f"{len(manifest['tables'])} tabelas, {total} registros -> {bundle_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Relatório de execução da migração de dados, com métricas por tabela.
+
+Para cada tabela registra os registros lidos e gravados, o volume lido
+(aproximado), o tempo gasto em cada etapa (leitura na origem, conversão e
+gravação no destino) e os lotes reenviados depois de uma falha. Ao final,
+o relatório é gravado em JSON e resumido no log, das tabelas mais lentas
+para as mais rápidas, para ajustar o tamanho do lote de cada tabela.
+"""
+import json
+import time
+import logging
+import datetime
+import threading
+from pathlib import Path
+
+logger = logging.getLogger('alembic')
+
+
+def row_bytes(rows) -> int:
+    """
+    Volume aproximado de um lote: tamanho de textos e binários, 8 bytes
+    para os demais valores (números e datas) e nada para NULL.
+    """
+    total = 0
+    for row in rows:
+        for value in row:
+            if value is None:
+                continue
+            if isinstance(value, (str, bytes, bytearray)):
+                total += len(value)
+            else:
+                total += 8
+    return total
+
+
+class TableMetrics:
+    """
+    Métricas da cópia de uma tabela (ou de uma faixa da chave primária).
+
+    Cada cópia usa seu próprio objeto, sem trava; as faixas de uma mesma
+    tabela são somadas no MigrationReport.
+    """
+
+    COUNTERS = ('batches', 'rows_read', 'rows_written', 'rows_failed', 'bytes_read', 'retries')
+    TIMERS = ('fetch_seconds', 'convert_seconds', 'write_seconds')
+
+    def __init__(self, batch_size: int = None):
+        self.batch_size = batch_size
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        for name in self.TIMERS:
+            setattr(self, name, 0.0)
+        self.parts = 1
+        self.started_at = time.time()
+        self.finished_at = None
+        self.error = None
+
+    def finish(self, error: Exception = None):
+        self.finished_at = time.time()
+        if error is not None:
+            self.error = str(error)
+
+    def merge(self, other: 'TableMetrics'):
+        """Soma as métricas de outra faixa da mesma tabela."""
+        for name in self.COUNTERS + self.TIMERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.parts += other.parts
+        self.started_at = min(self.started_at, other.started_at)
+        self.finished_at = max(self.finished_at or 0, other.finished_at or 0) or None
+        self.error = self.error or other.error
+
+    @property
+    def elapsed_seconds(self) -> float:
+        """Tempo de relógio, do início da primeira faixa ao fim da última."""
+        return (self.finished_at or time.time()) - self.started_at
+
+    def to_dict(self) -> dict:
+        elapsed = self.elapsed_seconds
+        data = {'batch_size': self.batch_size, 'parts': self.parts}
+        data.update((name, getattr(self, name)) for name in self.COUNTERS)
+        data.update((name, round(getattr(self, name), 3)) for name in self.TIMERS)
+        data['elapsed_seconds'] = round(elapsed, 3)
+        data['rows_per_second'] = round(self.rows_read / elapsed, 1) if elapsed > 0 else None
+        data['error'] = self.error
+        return data
+
+
+class MigrationReport:
+    """
+    Relatório de uma execução: métricas por tabela, somadas com trava
+    (as tabelas e faixas são copiadas em paralelo).
+    """
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self.started_at = time.time()
+        self.finished_at = None
+        self.tables = {}
+        self._lock = threading.Lock()
+
+    def add(self, table_name: str, metrics: TableMetrics):
+        """Registra as métricas de uma cópia (tabela inteira ou faixa)."""
+        with self._lock:
+            current = self.tables.get(table_name)
+            if current is None:
+                self.tables[table_name] = metrics
+            else:
+                current.merge(metrics)
+
+    def finish(self):
+        self.finished_at = time.time()
+
+    def slowest(self) -> list:
+        """(tabela, métricas) das tabelas mais demoradas para as mais rápidas."""
+        with self._lock:
+            items = list(self.tables.items())
+        return sorted(items, key=lambda item: item[1].elapsed_seconds, reverse=True)
+
+    def to_dict(self) -> dict:
+        finished_at = self.finished_at or time.time()
+        tables = self.slowest()
+        totals = {name: sum(getattr(metrics, name) for _, metrics in tables) for name in TableMetrics.COUNTERS}
+        totals.update(
+            (name, round(sum(getattr(metrics, name) for _, metrics in tables), 3)) for name in TableMetrics.TIMERS
+        )
+        return {
+            'started_at': datetime.datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'),
+            'finished_at': datetime.datetime.fromtimestamp(finished_at).isoformat(timespec='seconds'),
+            'elapsed_seconds': round(finished_at - self.started_at, 3),
+            'settings': self.settings,
+            'totals': totals,
+            'tables': {table_name: metrics.to_dict() for table_name, metrics in tables},
+        }
+
+    def write_json(self, path) -> Path:
+        """Grava o relatório em JSON (tabelas das mais lentas para as mais rápidas)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=1)
+        return path
+
+    def log_summary(self, limit: int = None):
+        """
+        Registra no log um resumo por tabela, das mais lentas para as mais rápidas.
+
+        Args:
+            limit: Número máximo de tabelas no resumo (None = todas)
+        """
+        tables = self.slowest()
+        if not tables:
+            return
+        logger.info("=" * 104)
+        logger.info(
+            f"{'TABELA':<33}{'LIDOS':>10}{'GRAVADOS':>10}{'MB':>8}{'LEITURA':>9}"
+            f"{'CONVERS.':>9}{'GRAVAÇÃO':>9}{'TOTAL':>9}{'REENV.':>7}{'REG/S':>10}"
+        )
+        logger.info("=" * 104)
+        for table_name, metrics in tables[:limit]:
+            elapsed = metrics.elapsed_seconds
+            rate = metrics.rows_read / elapsed if elapsed > 0 else 0
+            logger.info(
+                f"{table_name[:32]:<33}{metrics.rows_read:>10}{metrics.rows_written:>10}"
+                f"{metrics.bytes_read / 1048576:>8.1f}{metrics.fetch_seconds:>9.2f}"
+                f"{metrics.convert_seconds:>9.2f}{metrics.write_seconds:>9.2f}"
+                f"{elapsed:>9.2f}{metrics.retries:>7}{rate:>10.0f}"
+            )
+            if metrics.error:
+                logger.warning(f"   ⚠️  {table_name}: {metrics.error}")
+        if limit is not None and len(tables) > limit:
+            logger.info(f"... e mais {len(tables) - limit} tabelas (veja o relatório JSON)")
+        logger.info("=" * 104)
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+Destino PostgreSQL para a migração de dados do SAGL (origem MySQL).
+
+- Estrutura: cria no PostgreSQL as tabelas que ainda não existem, a partir
+  da estrutura refletida do MySQL, com mapeamento de tipos (tinyint(1) ->
+  boolean, blobs -> bytea, datetime -> timestamp, enum -> varchar, ...).
+- Dados: grava cada lote com COPY ... FROM STDIN, convertendo os valores
+  para o tipo da coluna de destino (0/1 -> boolean, datas zeradas do MySQL
+  -> NULL, bytes -> bytea).
+- Sequências: ao final, ajusta as sequências (serial/identity) para depois
+  do maior valor migrado.
+"""
+import io
+import logging
+import datetime
+
+import sqlalchemy as sa
+from sqlalchemy import text
+from sqlalchemy.dialects import mysql
+from sqlalchemy.engine import Connection
+
+from schema_cache import get_schema
+from table_probes import quote_name
+
+logger = logging.getLogger('alembic')
+
+
+def is_postgresql(connection: Connection) -> bool:
+    """Verifica se a conexão é com um banco PostgreSQL."""
+    return connection.dialect.name == 'postgresql'
+
+
+def map_column_type(column_type):
+    """
+    Converte um tipo do MySQL refletido pelo SQLAlchemy no tipo equivalente
+    do PostgreSQL.
+
+    Args:
+        column_type: Tipo SQLAlchemy da coluna no MySQL
+
+    Returns:
+        Tipo SQLAlchemy genérico para criar a coluna no PostgreSQL
+    """
+    if isinstance(column_type, mysql.TINYINT) and column_type.display_width == 1:
+        return sa.Boolean()
+    if isinstance(column_type, mysql.BIT):
+        return sa.Boolean() if (column_type.length or 1) == 1 else sa.LargeBinary()
+    if isinstance(column_type, (mysql.TINYINT, mysql.SMALLINT)):
+        return sa.Integer() if getattr(column_type, 'unsigned', False) else sa.SmallInteger()
+    if isinstance(column_type, mysql.YEAR):
+        return sa.SmallInteger()
+    if isinstance(column_type, (mysql.MEDIUMINT, mysql.INTEGER)):
+        return sa.BigInteger() if getattr(column_type, 'unsigned', False) else sa.Integer()
+    if isinstance(column_type, mysql.BIGINT):
+        # bigint unsigned não cabe em bigint: usa numeric
+        return sa.Numeric(20, 0) if getattr(column_type, 'unsigned', False) else sa.BigInteger()
+    if isinstance(column_type, (mysql.DATETIME, mysql.TIMESTAMP)):
+        return sa.DateTime()
+    if isinstance(column_type, mysql.TIME):
+        return sa.Time()
+    if isinstance(column_type, (mysql.ENUM, mysql.SET)):
+        values = getattr(column_type, 'enums', None) or getattr(column_type, 'values', None) or ['']
+        length = max(len(value) for value in values)
+        # SET guarda vários valores separados por vírgula
+        if isinstance(column_type, mysql.SET):
+            length = sum(len(value) + 1 for value in values)
+        return sa.String(max(length, 1))
+    if isinstance(column_type, (sa.LargeBinary, mysql.BINARY, mysql.VARBINARY)):
+        return sa.LargeBinary()
+    if isinstance(column_type, (mysql.TINYTEXT, mysql.MEDIUMTEXT, mysql.LONGTEXT, sa.Text)):
+        return sa.Text()
+    if isinstance(column_type, (sa.String,)):
+        return sa.String(column_type.length) if column_type.length else sa.Text()
+    if isinstance(column_type, (mysql.DOUBLE, mysql.FLOAT, mysql.REAL)):
+        return sa.Float()
+    if isinstance(column_type, sa.Numeric):
+        return sa.Numeric(column_type.precision, column_type.scale)
+    return column_type.as_generic()
+
+
+def create_missing_tables(source_conn: Connection, target_conn: Connection, table_names: list) -> list:
+    """
+    Cria no PostgreSQL as tabelas da origem que ainda não existem no destino.
+
+    Apenas colunas, tipos, nulidade e chave primária são criados (chave
+    primária inteira de uma coluna com auto_increment vira serial). Índices,
+    foreign keys e defaults específicos do MySQL ficam de fora: a cópia de
+    dados não depende deles.
+
+    Args:
+        source_conn: Conexão com banco de origem (MySQL)
+        target_conn: Conexão com banco de destino (PostgreSQL)
+        table_names: Tabelas a verificar
+
+    Returns:
+        Lista com as tabelas criadas
+    """
+    target_schema = get_schema(target_conn)
+    metadata = sa.MetaData()
+    created = []
+    for table_name in table_names:
+        if target_schema.has_table(table_name):
+            continue
+        source_table = sa.Table(table_name, sa.MetaData(), autoload_with=source_conn)
+        columns = []
+        for column in source_table.columns:
+            autoincrement = (
+                column.primary_key
+                and column.autoincrement is True
+                and isinstance(column.type, sa.Integer)
+            )
+            columns.append(sa.Column(
+                column.name,
+                map_column_type(column.type),
+                primary_key=column.primary_key,
+                nullable=column.nullable,
+                autoincrement=bool(autoincrement),
+            ))
+        table = sa.Table(table_name, metadata, *columns)
+        table.create(target_conn)
+        created.append(table_name)
+        logger.info(f"Tabela {table_name} criada no PostgreSQL")
+    if created:
+        target_conn.commit()
+        get_schema(target_conn, refresh=True)
+    return created
+
+
+def _is_zero_date(value) -> bool:
+    return isinstance(value, str) and value.startswith('0000-00-00')
+
+
+def _to_boolean(value):
+    if isinstance(value, bytes):
+        return any(value)
+    return bool(int(value))
+
+
+def _to_time(value):
+    # O driver do MySQL devolve colunas TIME como timedelta
+    if isinstance(value, datetime.timedelta):
+        seconds = int(value.total_seconds()) % 86400
+        return datetime.time(seconds // 3600, seconds // 60 % 60, seconds % 60)
+    return value
+
+
+def _to_bytes(value):
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+
+def column_converters(target_conn: Connection, table_name: str, columns: list) -> list:
+    """
+    Define a conversão de cada coluna conforme o tipo no destino PostgreSQL.
+
+    Args:
+        target_conn: Conexão com banco de destino
+        table_name: Nome da tabela
+        columns: Colunas copiadas, na ordem dos registros
+
+    Returns:
+        Lista com uma função de conversão (ou None) por coluna
+    """
+    types = get_schema(target_conn).column_types(table_name)
+    converters = []
+    for column in columns:
+        column_type = types.get(column, '').upper()
+        if column_type == 'BOOLEAN':
+            converter = _to_boolean
+        elif column_type.startswith(('DATE', 'TIMESTAMP')):
+            # Datas zeradas do MySQL ('0000-00-00') não existem no PostgreSQL
+            converter = lambda value: None if _is_zero_date(value) else value
+        elif column_type.startswith('TIME'):
+            converter = _to_time
+        elif column_type == 'BYTEA':
+            converter = _to_bytes
+        else:
+            converter = None
+        converters.append(converter)
+    return converters
+
+
+def convert_rows(rows: list, converters: list) -> list:
+    """Aplica as conversões de column_converters a um lote de registros."""
+    if not any(converters):
+        return [tuple(row) for row in rows]
+    converted = []
+    for row in rows:
+        converted.append(tuple(
+            value if value is None or converter is None else converter(value)
+            for value, converter in zip(row, converters)
+        ))
+    return converted
+
+
+def copy_text_value(value) -> str:
+    """Valor no formato texto do COPY (NULL = \\N, bytea em hexadecimal)."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = '\\x' + bytes(value).hex()
+    elif isinstance(value, (datetime.date, datetime.time)):
+        value = value.isoformat()
+    else:
+        value = str(value)
+    return (value.replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def copy_rows(target_conn: Connection, table_name: str, columns: list, rows: list) -> int:
+    """
+    Grava um lote de registros (já convertidos) com COPY ... FROM STDIN.
+
+    Args:
+        target_conn: Conexão com banco de destino (psycopg2)
+        table_name: Nome da tabela
+        columns: Colunas, na ordem dos valores de cada registro
+        rows: Registros (tuplas de valores)
+
+    Returns:
+        Número de registros gravados
+    """
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_text_value(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    columns_str = ', '.join(quote_name(target_conn, col) for col in columns)
+    cursor = target_conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {quote_name(target_conn, table_name)} ({columns_str}) FROM STDIN", buffer
+        )
+    finally:
+        cursor.close()
+    return len(rows)
+
+
+def insert_rows_on_conflict(target_conn: Connection, table_name: str, columns: list, rows: list,
+                            conflict_columns: list = None, update_columns: list = None, metrics=None):
+    """
+    Insere registros com INSERT ... ON CONFLICT DO NOTHING, isolando os
+    registros que o banco recusa (divisão recursiva do lote, como no MySQL).
+
+    Usado quando o COPY de um lote falha (ex: registros já existentes). Com
+    conflict_columns e update_columns, faz upsert (ON CONFLICT ... DO UPDATE).
+    Com metrics (migration_report.TableMetrics), conta os lotes reenviados.
+
+    Returns:
+        Tupla (inseridos, rejeitados) onde rejeitados é uma lista de (registro, erro)
+    """
+    raw_connection = target_conn.connection.dbapi_connection
+    columns_str = ', '.join(quote_name(target_conn, col) for col in columns)
+    insert_query = (
+        f"INSERT INTO {quote_name(target_conn, table_name)} ({columns_str}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) ON CONFLICT DO NOTHING"
+    )
+    if conflict_columns and update_columns:
+        conflict_str = ', '.join(quote_name(target_conn, col) for col in conflict_columns)
+        update_str = ', '.join(
+            f"{quote_name(target_conn, col)} = EXCLUDED.{quote_name(target_conn, col)}" for col in update_columns
+        )
+        insert_query = insert_query.replace(
+            "ON CONFLICT DO NOTHING", f"ON CONFLICT ({conflict_str}) DO UPDATE SET {update_str}"
+        )
+
+    def insert_batch(batch):
+        cursor = raw_connection.cursor()
+        try:
+            cursor.executemany(insert_query, batch)
+            raw_connection.commit()
+            return len(batch), []
+        except Exception as e:
+            raw_connection.rollback()
+            if len(batch) == 1:
+                return 0, [(batch[0], e)]
+        finally:
+            cursor.close()
+        if metrics is not None:
+            metrics.retries += 1
+        middle = len(batch) // 2
+        inserted_first, failed_first = insert_batch(batch[:middle])
+        inserted_second, failed_second = insert_batch(batch[middle:])
+        return inserted_first + inserted_second, failed_first + failed_second
+
+    return insert_batch(list(rows))
+
+
+def write_rows(target_conn: Connection, table_name: str, columns: list, rows: list, metrics=None):
+    """
+    Grava um lote no PostgreSQL: COPY e, se falhar, INSERT ... ON CONFLICT
+    DO NOTHING registro a registro isolando os recusados. Com metrics, o
+    reenvio depois de um COPY recusado conta como nova tentativa.
+
+    Returns:
+        Tupla (inseridos, rejeitados) onde rejeitados é uma lista de (registro, erro)
+    """
+    raw_connection = target_conn.connection.dbapi_connection
+    try:
+        copy_rows(target_conn, table_name, columns, rows)
+        raw_connection.commit()
+        return len(rows), []
+    except Exception as e:
+        raw_connection.rollback()
+        logger.debug(f"COPY em {table_name} falhou ({e}); inserindo registro a registro")
+    if metrics is not None:
+        metrics.retries += 1
+    return insert_rows_on_conflict(target_conn, table_name, columns, rows, metrics=metrics)
+
+
+def disable_constraints(target_conn: Connection) -> bool:
+    """
+    Desabilita triggers e verificações de foreign key na sessão
+    (session_replication_role = replica, exige superusuário).
+
+    Returns:
+        True se conseguiu desabilitar
+    """
+    raw_connection = target_conn.connection.dbapi_connection
+    cursor = raw_connection.cursor()
+    try:
+        cursor.execute("SET session_replication_role = replica")
+        raw_connection.commit()
+        return True
+    except Exception as e:
+        raw_connection.rollback()
+        logger.debug(f"Não foi possível desabilitar as foreign keys: {e}")
+        return False
+    finally:
+        cursor.close()
+
+
+def enable_constraints(target_conn: Connection):
+    """Reabilita triggers e verificações de foreign key na sessão."""
+    raw_connection = target_conn.connection.dbapi_connection
+    cursor = raw_connection.cursor()
+    try:
+        cursor.execute("SET session_replication_role = DEFAULT")
+        raw_connection.commit()
+    finally:
+        cursor.close()
+
+
+def reset_sequences(target_conn: Connection, table_names: list) -> int:
+    """
+    Ajusta as sequências (serial/identity) das tabelas para depois do maior
+    valor migrado, para que os próximos INSERTs não colidam.
+
+    Args:
+        target_conn: Conexão com banco de destino
+        table_names: Tabelas migradas
+
+    Returns:
+        Número de sequências ajustadas
+    """
+    schema = get_schema(target_conn)
+    reset = 0
+    for table_name in table_names:
+        for column in schema.columns(table_name):
+            sequence = target_conn.execute(
+                text("SELECT pg_get_serial_sequence(:table, :column)"),
+                {'table': quote_name(target_conn, table_name), 'column': column}
+            ).scalar()
+            if not sequence:
+                continue
+            quoted_column = quote_name(target_conn, column)
+            target_conn.execute(text(
+                f"SELECT setval(:sequence, COALESCE(MAX({quoted_column}), 0) + 1, false) "
+                f"FROM {quote_name(target_conn, table_name)}"
+            ), {'sequence': sequence})
+            reset += 1
+            logger.debug(f"Sequência {sequence} ajustada")
+    target_conn.commit()
+    return reset
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Cache da estrutura dos bancos usada pelas migrations de dados.
+
+A estrutura (colunas, tipos, chave primária, foreign keys e número
+aproximado de registros de cada tabela) é lida uma única vez por banco,
+direto do information_schema, e reaproveitada por todas as etapas das
+migrations, em vez de um DESCRIBE ou uma consulta do inspector por tabela.
+"""
+import logging
+import threading
+
+from sqlalchemy import text, inspect
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger('alembic')
+
+_SNAPSHOTS = {}
+_LOCK = threading.Lock()
+
+
+class SchemaSnapshot:
+    """
+    Estrutura de todas as tabelas de um banco.
+
+    Cada tabela é um dicionário com:
+    - columns: nomes das colunas, na ordem da tabela
+    - types: tipo de cada coluna (ex: 'int(11)', 'varchar(255)')
+    - primary_key: colunas da chave primária, na ordem da chave
+    - foreign_keys: lista de {'name', 'constrained_columns', 'referred_table',
+      'referred_columns'}, no formato do inspector do SQLAlchemy
+    - rows: número aproximado de registros (None se desconhecido)
+    """
+
+    def __init__(self, tables: dict):
+        self.tables = tables
+
+    @classmethod
+    def load(cls, connection: Connection) -> 'SchemaSnapshot':
+        """
+        Lê a estrutura do banco da conexão.
+
+        No MySQL/MariaDB usa o information_schema (uma consulta para colunas,
+        uma para chaves e uma para tabelas); nos demais bancos, o inspector.
+        """
+        if connection.dialect.name in ('mysql', 'mariadb'):
+            return cls._load_information_schema(connection)
+        return cls._load_inspector(connection)
+
+    @classmethod
+    def _load_information_schema(cls, connection: Connection) -> 'SchemaSnapshot':
+        tables = {}
+        result = connection.execute(text(
+            "SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'"
+        ))
+        for table_name, table_rows in result:
+            tables[table_name] = {
+                'columns': [],
+                'types': {},
+                'primary_key': [],
+                'foreign_keys': [],
+                'rows': table_rows,
+            }
+
+        result = connection.execute(text(
+            "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME, ORDINAL_POSITION"
+        ))
+        for table_name, column_name, column_type in result:
+            if table_name in tables:
+                tables[table_name]['columns'].append(column_name)
+                tables[table_name]['types'][column_name] = column_type
+
+        result = connection.execute(text(
+            "SELECT TABLE_NAME, CONSTRAINT_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME "
+            "FROM information_schema.KEY_COLUMN_USAGE "
+            "WHERE TABLE_SCHEMA = DATABASE() "
+            "AND (CONSTRAINT_NAME = 'PRIMARY' OR REFERENCED_TABLE_NAME IS NOT NULL) "
+            "ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION"
+        ))
+        for table_name, constraint_name, column_name, referred_table, referred_column in result:
+            table = tables.get(table_name)
+            if table is None:
+                continue
+            if constraint_name == 'PRIMARY':
+                table['primary_key'].append(column_name)
+                continue
+            foreign_keys = table['foreign_keys']
+            if not foreign_keys or foreign_keys[-1]['name'] != constraint_name:
+                foreign_keys.append({
+                    'name': constraint_name,
+                    'constrained_columns': [],
+                    'referred_table': referred_table,
+                    'referred_columns': [],
+                })
+            foreign_keys[-1]['constrained_columns'].append(column_name)
+            foreign_keys[-1]['referred_columns'].append(referred_column)
+
+        return cls(tables)
+
+    @classmethod
+    def _load_inspector(cls, connection: Connection) -> 'SchemaSnapshot':
+        inspector = inspect(connection)
+        tables = {}
+        for table_name in inspector.get_table_names():
+            columns = inspector.get_columns(table_name)
+            tables[table_name] = {
+                'columns': [col['name'] for col in columns],
+                'types': {col['name']: str(col['type']) for col in columns},
+                'primary_key': list(inspector.get_pk_constraint(table_name).get('constrained_columns') or []),
+                'foreign_keys': [
+                    {
+                        'name': fk.get('name'),
+                        'constrained_columns': fk['constrained_columns'],
+                        'referred_table': fk['referred_table'],
+                        'referred_columns': fk['referred_columns'],
+                    }
+                    for fk in inspector.get_foreign_keys(table_name)
+                ],
+                'rows': None,
+            }
+        return cls(tables)
+
+    def table_names(self) -> list:
+        """Nomes das tabelas, em ordem alfabética."""
+        return sorted(self.tables)
+
+    def has_table(self, table_name: str) -> bool:
+        return table_name in self.tables
+
+    def columns(self, table_name: str) -> list:
+        """Colunas da tabela, na ordem da tabela (vazia se a tabela não existir)."""
+        table = self.tables.get(table_name)
+        return list(table['columns']) if table else []
+
+    def column_types(self, table_name: str) -> dict:
+        """Tipo de cada coluna da tabela."""
+        table = self.tables.get(table_name)
+        return dict(table['types']) if table else {}
+
+    def primary_key(self, table_name: str) -> list:
+        """Colunas da chave primária, na ordem da chave (vazia se não houver)."""
+        table = self.tables.get(table_name)
+        return list(table['primary_key']) if table else []
+
+    def foreign_keys(self, table_name: str) -> list:
+        """Foreign keys da tabela, no formato do inspector do SQLAlchemy."""
+        table = self.tables.get(table_name)
+        return list(table['foreign_keys']) if table else []
+
+    def estimated_rows(self, table_name: str):
+        """Número aproximado de registros (None se desconhecido)."""
+        table = self.tables.get(table_name)
+        return table['rows'] if table else None
+
+    def dependencies(self, table_names: list) -> dict:
+        """
+        Grafo de foreign keys entre as tabelas.
+
+        Args:
+            table_names: Tabelas consideradas
+
+        Returns:
+            Dicionário tabela -> set de tabelas que ela referencia (dentre table_names)
+        """
+        names = set(table_names)
+        return {
+            table_name: ({fk['referred_table'] for fk in self.foreign_keys(table_name)} & names) - {table_name}
+            for table_name in table_names
+        }
+
+
+def _cache_key(connection: Connection):
+    url = connection.engine.url
+    return (url.render_as_string(hide_password=True), url.database)
+
+
+def get_schema(connection: Connection, refresh: bool = False) -> SchemaSnapshot:
+    """
+    Obtém a estrutura do banco da conexão, lida uma única vez por banco.
+
+    Args:
+        connection: Conexão SQLAlchemy
+        refresh: Se True, relê a estrutura (ex: depois de criar tabelas)
+
+    Returns:
+        SchemaSnapshot compartilhado por todas as etapas
+    """
+    key = _cache_key(connection)
+    with _LOCK:
+        snapshot = _SNAPSHOTS.get(key)
+        if snapshot is None or refresh:
+            snapshot = SchemaSnapshot.load(connection)
+            _SNAPSHOTS[key] = snapshot
+            logger.debug(f"Estrutura de {key[1] or key[0]} carregada: {len(snapshot.tables)} tabelas")
+    return snapshot
+
+
+def clear_cache():
+    """Descarta as estruturas em cache (a próxima consulta relê o banco)."""
+    with _LOCK:
+        _SNAPSHOTS.clear()
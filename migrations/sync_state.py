@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Estado da sincronização incremental entre o banco de origem e o de destino.
+
+Para cada tabela, guarda no próprio banco de destino (tabela sagl_sync_state)
+a marca d'água da última sincronização: o maior valor da coluna de controle
+(timestamp de alteração ou chave primária) já copiado. Quando a origem é um
+MySQL com binlog ativo, a posição do binlog no início da sincronização também
+é registrada, como referência para a troca definitiva de servidor.
+"""
+import re
+import logging
+import datetime
+
+import sqlalchemy as sa
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger('alembic')
+
+STATE_TABLE = 'sagl_sync_state'
+
+_metadata = sa.MetaData()
+state_table = sa.Table(
+    STATE_TABLE, _metadata,
+    sa.Column('table_name', sa.String(128), primary_key=True),
+    # 'timestamp', 'pk' ou 'full'
+    sa.Column('mode', sa.String(16), nullable=False),
+    sa.Column('change_column', sa.String(128)),
+    sa.Column('high_water', sa.Text),
+    sa.Column('binlog_file', sa.String(255)),
+    sa.Column('binlog_position', sa.BigInteger),
+    sa.Column('synced_at', sa.DateTime, nullable=False),
+)
+
+
+def ensure_state_table(connection: Connection):
+    """Cria a tabela de estado no destino, se ainda não existir."""
+    state_table.create(connection, checkfirst=True)
+    connection.commit()
+
+
+def load_state(connection: Connection) -> dict:
+    """
+    Lê o estado da última sincronização de cada tabela.
+
+    Returns:
+        Dicionário tabela -> {'mode', 'change_column', 'high_water',
+        'binlog_file', 'binlog_position', 'synced_at'}
+    """
+    result = connection.execute(sa.select(state_table))
+    return {row.table_name: dict(row._mapping) for row in result}
+
+
+def save_table_state(connection: Connection, table_name: str, mode: str, change_column: str,
+                     high_water, binlog=None):
+    """
+    Grava a marca d'água de uma tabela depois de sincronizada.
+
+    Args:
+        connection: Conexão com banco de destino
+        table_name: Nome da tabela
+        mode: 'timestamp', 'pk' ou 'full'
+        change_column: Coluna de controle (None no modo 'full')
+        high_water: Maior valor da coluna de controle já copiado
+        binlog: (arquivo, posição) do binlog da origem, se disponível
+    """
+    binlog_file, binlog_position = binlog or (None, None)
+    connection.execute(state_table.delete().where(state_table.c.table_name == table_name))
+    connection.execute(state_table.insert().values(
+        table_name=table_name,
+        mode=mode,
+        change_column=change_column,
+        high_water=None if high_water is None else str(high_water),
+        binlog_file=binlog_file,
+        binlog_position=binlog_position,
+        synced_at=datetime.datetime.now(),
+    ))
+    connection.commit()
+
+
+def source_binlog_position(connection: Connection):
+    """
+    Posição atual do binlog da origem (MySQL/MariaDB com binlog ativo).
+
+    Returns:
+        Tupla (arquivo, posição) ou None se indisponível
+    """
+    if connection.dialect.name not in ('mysql', 'mariadb'):
+        return None
+    # MySQL 8.4+ usa SHOW BINARY LOG STATUS; versões anteriores e MariaDB, SHOW MASTER STATUS
+    for statement in ("SHOW BINARY LOG STATUS", "SHOW MASTER STATUS"):
+        try:
+            row = connection.execute(text(statement)).first()
+        except Exception:
+            connection.rollback()
+            continue
+        if row:
+            return row[0], row[1]
+        return None
+    return None
+
+
+# Tipos inteiros do MySQL/PostgreSQL/SQLite (int(11), bigint unsigned, integer...),
+# sem confundir com point, multipoint ou interval
+_INTEGER_TYPE = re.compile(r'(tiny|small|medium|big)?int(eger)?\b')
+
+
+def is_integer_type(column_type: str) -> bool:
+    """
+    Verifica se o tipo de uma coluna é inteiro.
+
+    Args:
+        column_type: Tipo da coluna (SchemaSnapshot.column_types)
+
+    Returns:
+        True para int, bigint, tinyint etc., com ou sem tamanho e unsigned
+    """
+    return bool(_INTEGER_TYPE.match((column_type or '').lower()))
+
+
+def find_change_column(column_types: dict):
+    """
+    Coluna de controle de alterações de uma tabela: a primeira coluna do
+    tipo timestamp (no SAGL, atualizada automaticamente a cada alteração).
+
+    Args:
+        column_types: Tipo de cada coluna (SchemaSnapshot.column_types)
+
+    Returns:
+        Nome da coluna ou None
+    """
+    for column, column_type in column_types.items():
+        if column_type.lower().startswith('timestamp'):
+            return column
+    return None
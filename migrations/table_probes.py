@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Consultas rápidas sobre o conteúdo das tabelas usadas pelas migrations.
+
+- Tabela vazia: SELECT EXISTS(SELECT 1 ... LIMIT 1), que para no primeiro
+  registro em vez de percorrer a tabela inteira como o COUNT(*) no InnoDB.
+- Total para progresso: estimativa do information_schema.TABLES.TABLE_ROWS
+  (pg_class.reltuples no PostgreSQL), sem ler a tabela.
+- Total exato: opcional, com COUNT(*) em segundo plano (RowCounter).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from schema_cache import get_schema
+
+logger = logging.getLogger('alembic')
+
+
+def quote_name(connection: Connection, name: str) -> str:
+    """Nome de tabela ou coluna entre aspas, conforme o banco."""
+    return connection.dialect.identifier_preparer.quote_identifier(name)
+
+
+def on_duplicate_key_update(connection: Connection, columns: list) -> str:
+    """
+    Cláusula ON DUPLICATE KEY UPDATE que grava nas colunas os valores novos.
+
+    No MySQL 8.0.19+ usa o alias de linha (... AS new ON DUPLICATE KEY UPDATE
+    col = new.col): a forma VALUES(col) está obsoleta desde o 8.0.20. O
+    MariaDB e as versões anteriores do MySQL só aceitam VALUES(col).
+
+    Args:
+        connection: Conexão SQLAlchemy (MySQL/MariaDB)
+        columns: Colunas atualizadas em registros já existentes
+
+    Returns:
+        Sufixo para o INSERT, a partir do alias (se houver)
+    """
+    dialect = connection.dialect
+    version = dialect.server_version_info or ()
+    quoted = [quote_name(connection, col) for col in columns]
+    if dialect.name == 'mysql' and not getattr(dialect, 'is_mariadb', False) and version >= (8, 0, 19):
+        return " AS new ON DUPLICATE KEY UPDATE " + ', '.join(f"{col} = new.{col}" for col in quoted)
+    return " ON DUPLICATE KEY UPDATE " + ', '.join(f"{col} = VALUES({col})" for col in quoted)
+
+
+def table_has_rows(connection: Connection, table_name: str) -> bool:
+    """
+    Verifica se uma tabela tem pelo menos um registro.
+
+    Args:
+        connection: Conexão SQLAlchemy
+        table_name: Nome da tabela
+
+    Returns:
+        True se a tabela tem dados, False caso contrário
+    """
+    table = quote_name(connection, table_name)
+    result = connection.execute(text(f"SELECT EXISTS(SELECT 1 FROM {table} LIMIT 1)"))
+    return bool(result.scalar())
+
+
+def estimated_row_count(connection: Connection, table_name: str):
+    """
+    Número aproximado de registros, a partir das estatísticas do banco.
+
+    Args:
+        connection: Conexão SQLAlchemy
+        table_name: Nome da tabela
+
+    Returns:
+        Estimativa (int) ou None se o banco não tiver estatística para a tabela
+    """
+    if connection.dialect.name == 'postgresql':
+        result = connection.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+            {'table': quote_name(connection, table_name)}
+        )
+        estimate = result.scalar()
+        # reltuples = -1: tabela ainda não analisada
+        return estimate if estimate is not None and estimate >= 0 else None
+    return get_schema(connection).estimated_rows(table_name)
+
+
+def exact_row_count(connection: Connection, table_name: str) -> int:
+    """Número exato de registros (COUNT(*), percorre a tabela)."""
+    table = quote_name(connection, table_name)
+    return connection.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+
+
+class RowCounter:
+    """
+    Conta os registros das tabelas em segundo plano, numa conexão própria.
+
+    Cada submit() retorna um Future com o COUNT(*) exato; a migração não
+    espera por ele e usa a estimativa enquanto a contagem não termina.
+    """
+
+    def __init__(self, engine, workers: int = 1):
+        self.engine = engine
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='row-counter')
+
+    def _count(self, table_name):
+        with self.engine.connect() as connection:
+            return exact_row_count(connection, table_name)
+
+    def submit(self, table_name: str):
+        return self.executor.submit(self._count, table_name)
+
+    def close(self):
+        # Contagens ainda não iniciadas não interessam mais
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def progress_total(plan: dict) -> str:
+    """
+    Total de registros para o log de progresso: exato, se a contagem em
+    segundo plano já terminou, ou a estimativa (com ~).
+    """
+    exact = plan.get('exact_rows')
+    if exact is not None and exact.done() and not exact.cancelled() and exact.exception() is None:
+        return str(exact.result())
+    if plan.get('total_rows') is None:
+        return '?'
+    return f"~{plan['total_rows']}"
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Testes do pacote de dados iniciais (migrations/initial_data_bundle.py).
+
+Uso (na raiz do projeto):
+    python -m pytest migrations/test_initial_data_bundle.py
+"""
+import sys
+import shutil
+import importlib.util
+import tempfile
+import unittest
+from unittest import mock
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+import initial_data_bundle
+from initial_data_bundle import parse_sql_dump
+
+REVISION_FILE = Path(__file__).parent / 'versions' / '95b3df90d492_inserir_dados_iniciais_do_sistema.py'
+
+
+def parse_values(values: str) -> list:
+    """Registros de um INSERT com os valores informados."""
+    return parse_sql_dump(f"INSERT INTO `t` VALUES {values};")['t']['rows']
+
+
+class TokenizerTests(unittest.TestCase):
+
+    def test_backslash_escapes(self):
+        rows = parse_values(r"('a\'b', 'c\\d', 'e\nf', 'g\0h', 'i\tj', 'k\Zl', 'm\"n')")
+        self.assertEqual(rows, [["a'b", 'c\\d', 'e\nf', 'g\0h', 'i\tj', 'k\x1al', 'm"n']])
+
+    def test_doubled_quotes(self):
+        rows = parse_values("('it''s', \"say \"\"hi\"\"\")")
+        self.assertEqual(rows, [["it's", 'say "hi"']])
+
+    def test_like_escapes_keep_backslash(self):
+        self.assertEqual(parse_values(r"('100\%', 'a\_b')"), [['100\\%', 'a\\_b']])
+
+    def test_unknown_escape_drops_backslash(self):
+        self.assertEqual(parse_values(r"('\q')"), [['q']])
+
+    def test_binary_introducer(self):
+        rows = parse_values("(_binary 'a\\0b', _utf8mb4 'ç', _binary 0x00FF)")
+        self.assertEqual(rows, [[b'a\x00b', 'ç', b'\x00\xff']])
+
+    def test_hex_literals(self):
+        self.assertEqual(parse_values("(0x4142, X'4344', x'', 0x)"), [[b'AB', b'CD', b'', b'']])
+
+    def test_numbers(self):
+        rows = parse_values("(1, -2, +3, 10.50, .5, 1e3, -0.25)")
+        self.assertEqual(rows, [[1, -2, 3, '10.50', '.5', '1e3', '-0.25']])
+
+    def test_keywords(self):
+        self.assertEqual(parse_values("(NULL, null, TRUE, false)"), [[None, None, 1, 0]])
+
+    def test_unsupported_value(self):
+        with self.assertRaises(ValueError):
+            parse_values("(NOW())")
+
+    def test_comments_are_skipped(self):
+        content = (
+            "-- INSERT INTO `t` VALUES (9);\n"
+            "# INSERT INTO `t` VALUES (8);\n"
+            "/* INSERT INTO `t` VALUES (7); */\n"
+            "/*!40101 SET NAMES utf8mb4 */;\n"
+            "INSERT INTO `t` VALUES (1, /* meio */ 2), -- fim da linha\n"
+            "(3, 4);\n"
+        )
+        self.assertEqual(parse_sql_dump(content)['t']['rows'], [[1, 2], [3, 4]])
+
+    def test_delimiters_inside_strings(self):
+        rows = parse_values("('a;b', 'c -- d', 'e /* f */', '(g)', '#h')")
+        self.assertEqual(rows, [['a;b', 'c -- d', 'e /* f */', '(g)', '#h']])
+
+
+class ParseSqlDumpTests(unittest.TestCase):
+
+    def test_other_statements_are_ignored(self):
+        content = (
+            "SET FOREIGN_KEY_CHECKS=0;\n"
+            "START TRANSACTION;\n"
+            "CREATE TABLE `t` (`id` int);\n"
+            "INSERT INTO `t` VALUES (1);\n"
+            "COMMIT;\n"
+        )
+        self.assertEqual(parse_sql_dump(content), {'t': {'columns': None, 'rows': [[1]]}})
+
+    def test_column_list_and_quoted_identifiers(self):
+        content = "INSERT IGNORE INTO `a``b` (`id`, nome) VALUES (1, 'x'), (2, 'y');"
+        self.assertEqual(
+            parse_sql_dump(content),
+            {'a`b': {'columns': ['id', 'nome'], 'rows': [[1, 'x'], [2, 'y']]}}
+        )
+
+    def test_inserts_of_a_table_are_grouped_in_dump_order(self):
+        content = (
+            "INSERT INTO `b` VALUES (1);\n"
+            "INSERT INTO `a` VALUES (2);\n"
+            "INSERT INTO `b` VALUES (3);\n"
+        )
+        tables = parse_sql_dump(content)
+        self.assertEqual(list(tables), ['b', 'a'])
+        self.assertEqual(tables['b']['rows'], [[1], [3]])
+
+    def test_different_column_lists_are_rejected(self):
+        content = "INSERT INTO `t` (`a`) VALUES (1);\nINSERT INTO `t` (`b`) VALUES (2);"
+        with self.assertRaises(ValueError):
+            parse_sql_dump(content)
+
+    def test_trailing_content_is_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_sql_dump("INSERT INTO `t` VALUES (1) ON DUPLICATE KEY UPDATE a=1;")
+
+
+class BundleTests(unittest.TestCase):
+
+    SQL = (
+        "INSERT INTO `cargo` (`id`, `nome`, `foto`) VALUES "
+        "(1, 'Presidente', _binary 'a\\0b'), (2, 'Secretário', NULL);\n"
+        "INSERT INTO `tipo` VALUES (1, 'PL');\n"
+    )
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.sql_file = self.tmp / 'db_initial_data.sql'
+        self.sql_file.write_text(self.SQL, encoding='utf-8')
+        self.cache_dir = self.tmp / 'cache'
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def assertRows(self, bundle):
+        self.assertEqual(bundle.tables['cargo'], {'columns': ['id', 'nome', 'foto'], 'rows': 2})
+        self.assertEqual(
+            list(bundle.iter_rows('cargo')), [[1, 'Presidente', b'a\x00b'], [2, 'Secretário', None]]
+        )
+        self.assertEqual(list(bundle.iter_rows('tipo')), [[1, 'PL']])
+
+    def test_compiled_in_cache_dir(self):
+        bundle = initial_data_bundle.load_bundle(self.sql_file, self.cache_dir)
+        self.assertEqual(bundle.bundle_dir, self.cache_dir)
+        self.assertTrue((self.cache_dir / initial_data_bundle.MANIFEST).exists())
+        self.assertFalse(self.sql_file.with_suffix('.bundle').exists())
+        self.assertRows(bundle)
+
+    def test_prebuilt_bundle_is_used(self):
+        prebuilt = self.sql_file.with_suffix('.bundle')
+        initial_data_bundle.compile_bundle(self.sql_file, prebuilt)
+        bundle = initial_data_bundle.load_bundle(self.sql_file, self.cache_dir)
+        self.assertEqual(bundle.bundle_dir, prebuilt)
+        self.assertFalse(self.cache_dir.exists())
+        self.assertRows(bundle)
+
+    def test_stale_bundle_is_recompiled(self):
+        initial_data_bundle.compile_bundle(self.sql_file, self.cache_dir)
+        self.sql_file.write_text("INSERT INTO `tipo` VALUES (2, 'PLC');", encoding='utf-8')
+        bundle = initial_data_bundle.load_bundle(self.sql_file, self.cache_dir)
+        self.assertEqual(list(bundle.tables), ['tipo'])
+        self.assertEqual(list(bundle.iter_rows('tipo')), [[2, 'PLC']])
+
+    def test_unwritable_cache_dir_parses_in_memory(self):
+        # Um arquivo no caminho do diretório: mkdir falha como num disco somente leitura
+        blocker = self.tmp / 'blocker'
+        blocker.write_text('')
+        with self.assertLogs('alembic', level='WARNING'):
+            bundle = initial_data_bundle.load_bundle(self.sql_file, blocker / 'cache')
+        self.assertIsNone(bundle.bundle_dir)
+        self.assertRows(bundle)
+
+    def test_missing_sql_uses_existing_bundle(self):
+        initial_data_bundle.compile_bundle(self.sql_file, self.cache_dir)
+        self.sql_file.unlink()
+        self.assertRows(initial_data_bundle.load_bundle(self.sql_file, self.cache_dir))
+
+    def test_missing_sql_and_bundle(self):
+        self.sql_file.unlink()
+        with self.assertRaises(FileNotFoundError):
+            initial_data_bundle.load_bundle(self.sql_file, self.cache_dir)
+
+    def test_downgrade_deletes_bundle_tables(self):
+        spec = importlib.util.spec_from_file_location('revision_95b3df90d492', REVISION_FILE)
+        revision = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(revision)
+        bundle = initial_data_bundle.load_bundle(self.sql_file, self.cache_dir)
+        with mock.patch.object(revision, 'op') as op, \
+                mock.patch.object(initial_data_bundle, 'load_bundle', return_value=bundle):
+            revision.downgrade()
+        statements = [str(call.args[0]) for call in op.execute.call_args_list]
+        self.assertEqual(statements, [
+            'SET FOREIGN_KEY_CHECKS=0', 'DELETE FROM `cargo`', 'DELETE FROM `tipo`', 'SET FOREIGN_KEY_CHECKS=1'
+        ])
+
+    def test_cache_dir_from_environment(self):
+        with mock.patch.dict('os.environ', {initial_data_bundle.CACHE_ENV: str(self.cache_dir)}):
+            self.assertEqual(initial_data_bundle.default_cache_dir(), self.cache_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
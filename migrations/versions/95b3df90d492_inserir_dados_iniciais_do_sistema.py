@@ -4,13 +4,22 @@ Revision ID: 95b3df90d492
 Revises: 
 Create Date: 2025-12-25 12:45:00.000000
 
+Os dados vêm do pacote pré-compilado de db_initial_data.sql (um arquivo
+JSON lines por tabela, veja migrations/initial_data_bundle.py). O pacote é
+recompilado automaticamente no diretório de cache quando o SQL muda.
 """
 from alembic import op
 import sqlalchemy as sa
 from sqlalchemy import text
 from pathlib import Path
-import re
-import os
+import sys
+import time
+
+# Módulos compartilhados das migrations (migrations/)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import initial_data_bundle
+from schema_cache import get_schema
+from table_probes import table_has_rows, on_duplicate_key_update
 
 
 # revision identifiers, used by Alembic.
@@ -19,198 +28,133 @@ down_revision = None  # Primeira migration (ou ajuste se houver migrations anter
 branch_labels = None
 depends_on = None
 
+# Limite superior de cada INSERT de várias linhas (abaixo do max_allowed_packet)
+MAX_STATEMENT_BYTES = 16 * 1024 * 1024
 
-def load_initial_data_sql():
-    """
-    Carrega e processa o arquivo SQL de dados iniciais.
-    Retorna lista de comandos INSERT para execução.
+
+def get_max_statement_bytes(connection):
     """
-    # Caminho do arquivo SQL relativo à raiz do projeto
-    # migrations/versions/ -> migrations/ -> SAGL6/ -> src/openlegis.sagl/...
-    current_file = Path(__file__)
-    project_root = current_file.parent.parent.parent
-    sql_file = project_root / 'src' / 'openlegis.sagl' / 'openlegis' / 'sagl' / 'instalacao' / 'db_initial_data.sql'
-    
-    if not sql_file.exists():
-        # Tenta caminho alternativo
-        sql_file = project_root / 'src/openlegis.sagl/openlegis/sagl/instalacao/db_initial_data.sql'
-    
-    if not sql_file.exists():
-        raise FileNotFoundError(f"Arquivo SQL não encontrado: {sql_file}")
-    
-    with open(sql_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Remove comentários MySQL (otimizado para arquivos grandes)
-    # Remove comentários de múltiplas linhas primeiro
-    content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)
-    # Remove comentários de linha única
-    lines = content.split('\n')
-    cleaned_lines = []
-    for line in lines:
-        # Remove comentários que começam com --
-        comment_pos = line.find('--')
-        if comment_pos >= 0:
-            line = line[:comment_pos]
-        cleaned_lines.append(line)
-    content = '\n'.join(cleaned_lines)
-    
-    # Remove comandos SET que não são necessários no Alembic (já gerencia transações)
-    # Processa linha por linha para ser mais eficiente
-    lines = content.split('\n')
-    filtered_lines = []
-    for line in lines:
-        line_upper = line.upper().strip()
-        # Pula linhas que são comandos SET desnecessários
-        if (line_upper.startswith('SET FOREIGN_KEY_CHECKS') or
-            line_upper.startswith('SET SQL_MODE') or
-            line_upper.startswith('SET AUTOCOMMIT') or
-            line_upper == 'START TRANSACTION' or
-            line_upper.startswith('SET TIME_ZONE') or
-            line_upper.startswith('SET @OLD_') or
-            line_upper.startswith('SET NAMES') or
-            line_upper.startswith('SET CHARACTER_SET') or
-            line_upper == 'COMMIT'):
-            continue
-        filtered_lines.append(line)
-    content = '\n'.join(filtered_lines)
-    
-    # Encontra todos os comandos INSERT (usa modo não-greedy para ser mais rápido)
-    inserts = re.findall(r'INSERT\s+INTO[^;]+;', content, re.IGNORECASE | re.DOTALL)
+    Tamanho máximo de um comando, a partir do max_allowed_packet do servidor.
     
-    # Limpa os comandos (remove espaços em excesso, quebras de linha desnecessárias)
-    cleaned_inserts = []
-    for insert in inserts:
-        insert = insert.strip()
-        if insert:
-            # Remove múltiplos espaços e quebras de linha dentro do comando
-            insert = re.sub(r'\s+', ' ', insert)
-            insert = insert.replace(' ;', ';')
-            cleaned_inserts.append(insert)
+    Args:
+        connection: Conexão SQLAlchemy
     
-    return cleaned_inserts
+    Returns:
+        Limite em bytes para cada INSERT de várias linhas
+    """
+    try:
+        max_allowed_packet = connection.execute(text("SELECT @@max_allowed_packet")).scalar()
+    except Exception:
+        max_allowed_packet = None
+    # Folga para o cabeçalho do pacote; limite superior evita comandos gigantes
+    return max(64 * 1024, min(int(max_allowed_packet or 4 * 1024 * 1024), MAX_STATEMENT_BYTES) - 1024)
 
 
-def get_tables_from_inserts(inserts):
+def select_columns(table_name, bundle_columns, existing_columns):
     """
-    Extrai nomes de tabelas dos comandos INSERT para uso no downgrade.
+    Define quais colunas do pacote serão inseridas numa tabela.
+    
+    Args:
+        table_name: Nome da tabela
+        bundle_columns: Colunas do pacote (None = INSERT sem lista de colunas)
+        existing_columns: Colunas da tabela no banco, na ordem da tabela
+    
+    Returns:
+        Tupla (colunas, índices) com as colunas que existem na tabela e suas
+        posições nos registros do pacote; (None, None) se a tabela for pulada
     """
-    tables = set()
-    for insert in inserts:
-        match = re.search(r'INSERT INTO `?(\w+)`?', insert, re.IGNORECASE)
-        if match:
-            tables.add(match.group(1))
-    return sorted(tables)
+    if bundle_columns is None:
+        # INSERT sem lista de colunas: valores na ordem das colunas da tabela
+        return existing_columns, list(range(len(existing_columns)))
+    
+    existing = set(existing_columns)
+    indices = [i for i, col in enumerate(bundle_columns) if col in existing]
+    if not indices:
+        return None, None
+    return [bundle_columns[i] for i in indices], indices
 
 
-def adjust_insert_for_table(insert, table_name, connection, existing_columns=None):
+def upsert_table_rows(connection, table_name, columns, pk_columns, indices, rows, max_statement_bytes):
     """
-    Ajusta um comando INSERT removendo colunas que não existem na tabela.
+    Grava os registros de uma tabela com INSERT ... ON DUPLICATE KEY UPDATE
+    de várias linhas.
+    
+    Os registros são agrupados no menor número de comandos que respeita o
+    max_allowed_packet (em geral, um único comando por tabela). Cada valor é
+    escapado pelo próprio driver (cursor.mogrify).
     
     Args:
-        insert: String com comando INSERT
-        table_name: Nome da tabela
         connection: Conexão SQLAlchemy
-        existing_columns: Set de colunas existentes (opcional, para evitar DESCRIBE repetido)
+        table_name: Nome da tabela
+        columns: Colunas gravadas
+        pk_columns: Colunas da chave primária da tabela
+        indices: Posição de cada coluna nos registros do pacote
+        rows: Registros do pacote (listas de valores)
+        max_statement_bytes: Tamanho máximo de cada comando, em bytes
     
     Returns:
-        String com INSERT ajustado ou None se não conseguir processar
+        Dicionário com 'rows' (registros enviados), 'statements' (comandos
+        executados) e 'affected' (linhas afetadas informadas pelo servidor)
     """
+    report = {'rows': 0, 'statements': 0, 'affected': 0}
+    if not rows:
+        return report
+    
+    columns_str = ', '.join([f"`{col}`" for col in columns])
+    update_columns = [col for col in columns if col not in pk_columns] or columns[:1]
+    prefix = f"INSERT INTO `{table_name}` ({columns_str}) VALUES "
+    suffix = on_duplicate_key_update(connection, update_columns)
+    row_template = f"({', '.join(['%s'] * len(columns))})"
+    overhead = len(prefix.encode('utf-8')) + len(suffix.encode('utf-8'))
+    
+    # Usa o cursor do driver na mesma conexão (e transação) do Alembic
+    cursor = connection.connection.dbapi_connection.cursor()
+    
+    def execute(values):
+        cursor.execute(prefix + ','.join(values) + suffix)
+        report['statements'] += 1
+        report['affected'] += max(cursor.rowcount, 0)
+    
     try:
-        # Extrai colunas e valores do INSERT
-        match = re.match(
-            r'INSERT\s+(?:IGNORE\s+)?INTO\s+`?(\w+)`?\s*\(([^)]+)\)\s*VALUES\s*(.+);',
-            insert, re.IGNORECASE | re.DOTALL
+        batch = []
+        batch_bytes = overhead
+        for row in rows:
+            value = cursor.mogrify(row_template, tuple(row[i] for i in indices))
+            value_bytes = len(value.encode('utf-8')) + 1
+            if batch and batch_bytes + value_bytes > max_statement_bytes:
+                execute(batch)
+                batch = []
+                batch_bytes = overhead
+            batch.append(value)
+            batch_bytes += value_bytes
+            report['rows'] += 1
+        if batch:
+            execute(batch)
+    finally:
+        cursor.close()
+    
+    return report
+
+
+def log_report(logger, reports):
+    """
+    Registra o relatório da carga, uma linha por tabela.
+    
+    Args:
+        logger: Logger do Alembic
+        reports: Lista de (tabela, relatório de upsert_table_rows, segundos)
+    """
+    if not reports:
+        return
+    logger.info("=" * 72)
+    logger.info(f"{'TABELA':<33}{'REGISTROS':>10}{'COMANDOS':>10}{'AFETADAS':>10}{'SEGUNDOS':>9}")
+    logger.info("=" * 72)
+    for table_name, report, seconds in reports:
+        logger.info(
+            f"{table_name:<33}{report['rows']:>10}{report['statements']:>10}"
+            f"{report['affected']:>10}{seconds:>9.2f}"
         )
-        if not match:
-            return insert  # Não conseguiu parsear, retorna original
-        
-        table = match.group(1)
-        columns_str = match.group(2)
-        values_str = match.group(3)
-        
-        # Lista de colunas no SQL
-        sql_columns = [col.strip().strip('`') for col in columns_str.split(',')]
-        
-        # Obtém colunas que realmente existem na tabela (se não foram passadas)
-        if existing_columns is None:
-            try:
-                result = connection.execute(text(f"DESCRIBE `{table_name}`"))
-                existing_columns = {row[0] for row in result}
-            except Exception:
-                # Se não conseguir obter colunas, retorna original (será tratado pelo INSERT IGNORE)
-                return insert
-        
-        # Filtra colunas que existem
-        valid_column_indices = []
-        valid_columns = []
-        for i, col in enumerate(sql_columns):
-            if col in existing_columns:
-                valid_column_indices.append(i)
-                valid_columns.append(col)
-        
-        # Se nenhuma coluna válida, retorna None (pula este INSERT)
-        if not valid_columns:
-            return None
-        
-        # Se todas as colunas são válidas, retorna original
-        if len(valid_columns) == len(sql_columns):
-            return insert
-        
-        # Precisa ajustar os valores também
-        # Parseia os valores (pode ter múltiplas linhas)
-        # Remove espaços e quebras de linha
-        values_str = values_str.strip()
-        
-        # Extrai cada tupla de valores (entre parênteses)
-        value_tuples = re.findall(r'\(([^)]+)\)', values_str, re.DOTALL)
-        
-        if not value_tuples:
-            return insert  # Não conseguiu parsear valores
-        
-        # Processa cada tupla, removendo valores das colunas que não existem
-        adjusted_tuples = []
-        for tuple_str in value_tuples:
-            # Divide valores (respeitando strings entre aspas)
-            values = []
-            current = ''
-            in_quotes = False
-            quote_char = None
-            
-            for char in tuple_str:
-                if char in ("'", '"') and (not current or current[-1] != '\\'):
-                    if not in_quotes:
-                        in_quotes = True
-                        quote_char = char
-                    elif char == quote_char:
-                        in_quotes = False
-                        quote_char = None
-                    current += char
-                elif char == ',' and not in_quotes:
-                    values.append(current.strip())
-                    current = ''
-                else:
-                    current += char
-            
-            if current.strip():
-                values.append(current.strip())
-            
-            # Seleciona apenas valores das colunas válidas
-            valid_values = [values[i] for i in valid_column_indices if i < len(values)]
-            adjusted_tuples.append(f"({','.join(valid_values)})")
-        
-        # Reconstrói o INSERT
-        columns_str_new = '(' + ','.join([f"`{col}`" for col in valid_columns]) + ')'
-        values_str_new = ','.join(adjusted_tuples)
-        
-        # Preserva INSERT IGNORE se existir
-        insert_prefix = "INSERT IGNORE INTO" if "IGNORE" in insert.upper() else "INSERT INTO"
-        
-        return f"{insert_prefix} `{table_name}` {columns_str_new} VALUES {values_str_new};"
-        
-    except Exception:
-        # Em caso de erro, retorna original (será tratado pelo INSERT IGNORE)
-        return insert
+    logger.info("=" * 72)
 
 
 def upgrade() -> None:
@@ -236,11 +180,10 @@ def upgrade() -> None:
         
         for table in key_tables:
             try:
-                result = connection.execute(text(f"SELECT COUNT(*) FROM `{table}`"))
-                count = result.scalar()
-                if count > 0:
+                # EXISTS para no primeiro registro (COUNT(*) percorreria a tabela)
+                if table_has_rows(connection, table):
                     tables_with_data += 1
-                    logger.debug(f"Tabela {table} já tem {count} registros")
+                    logger.debug(f"Tabela {table} já tem registros")
             except Exception as e:
                 # Tabela pode não existir, continua
                 logger.debug(f"Erro ao verificar tabela {table}: {e}")
@@ -251,85 +194,56 @@ def upgrade() -> None:
             logger.info(f"Dados iniciais já existem ({tables_with_data}/{len(key_tables)} tabelas). Pulando inserção.")
             return
         
-        # Carrega o arquivo SQL apenas se necessário
+        # Carrega o pacote pré-compilado (recompila apenas se o SQL mudou)
         logger.info(f"Carregando dados iniciais... ({tables_with_data}/{len(key_tables)} tabelas têm dados)")
-        inserts = load_initial_data_sql()
-        logger.info(f"Arquivo SQL carregado: {len(inserts)} INSERTs encontrados")
+        bundle = initial_data_bundle.load_bundle()
+        bundle_tables = bundle.tables
+        total_rows = sum(table['rows'] for table in bundle_tables.values())
+        logger.info(f"Pacote de dados iniciais carregado: {len(bundle_tables)} tabelas, {total_rows} registros")
         
-        if not inserts:
-            logger.warning("Nenhum INSERT para executar")
+        if not bundle_tables:
+            logger.warning("Nenhum registro para inserir")
             return
         
-        logger.info(f"Inserindo dados iniciais. Total de INSERTs: {len(inserts)}")
-        
         # Desabilita verificação de foreign keys temporariamente para inserção
         op.execute(text("SET FOREIGN_KEY_CHECKS=0"))
         
         try:
-            # Cache de colunas por tabela (evita múltiplos DESCRIBE)
-            table_columns_cache = {}
-            
-            def get_table_columns(table_name, connection):
-                """Obtém colunas de uma tabela usando cache"""
-                if table_name not in table_columns_cache:
-                    try:
-                        result = connection.execute(text(f"DESCRIBE `{table_name}`"))
-                        table_columns_cache[table_name] = {row[0] for row in result}
-                    except Exception:
-                        # Se não conseguir obter, retorna None
-                        table_columns_cache[table_name] = None
-                return table_columns_cache[table_name]
-            
-            # Executa cada comando INSERT com verificação de duplicação
-            total_inserts = len(inserts)
             processed = 0
-            for idx, insert in enumerate(inserts, 1):
-                if not insert.strip():
+            reports = []
+            max_statement_bytes = get_max_statement_bytes(connection)
+            # Estrutura de todas as tabelas numa única leitura do information_schema
+            schema = get_schema(connection)
+            logger.debug(f"Comandos de até {max_statement_bytes} bytes (max_allowed_packet)")
+            for table_name, table in bundle_tables.items():
+                existing_columns = schema.columns(table_name)
+                pk_columns = schema.primary_key(table_name)
+                if not schema.has_table(table_name):
+                    logger.warning(f"Tabela {table_name} não existe. Pulando {table['rows']} registros...")
                     continue
                 
-                # Log progresso a cada 10 INSERTs
-                if idx % 10 == 0 or idx == total_inserts:
-                    logger.debug(f"Processando INSERT {idx}/{total_inserts}...")
-                
-                # Extrai o nome da tabela do comando INSERT
-                table_match = re.search(r'INSERT INTO `?(\w+)`?', insert, re.IGNORECASE)
-                if not table_match:
-                    # Se não conseguir identificar a tabela, usa INSERT IGNORE como segurança
-                    insert_ignore = re.sub(r'INSERT INTO', 'INSERT IGNORE INTO', insert, flags=re.IGNORECASE)
-                    op.execute(text(insert_ignore))
-                    processed += 1
-                    continue
-                
-                table_name = table_match.group(1)
-                
-                # Obtém colunas da tabela (com cache)
-                existing_columns = get_table_columns(table_name, connection)
-                
-                # Se não conseguir obter colunas, usa INSERT IGNORE como segurança
-                if existing_columns is None:
-                    insert_ignore = re.sub(r'INSERT INTO', 'INSERT IGNORE INTO', insert, flags=re.IGNORECASE)
-                    op.execute(text(insert_ignore))
-                    processed += 1
+                # Mantém apenas as colunas que existem na tabela
+                columns, indices = select_columns(table_name, table['columns'], existing_columns)
+                if columns is None:
+                    logger.warning(f"Nenhuma coluna do pacote existe em {table_name}. Pulando...")
                     continue
                 
-                # Ajusta o INSERT removendo colunas que não existem na tabela
-                adjusted_insert = adjust_insert_for_table(insert, table_name, connection, existing_columns)
-                
-                if adjusted_insert is None:
-                    # Nenhuma coluna válida, pula este INSERT
+                rows = list(bundle.iter_rows(table_name))
+                if table['columns'] is None and rows and len(rows[0]) != len(columns):
+                    logger.warning(f"Registros de {table_name} não correspondem às colunas da tabela. Pulando...")
                     continue
                 
-                # Sempre usa INSERT IGNORE para evitar erros de duplicação
-                # Isso é mais rápido que fazer COUNT(*) antes de cada INSERT
-                # e é seguro mesmo se a tabela estiver vazia
-                if "IGNORE" not in adjusted_insert.upper():
-                    adjusted_insert = re.sub(r'INSERT INTO', 'INSERT IGNORE INTO', adjusted_insert, flags=re.IGNORECASE)
-                
-                op.execute(text(adjusted_insert))
-                
-                processed += 1
+                # Upsert de várias linhas: registros já existentes são atualizados
+                # com os valores do pacote, sem erros de duplicação
+                start_time = time.time()
+                report = upsert_table_rows(
+                    connection, table_name, columns, pk_columns, indices, rows, max_statement_bytes
+                )
+                reports.append((table_name, report, time.time() - start_time))
+                processed += report['rows']
                 
-            logger.info(f"Dados iniciais inseridos: {processed} INSERTs processados")
+            log_report(logger, reports)
+            logger.info(f"Dados iniciais inseridos: {processed} registros em {len(reports)} tabelas")
             logger.debug("Finalizando inserção de dados...")
                     
         finally:
@@ -344,7 +258,7 @@ def upgrade() -> None:
             
     except FileNotFoundError as e:
         # Se o arquivo não existir, apenas loga um aviso mas não falha a migration
-        logger.error(f"Arquivo SQL de dados iniciais não encontrado: {e}")
+        logger.error(f"Dados iniciais não encontrados (nem pacote nem arquivo SQL): {e}")
         logger.error("Migration continuará sem inserir dados iniciais")
         return
     except Exception as e:
@@ -369,8 +283,7 @@ def downgrade() -> None:
     Use com cuidado em produção!
     """
     try:
-        inserts = load_initial_data_sql()
-        tables = get_tables_from_inserts(inserts)
+        tables = sorted(initial_data_bundle.load_bundle().tables)
         
         # Desabilita verificação de foreign keys temporariamente
         op.execute(text("SET FOREIGN_KEY_CHECKS=0"))
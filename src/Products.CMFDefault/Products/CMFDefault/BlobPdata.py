@@ -0,0 +1,38 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Pdata chunk whose payload is kept in a ZODB blob.
+
+File and Image objects migrated to RelStorage may have their 'data' chain
+replaced by a single BlobPdata (see migrate_zodb.py), so that the object
+caches only hold the metadata and the payload is read from the blob
+directory on demand.
+"""
+
+from OFS.Image import Pdata
+from ZODB.blob import Blob
+
+
+class BlobPdata(Pdata):
+
+    """ Single-chunk Pdata chain backed by a ZODB blob.
+    """
+
+    next = None
+
+    def __init__(self, data=b''):
+        self.blob = Blob(data)
+
+    @property
+    def data(self):
+        with self.blob.open('r') as f:
+            return f.read()
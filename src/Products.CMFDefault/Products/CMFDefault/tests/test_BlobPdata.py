@@ -0,0 +1,84 @@
+##############################################################################
+#
+# Copyright (c) 2005 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Unit tests for BlobPdata module.
+"""
+
+import unittest
+import Testing
+
+import shutil
+import tempfile
+
+import transaction
+from ZODB.DB import DB
+from ZODB.MappingStorage import MappingStorage
+from ZODB.blob import BlobStorage
+
+
+class BlobPdataTests(unittest.TestCase):
+
+    def setUp(self):
+        self._blob_dir = tempfile.mkdtemp()
+        self._db = DB(BlobStorage(self._blob_dir, MappingStorage()))
+        self._conn = self._db.open()
+
+    def tearDown(self):
+        transaction.abort()
+        self._conn.close()
+        self._db.close()
+        shutil.rmtree(self._blob_dir)
+
+    def _makeOne(self, data):
+        from Products.CMFDefault.BlobPdata import BlobPdata
+
+        pdata = BlobPdata(data)
+        self._conn.root()['pdata'] = pdata
+        transaction.commit()
+        return pdata
+
+    def test_data_read_from_blob(self):
+        pdata = self._makeOne(b'payload')
+        self.assertEqual(pdata.data, b'payload')
+
+    def test_behaves_as_single_chunk_chain(self):
+        pdata = self._makeOne(b'payload')
+        self.assertEqual(pdata.next, None)
+        self.assertEqual(len(pdata), 7)
+        self.assertEqual(pdata[0:3], b'pay')
+        self.assertEqual(bytes(pdata), b'payload')
+
+    def test_File_serves_BlobPdata(self):
+        from OFS.Image import File
+
+        file = File('test', '', b'')
+        file.data = self._makeOne(b'payload')
+        file.size = 7
+        self._conn.root()['file'] = file
+        transaction.commit()
+
+        # Loaded from the storage by another connection, as Zope serves it
+        conn = self._db.open()
+        try:
+            loaded = conn.root()['file']
+            self.assertEqual(type(loaded.data).__name__, 'BlobPdata')
+            self.assertEqual(loaded.data._p_oid, file.data._p_oid)
+            self.assertEqual(loaded.get_size(), 7)
+            self.assertEqual(bytes(loaded.data), b'payload')
+        finally:
+            conn.close()
+
+
+def test_suite():
+    return unittest.TestSuite((
+        unittest.makeSuite(BlobPdataTests),
+        ))
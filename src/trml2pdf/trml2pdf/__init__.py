@@ -15,4 +15,4 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
-from .trml2pdf import parseString
+from .trml2pdf import parseString, parseFile, compileString, renderMany
@@ -0,0 +1,150 @@
+# trml2pdf - An RML to PDF converter
+# Copyright (C) 2003, Fabien Pinckaers, UCL, FSA
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""
+Micro-benchmark of the unit and color parsing on the RML examples.
+
+Usage: python -m trml2pdf.benchmark [rmls_dir] [-n repeat]
+
+Records the utils.unit_get and color.get calls made while rendering each
+example, then replays them through the previous implementation (a list
+of regexes per unit, a list of every color name per lookup) and through
+the current one, with its caches cleared first. Prints the best time of
+each, per document, next to the time of the whole render. Examples that
+do not render are skipped.
+"""
+
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+
+import reportlab
+from reportlab.lib import colors
+
+from . import utils
+from . import color
+from .trml2pdf import parseString
+
+RMLS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'rmls')
+
+#
+# Previous implementation, for comparison
+#
+_units = [
+    (re.compile(r'^(-?[0-9\.]+)\s*in$'), reportlab.lib.units.inch),
+    (re.compile(r'^(-?[0-9\.]+)\s*cm$'), reportlab.lib.units.cm),
+    (re.compile(r'^(-?[0-9\.]+)\s*mm$'), reportlab.lib.units.mm),
+    (re.compile(r'^(-?[0-9\.]+)\s*$'), 1)
+]
+
+def _unit_get(size):
+    for unit in _units:
+        res = unit[0].search(size, 0)
+        if res:
+            return unit[1]*float(res.group(1))
+    return False
+
+def _color_get(col_str):
+    if col_str in list(color.allcols.keys()):
+        return color.allcols[col_str]
+    res = color.regex_t.search(col_str, 0)
+    if res:
+        return (float(res.group(1)),float(res.group(2)),float(res.group(3)))
+    res = color.regex_h.search(col_str, 0)
+    if res:
+        return tuple([ float(int(res.group(i),16))/255 for i in range(1,4)])
+    return colors.red
+
+def _record(data):
+    """Render data, returning the arguments of every unit and color lookup."""
+    units, cols = [], []
+    unit_get, color_get = utils.unit_get, color.get
+    def record_unit(size):
+        units.append(size)
+        return unit_get(size)
+    def record_color(col_str):
+        cols.append(col_str)
+        return color_get(col_str)
+    utils.unit_get, color.get = record_unit, record_color
+    try:
+        parseString(data)
+    finally:
+        utils.unit_get, color.get = unit_get, color_get
+    return units, cols
+
+def _best(function, repeat):
+    best = None
+    for i in range(repeat):
+        t = time.perf_counter()
+        function()
+        t = time.perf_counter() - t
+        best = t if best is None else min(best, t)
+    return best
+
+def _replay(unit_get, color_get, units, cols, clear=False):
+    def replay():
+        if clear:
+            utils.unit_get.cache_clear()
+            color._parse.cache_clear()
+        for size in units:
+            unit_get(size)
+        for col_str in cols:
+            color_get(col_str)
+    return replay
+
+def run(rmls=RMLS, repeat=20, out=sys.stdout):
+    cwd = os.getcwd()
+    os.chdir(rmls)    # images are relative to the examples
+    try:
+        out.write('%-8s %6s %6s %10s %10s %10s %9s\n' % ('rml', 'units', 'colors', 'previous', 'current', 'render', 'saved'))
+        totals = [0, 0, 0]
+        for path in sorted(glob.glob('*.rml')):
+            with open(path, 'rb') as f:
+                data = f.read()
+            try:
+                units, cols = _record(data)
+            except Exception:
+                continue
+            previous = _best(_replay(_unit_get, _color_get, units, cols), repeat)
+            current = _best(_replay(utils.unit_get, color.get, units, cols, True), repeat)
+            render = _best(lambda: parseString(data), repeat)
+            for i, t in enumerate((previous, current, render)):
+                totals[i] += t
+            out.write('%-8s %6d %6d %8.1fus %8.1fus %8.2fms %8.1f%%\n' % (os.path.splitext(path)[0], len(units), len(cols),
+                previous * 1e6, current * 1e6, render * 1e3, 100 * (previous - current) / render))
+        previous, current, render = totals
+        if render:
+            out.write('%-8s %6s %6s %8.1fus %8.1fus %8.2fms %8.1f%%\n' % ('total', '', '', previous * 1e6, current * 1e6,
+                render * 1e3, 100 * (previous - current) / render))
+        out.write('saved: parsing time saved, as a share of the whole render\n')
+    finally:
+        os.chdir(cwd)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m trml2pdf.benchmark', description='Unit and color parsing on the RML examples')
+    parser.add_argument('rmls', nargs='?', default=RMLS, help='directory of the RML examples')
+    parser.add_argument('-n', '--repeat', type=int, default=20, help='runs of each example (the best is kept)')
+    args = parser.parse_args(argv)
+    sys.stderr = open(os.devnull, 'w')    # "not yet implemented" warnings of the examples
+    run(args.rmls, args.repeat)
+    return 0
+
+if __name__=="__main__":
+    sys.exit(main())
@@ -17,6 +17,7 @@
 
 from reportlab.lib import colors
 import re
+import functools
 
 allcols = colors.getAllNamedColors()
 
@@ -24,9 +25,13 @@ regex_t = re.compile(r'\(([0-9\.]*),([0-9\.]*),([0-9\.]*)\)')
 regex_h = re.compile(r'#([0-9a-zA-Z][0-9a-zA-Z])([0-9a-zA-Z][0-9a-zA-Z])([0-9a-zA-Z][0-9a-zA-Z])')
 
 def get(col_str):
-	global allcols
-	if col_str in list(allcols.keys()):
-		return allcols[col_str]
+	col = allcols.get(col_str)
+	if col is not None:
+		return col
+	return _parse(col_str)
+
+@functools.lru_cache(maxsize=256)
+def _parse(col_str):
 	res = regex_t.search(col_str, 0)
 	if res:
 		return (float(res.group(1)),float(res.group(2)),float(res.group(3)))
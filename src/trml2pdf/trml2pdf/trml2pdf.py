@@ -20,10 +20,19 @@
 # License along with this library; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
+import os
 import sys
-from io import BytesIO
+import argparse
+from io import BytesIO, StringIO
 import xml.dom.minidom
+import xml.dom.pulldom
+import xml.sax
 import copy
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 
 import reportlab
 from reportlab.pdfgen import canvas
@@ -67,6 +76,85 @@ def _child_get(node, childs):
             clds.append(n)
     return clds
 
+class _rml_pulldom(xml.dom.pulldom.PullDOM):
+    # keeps CDATA sections apart from the text, as xml.dom.minidom does
+    # (_rml_flowable._textual escapes text but not CDATA)
+    _cdata = False
+
+    def startCDATA(self):
+        self._cdata = True
+    def endCDATA(self):
+        self._cdata = False
+    def startDTD(self, name, publicId, systemId):
+        pass
+    def endDTD(self):
+        pass
+
+    def characters(self, chars):
+        if not self._cdata:
+            return xml.dom.pulldom.PullDOM.characters(self, chars)
+        node = self.document.createCDATASection(chars)
+        self.lastEvent[1] = [(xml.dom.pulldom.CHARACTERS, node), None]
+        self.lastEvent = self.lastEvent[1]
+
+class _rml_events(xml.dom.pulldom.DOMEventStream):
+    """
+    Pull parser over a RML stream: nodes are created as the input is read
+    and only the subtrees passed to expandNode() are built, so a story is
+    held one element at a time instead of as a whole DOM.
+    """
+    def __init__(self, stream):
+        xml.dom.pulldom.DOMEventStream.__init__(self, stream, xml.sax.make_parser(), xml.dom.pulldom.default_bufsize)
+
+    def reset(self):
+        self.pulldom = _rml_pulldom()
+        self.parser.setFeature(xml.sax.handler.feature_namespaces, 1)
+        self.parser.setContentHandler(self.pulldom)
+        self.parser.setProperty(xml.sax.handler.property_lexical_handler, self.pulldom)
+
+    def expandNode(self, node):
+        # the parser reports text in pieces (line by line): merge adjacent
+        # pieces in a single node, as xml.dom.minidom does
+        parents = [node]
+        for token, cur_node in self:
+            if cur_node is node:
+                return
+            if token == xml.dom.pulldom.START_ELEMENT:
+                parents[-1].appendChild(cur_node)
+                parents.append(cur_node)
+            elif token == xml.dom.pulldom.END_ELEMENT:
+                del parents[-1]
+            else:
+                last = parents[-1].lastChild
+                if last is not None and last.nodeType == cur_node.nodeType and cur_node.nodeType in (cur_node.TEXT_NODE, cur_node.CDATA_SECTION_NODE):
+                    last.data += cur_node.data
+                else:
+                    parents[-1].appendChild(cur_node)
+
+class _rml_story(list):
+    """
+    Flowables of a story, created while the document is built.
+
+    BaseDocTemplate.build() only works on the head of the list (it deletes
+    each flowable once handled), and asks for len() before each one: the
+    list is topped up to `lookahead` flowables from the parser at that
+    point, so the story is never fully held in memory. The lookahead also
+    bounds keepWithNext chains.
+    """
+    lookahead = 32
+
+    def __init__(self, flowables):
+        list.__init__(self)
+        self.flowables = iter(flowables)
+
+    def __len__(self):
+        while self.flowables is not None and list.__len__(self) < self.lookahead:
+            try:
+                self.append(next(self.flowables))
+            except StopIteration:
+                self.flowables = None
+        return list.__len__(self)
+
 class _rml_styles(object):
     def __init__(self, nodes):
         self.styles = {}
@@ -81,6 +169,13 @@ class _rml_styles(object):
                 for name in variable.getElementsByTagName('name'):
                     self.names[ name.getAttribute('id')] = name.getAttribute('value')
 
+    def copy(self):
+        # styles are never modified in place (para_style_get works on a copy),
+        # only the <name> variables change while a story is rendered
+        styles = copy.copy(self)
+        styles.names = dict(self.names)
+        return styles
+
     def _para_style_update(self, style, node):
         for attr in ['textColor', 'backColor', 'bulletColor']:
             if node.hasAttribute(attr):
@@ -158,10 +253,22 @@ class _rml_styles(object):
             style = copy.deepcopy(styles['Normal'])
         return self._para_style_update(style, node)
 
-class _rml_doc(object):
-    def __init__(self, data):
-        self.dom = xml.dom.minidom.parseString(data)
-        self.filename = self.dom.documentElement.getAttribute('filename')
+class _rml_compiled(object):
+    """
+    The stylesheet and page templates of a RML document, parsed once.
+
+    Nothing is modified after __init__, so a single instance can render any
+    number of stories, from several threads at the same time.
+    """
+    def __init__(self, dom):
+        root = dom.documentElement
+        self.filename = root.getAttribute('filename')
+        el = root.getElementsByTagName('docinit')
+        if el:
+            self.docinit(el)
+        self.styles = _rml_styles(root.getElementsByTagName('stylesheet'))
+        el = root.getElementsByTagName('template')
+        self.template = _rml_template(el[0]) if el else None
 
     def docinit(self, els):
         from reportlab.lib.fonts import addMapping
@@ -178,18 +285,63 @@ class _rml_doc(object):
                 addMapping(name, 1, 0, name)    #bold
                 addMapping(name, 1, 1, name)    #italic and bold
 
-    def render(self, out):
-        el = self.dom.documentElement.getElementsByTagName('docinit')
-        if el:
-            self.docinit(el)
+    def render(self, data, fout=None):
+        """Render a story (a RML document or a bare <story>) with this template."""
+        return _render_doc(_rml_doc(data, self), fout)
 
-        el = self.dom.documentElement.getElementsByTagName('stylesheet')
-        self.styles = _rml_styles(el)
+class _rml_doc(object):
+    def __init__(self, data, compiled=None):
+        # data: the RML (bytes or str) or a file object to read it from
+        if not hasattr(data, 'read'):
+            data = StringIO(data) if isinstance(data, str) else BytesIO(data)
+        self.events = _rml_events(data)
+        self.compiled = compiled
+        self.dom = None
+        self.filename = None
+        self.story = None
+
+    def _read_header(self):
+        # builds every element before the <story> under the root element;
+        # the story itself is read later, one element at a time
+        for event, node in self.events:
+            if event == xml.dom.pulldom.START_ELEMENT:
+                root = node
+                break
+        self.dom = root.ownerDocument
+        self.filename = root.getAttribute('filename')
+        if root.localName=='story':
+            self.story = root
+            return
+        for event, node in self.events:
+            if event == xml.dom.pulldom.START_ELEMENT:
+                if node.localName=='story':
+                    self.story = node
+                    return
+                self.events.expandNode(node)
+                root.appendChild(node)
+
+    def _story_nodes(self):
+        # the elements of the story, each one built when reached and
+        # released once turned into a flowable
+        for event, node in self.events:
+            if event == xml.dom.pulldom.START_ELEMENT:
+                self.events.expandNode(node)
+                yield node
+            elif event == xml.dom.pulldom.END_ELEMENT and node is self.story:
+                return
+
+    def compile(self):
+        self._read_header()
+        return _rml_compiled(self.dom)
 
-        el = self.dom.documentElement.getElementsByTagName('template')
-        if len(el):
-            pt_obj = _rml_template(out, el[0], self)
-            pt_obj.render(self.dom.documentElement.getElementsByTagName('story')[0])
+    def render(self, out):
+        self._read_header()
+        compiled = self.compiled or _rml_compiled(self.dom)
+        self.styles = compiled.styles.copy()
+
+        if compiled.template:
+            r = _rml_flowable(self)
+            compiled.template.render(out, self, _rml_story(r.iter_render(self._story_nodes())))
         else:
             self.canvas = canvas.Canvas(out)
             pd = self.dom.documentElement.getElementsByTagName('pageDrawing')[0]
@@ -344,44 +496,65 @@ class _rml_canvas(object):
             self.path.close()
         self.canvas.drawPath(self.path, **utils.attr_get(node, [], {'fill':'bool','stroke':'bool'}))
 
-    def render(self, node):
-        tags = {
-            'drawCentredString': self._drawCenteredString,
-            'drawRightString': self._drawRightString,
-            'drawString': self._drawString,
-            'rect': self._rect,
-            'ellipse': self._ellipse,
-            'lines': self._lines,
-            'grid': self._grid,
-            'curves': self._curves,
-            'fill': lambda node: self.canvas.setFillColor(color.get(node.getAttribute('color'))),
-            'stroke': lambda node: self.canvas.setStrokeColor(color.get(node.getAttribute('color'))),
-            'setFont': lambda node: self.canvas.setFont(node.getAttribute('name'), utils.unit_get(node.getAttribute('size'))),
-            'place': self._place,
-            'circle': self._circle,
-            'lineMode': self._line_mode,
-            'path': self._path,
-            'rotate': lambda node: self.canvas.rotate(float(node.getAttribute('degrees'))),
-            'translate': self._translate,
-            'image': self._image
-        }
+    def _fill(self, node):
+        self.canvas.setFillColor(color.get(node.getAttribute('color')))
+    def _stroke(self, node):
+        self.canvas.setStrokeColor(color.get(node.getAttribute('color')))
+    def _setFont(self, node):
+        self.canvas.setFont(node.getAttribute('name'), utils.unit_get(node.getAttribute('size')))
+    def _rotate(self, node):
+        self.canvas.rotate(float(node.getAttribute('degrees')))
+
+    # tag -> method, built once for the class
+    tags = {
+        'drawCentredString': _drawCenteredString,
+        'drawRightString': _drawRightString,
+        'drawString': _drawString,
+        'rect': _rect,
+        'ellipse': _ellipse,
+        'lines': _lines,
+        'grid': _grid,
+        'curves': _curves,
+        'fill': _fill,
+        'stroke': _stroke,
+        'setFont': _setFont,
+        'place': _place,
+        'circle': _circle,
+        'lineMode': _line_mode,
+        'path': _path,
+        'rotate': _rotate,
+        'translate': _translate,
+        'image': _image
+    }
+
+    @classmethod
+    def ops(cls, node):
+        """The drawing operations of node: (method, element) for each known child."""
+        ops = []
         for nd in node.childNodes:
             if nd.nodeType==nd.ELEMENT_NODE:
-                for tag in tags:
-                    if nd.localName==tag:
-                        tags[tag](nd)
-                        break
+                op = cls.tags.get(nd.localName)
+                if op:
+                    ops.append((op, nd))
+        return ops
+
+    def render(self, node, ops=None):
+        for op, nd in ops or self.ops(node):
+            op(self, nd)
 
 class _rml_draw(object):
     def __init__(self, node, styles):
         self.node = node
         self.styles = styles
         self.canvas = None
+        # pageGraphics are drawn again on every page: resolve the
+        # operations once and replay them
+        self.ops = _rml_canvas.ops(node)
 
     def render(self, canvas, doc):
         canvas.saveState()
         cnv = _rml_canvas(canvas, doc, self.styles)
-        cnv.render(self.node)
+        cnv.render(self.node, self.ops)
         canvas.restoreState()
 
 class _rml_flowable(object):
@@ -456,64 +629,65 @@ class _rml_flowable(object):
                 drw.render(self.canv, None)
         return Illustration(node, self.styles)
 
-    def _flowable(self, node):
-        if node.localName=='para':
-            style = self.styles.para_style_get(node)
-            return platypus.Paragraph(self._textual(node), style, **(utils.attr_get(node, [], {'bulletText':'str'})))
-        elif node.localName=='name':
-            self.styles.names[ node.getAttribute('id')] = node.getAttribute('value')
-            return None
-        elif node.localName=='xpre':
-            style = self.styles.para_style_get(node)
-            return platypus.XPreformatted(self._textual(node), style, **(utils.attr_get(node, [], {'bulletText':'str','dedent':'int','frags':'int'})))
-        elif node.localName=='pre':
-            style = self.styles.para_style_get(node)
-            return platypus.Preformatted(self._textual(node), style, **(utils.attr_get(node, [], {'bulletText':'str','dedent':'int'})))
-        elif node.localName=='illustration':
-            return  self._illustration(node)
-        elif node.localName=='blockTable':
-            return  self._table(node)
-        elif node.localName=='title':
-            styles = reportlab.lib.styles.getSampleStyleSheet()
-            style = styles['Title']
-            return platypus.Paragraph(self._textual(node), style, **(utils.attr_get(node, [], {'bulletText':'str'})))
-        elif node.localName=='h1':
-            styles = reportlab.lib.styles.getSampleStyleSheet()
-            style = styles['Heading1']
-            return platypus.Paragraph(self._textual(node), style, **(utils.attr_get(node, [], {'bulletText':'str'})))
-        elif node.localName=='h2':
-            styles = reportlab.lib.styles.getSampleStyleSheet()
-            style = styles['Heading2']
-            return platypus.Paragraph(self._textual(node), style, **(utils.attr_get(node, [], {'bulletText':'str'})))
-        elif node.localName=='h3':
-            styles = reportlab.lib.styles.getSampleStyleSheet()
-            style = styles['Heading3']
-            return platypus.Paragraph(self._textual(node), style, **(utils.attr_get(node, [], {'bulletText':'str'})))
-        elif node.localName=='image':
-            return platypus.Image(node.getAttribute('file'), mask=(250,255,250,255,250,255), **(utils.attr_get(node, ['width','height'])))
-        elif node.localName=='spacer':
-            if node.hasAttribute('width'):
-                width = utils.unit_get(node.getAttribute('width'))
-            else:
-                width = utils.unit_get('1cm')
-            length = utils.unit_get(node.getAttribute('length'))
-            return platypus.Spacer(width=width, height=length)
-        elif node.localName=='pageBreak':
-            return platypus.PageBreak()
-        elif node.localName=='condPageBreak':
-            return platypus.CondPageBreak(**(utils.attr_get(node, ['height'])))
-        elif node.localName=='setNextTemplate':
-            return platypus.NextPageTemplate(str(node.getAttribute('name')))
-        elif node.localName=='nextFrame':
-            return platypus.CondPageBreak(1000)           # TODO: change the 1000 !
-        elif barcode_codes and node.localName=='barCode':
-            code = barcode_codes.get(node.getAttribute('code'), Code128)
-            return code(
-                        self._textual(node),
-                        **utils.attr_get(node, ['barWidth', 'barHeight'], {'fontName': 'str', 'humanReadable': 'bool'}))
+    def _para(self, node):
+        style = self.styles.para_style_get(node)
+        return platypus.Paragraph(self._textual(node), style, **(utils.attr_get(node, [], {'bulletText':'str'})))
+    def _name(self, node):
+        self.styles.names[ node.getAttribute('id')] = node.getAttribute('value')
+        return None
+    def _xpre(self, node):
+        style = self.styles.para_style_get(node)
+        return platypus.XPreformatted(self._textual(node), style, **(utils.attr_get(node, [], {'bulletText':'str','dedent':'int','frags':'int'})))
+    def _pre(self, node):
+        style = self.styles.para_style_get(node)
+        return platypus.Preformatted(self._textual(node), style, **(utils.attr_get(node, [], {'bulletText':'str','dedent':'int'})))
+    def _sample_para(self, node, style_name):
+        styles = reportlab.lib.styles.getSampleStyleSheet()
+        style = styles[style_name]
+        return platypus.Paragraph(self._textual(node), style, **(utils.attr_get(node, [], {'bulletText':'str'})))
+    def _image(self, node):
+        return platypus.Image(node.getAttribute('file'), mask=(250,255,250,255,250,255), **(utils.attr_get(node, ['width','height'])))
+    def _spacer(self, node):
+        if node.hasAttribute('width'):
+            width = utils.unit_get(node.getAttribute('width'))
         else:
+            width = utils.unit_get('1cm')
+        length = utils.unit_get(node.getAttribute('length'))
+        return platypus.Spacer(width=width, height=length)
+    def _barcode(self, node):
+        code = barcode_codes.get(node.getAttribute('code'), Code128)
+        return code(
+                    self._textual(node),
+                    **utils.attr_get(node, ['barWidth', 'barHeight'], {'fontName': 'str', 'humanReadable': 'bool'}))
+
+    # tag -> method, built once for the class
+    tags = {
+        'para': _para,
+        'name': _name,
+        'xpre': _xpre,
+        'pre': _pre,
+        'illustration': _illustration,
+        'blockTable': _table,
+        'title': lambda self, node: self._sample_para(node, 'Title'),
+        'h1': lambda self, node: self._sample_para(node, 'Heading1'),
+        'h2': lambda self, node: self._sample_para(node, 'Heading2'),
+        'h3': lambda self, node: self._sample_para(node, 'Heading3'),
+        'image': _image,
+        'spacer': _spacer,
+        'pageBreak': lambda self, node: platypus.PageBreak(),
+        'condPageBreak': lambda self, node: platypus.CondPageBreak(**(utils.attr_get(node, ['height']))),
+        'setNextTemplate': lambda self, node: platypus.NextPageTemplate(str(node.getAttribute('name'))),
+        'nextFrame': lambda self, node: platypus.CondPageBreak(1000),           # TODO: change the 1000 !
+    }
+    if barcode_codes:
+        tags['barCode'] = _barcode
+
+    def _flowable(self, node):
+        op = self.tags.get(node.localName)
+        if op is None:
             sys.stderr.write('Warning: flowable not yet implemented: %s !\n' % (node.localName,))
             return None
+        return op(self, node)
 
     def render(self, node_story):
         story = []
@@ -526,41 +700,49 @@ class _rml_flowable(object):
             node = node.nextSibling
         return story
 
+    def iter_render(self, nodes):
+        for node in nodes:
+            flow = self._flowable(node)
+            if flow:
+                yield flow
+
 class _rml_template(object):
-    def __init__(self, out, node, doc):
+    def __init__(self, node):
+        # only the attributes are parsed here: frames and page templates keep
+        # their layout state while a document is built, so render() creates
+        # new ones for each document
         if not node.hasAttribute('pageSize'):
             pageSize = (utils.unit_get('21cm'), utils.unit_get('29.7cm'))
         else:
             ps = [x.strip() for x in node.getAttribute('pageSize').replace(')', '').replace('(', '').split(',')]
             pageSize = ( utils.unit_get(ps[0]),utils.unit_get(ps[1]) )
-        cm = reportlab.lib.units.cm
-        self.doc_tmpl = platypus.BaseDocTemplate(out, pagesize=pageSize, **utils.attr_get(node, ['leftMargin','rightMargin','topMargin','bottomMargin'], {'allowSplitting':'int','showBoundary':'bool','title':'str','author':'str'}))
+        self.pageSize = pageSize
+        self.doc_args = utils.attr_get(node, ['leftMargin','rightMargin','topMargin','bottomMargin'], {'allowSplitting':'int','showBoundary':'bool','title':'str','author':'str'})
         self.page_templates = []
-        self.styles = doc.styles
-        self.doc = doc
         pts = node.getElementsByTagName('pageTemplate')
         for pt in pts:
             frames = []
             for frame_el in pt.getElementsByTagName('frame'):
-                frame = platypus.Frame( **(utils.attr_get(frame_el, ['x1','y1', 'width','height', 'leftPadding', 'rightPadding', 'bottomPadding', 'topPadding'], {'id':'text', 'showBoundary':'bool'})) )
-                frames.append( frame )
+                frames.append( utils.attr_get(frame_el, ['x1','y1', 'width','height', 'leftPadding', 'rightPadding', 'bottomPadding', 'topPadding'], {'id':'text', 'showBoundary':'bool'}) )
             gr = pt.getElementsByTagName('pageGraphics')
-            if len(gr):
-                drw = _rml_draw(gr[0], self.doc)
-                self.page_templates.append( platypus.PageTemplate(frames=frames, onPage=drw.render, **utils.attr_get(pt, [], {'id':'str'}) ))
+            self.page_templates.append( (frames, gr and gr[0] or None, utils.attr_get(pt, [], {'id':'str'})) )
+
+    def render(self, out, doc, story):
+        doc_tmpl = platypus.BaseDocTemplate(out, pagesize=self.pageSize, **self.doc_args)
+        page_templates = []
+        for frames, gr, args in self.page_templates:
+            frames = [platypus.Frame(**frame) for frame in frames]
+            if gr:
+                drw = _rml_draw(gr, doc)
+                page_templates.append( platypus.PageTemplate(frames=frames, onPage=drw.render, **args) )
             else:
-                self.page_templates.append( platypus.PageTemplate(frames=frames, **utils.attr_get(pt, [], {'id':'str'}) ))
-        self.doc_tmpl.addPageTemplates(self.page_templates)
-
-    def render(self, node_story):
-        r = _rml_flowable(self.doc)
-        fis = r.render(node_story)
-        self.doc_tmpl.build(fis)
+                page_templates.append( platypus.PageTemplate(frames=frames, **args) )
+        doc_tmpl.addPageTemplates(page_templates)
+        doc_tmpl.build(story)
 
-def parseString(data, fout=None):
-    r = _rml_doc(data)
+def _render_doc(r, fout=None):
     if fout:
-        fp = file(fout,'wb')
+        fp = open(fout,'wb')
         r.render(fp)
         fp.close()
         return fout
@@ -569,16 +751,142 @@ def parseString(data, fout=None):
         r.render(fp)
         return fp.getvalue()
 
-def trml2pdf_help():
-    print('Usage: trml2pdf input.rml >output.pdf')
-    print('Render the standard input (RML) and output a PDF file')
-    sys.exit(0)
+def parseString(data, fout=None):
+    return _render_doc(_rml_doc(data), fout)
+
+def parseFile(stream, fout=None):
+    """Like parseString, reading the RML from a file object as the PDF is built."""
+    return _render_doc(_rml_doc(stream), fout)
+
+#
+# Compiled templates, by the hash of the RML content
+#
+cache_size = 32
+_compiled_cache = OrderedDict()
+_compiled_lock = threading.Lock()
+
+def compileString(data):
+    """
+    Parse the <docinit>, <stylesheet> and <template> of a RML document once.
+
+    The result is cached by the hash of data; its render(story, fout=None)
+    method returns the PDF like parseString, for a story given as a RML
+    document or a bare <story> element.
+    """
+    key = hashlib.sha1(data.encode(encoding) if isinstance(data, str) else data).hexdigest()
+    with _compiled_lock:
+        compiled = _compiled_cache.get(key)
+        if compiled is not None:
+            _compiled_cache.move_to_end(key)
+            return compiled
+    # only the elements before the <story> are read
+    compiled = _rml_doc(data).compile()
+    with _compiled_lock:
+        _compiled_cache[key] = compiled
+        while len(_compiled_cache) > cache_size:
+            _compiled_cache.popitem(last=False)
+    return compiled
+
+#
+# Bulk rendering on a pool of processes
+#
+_worker_template = None
+
+def _worker_init(template):
+    # runs once in each worker: the template is compiled (and its fonts
+    # registered) before the first document arrives
+    global _worker_template
+    reportlab.lib.styles.getSampleStyleSheet()
+    if template is not None:
+        _worker_template = compileString(template)
+
+def _worker_render(data):
+    try:
+        if _worker_template is not None:
+            return _worker_template.render(data)
+        return parseString(data)
+    except Exception as e:
+        # the exception is sent back to the parent process; some (such as
+        # SAXParseException) cannot be rebuilt there and would break the pool
+        try:
+            pickle.loads(pickle.dumps(e))
+        except Exception:
+            raise RuntimeError('%s: %s' % (type(e).__name__, e))
+        raise
+
+def renderMany(documents, workers=None, template=None, return_exceptions=False):
+    """
+    Render many RML documents on a pool of processes.
+
+    documents is any iterable of RML (bytes or str); it is consumed as the
+    workers progress, never more than two documents per worker ahead. The
+    PDFs are yielded in the order of the documents. With template (a RML
+    with the <stylesheet> and <template>), documents may be bare stories,
+    rendered with the template compiled once in each worker.
+
+    If return_exceptions is true, the exception raised by a document is
+    yielded in place of its PDF instead of stopping the batch.
+    """
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init, initargs=(template,)) as pool:
+        pending = deque()
+
+        def result():
+            future = pending.popleft()
+            try:
+                return future.result()
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                return e
+
+        for data in documents:
+            pending.append(pool.submit(_worker_render, data))
+            if len(pending) >= 2 * workers:
+                yield result()
+        while pending:
+            yield result()
+
+def _read_inputs(paths):
+    for path in paths:
+        with open(path, 'rb') as f:
+            yield f.read()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='trml2pdf',
+        description='Render RML files to PDF. Without files, the standard input (RML) is rendered to the standard output.')
+    parser.add_argument('files', nargs='*', help='RML files, each rendered to a .pdf file')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: number of CPUs)')
+    parser.add_argument('-t', '--template', help='RML with the stylesheet and template shared by all files (the files hold only the story)')
+    parser.add_argument('-o', '--output-dir', help='directory of the PDF files (default: next to each RML file)')
+    args = parser.parse_args(argv)
+
+    template = None
+    if args.template:
+        with open(args.template, 'rb') as f:
+            template = f.read()
+
+    if not args.files:
+        data = sys.stdin.buffer.read()
+        pdf = compileString(template).render(data) if template else parseString(data)
+        sys.stdout.buffer.write(pdf)
+        return 0
+
+    status = 0
+    if args.output_dir and not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    pdfs = renderMany(_read_inputs(args.files), workers=args.jobs, template=template, return_exceptions=True)
+    for path, pdf in zip(args.files, pdfs):
+        if isinstance(pdf, Exception):
+            sys.stderr.write('%s: %s\n' % (path, pdf))
+            status = 1
+            continue
+        fout = os.path.splitext(path)[0] + '.pdf'
+        if args.output_dir:
+            fout = os.path.join(args.output_dir, os.path.basename(fout))
+        with open(fout, 'wb') as f:
+            f.write(pdf)
+    return status
 
 if __name__=="__main__":
-    if len(sys.argv)>1:
-        if sys.argv[1]=='--help':
-            trml2pdf_help()
-        print((parseString(file(sys.argv[1], 'r').read()),))
-    else:
-        print('Usage: trml2pdf input.rml >output.pdf')
-        print('Try \'trml2pdf --help\' for more information.')
+    sys.exit(main())
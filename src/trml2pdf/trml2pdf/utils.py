@@ -16,6 +16,7 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 import re
+import functools
 import reportlab
 
 def text_get(node):
@@ -25,19 +26,22 @@ def text_get(node):
 			rc = rc + node.data
 	return rc
 
-units = [
-	(re.compile(r'^(-?[0-9\.]+)\s*in$'), reportlab.lib.units.inch),
-	(re.compile(r'^(-?[0-9\.]+)\s*cm$'), reportlab.lib.units.cm),  
-	(re.compile(r'^(-?[0-9\.]+)\s*mm$'), reportlab.lib.units.mm),
-	(re.compile(r'^(-?[0-9\.]+)\s*$'), 1)
-]
+units = {
+	'in': reportlab.lib.units.inch,
+	'cm': reportlab.lib.units.cm,
+	'mm': reportlab.lib.units.mm,
+	'': 1
+}
 
+regex_unit = re.compile(r'^(-?[0-9\.]+)\s*(in|cm|mm|)$')
+
+# the same few sizes are repeated all over a document (table cells,
+# paddings, page graphics drawn on every page): parse each one once
+@functools.lru_cache(maxsize=1024)
 def unit_get(size):
-	global units
-	for unit in units:
-		res = unit[0].search(size, 0)
-		if res:
-			return unit[1]*float(res.group(1))
+	res = regex_unit.search(size, 0)
+	if res:
+		return units[res.group(2)]*float(res.group(1))
 	return False
 
 def tuple_int_get(node, attr_name, default=None):
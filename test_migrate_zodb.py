@@ -0,0 +1,187 @@
+"""
+Testes da troca do conteúdo de Files/Images por blobs na migração sem
+histórico (DescarregadorBlobs, em migrate_zodb.py).
+
+Os registros são gerados pelo próprio ZODB a partir de objetos do OFS,
+como no sapl_documentos.fs. Rodar no ambiente do buildout:
+    bin/zopepy -m pytest test_migrate_zodb.py
+"""
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import transaction
+from ZODB.DB import DB
+from ZODB.FileStorage import FileStorage
+from ZODB.Connection import TransactionMetaData
+from ZODB.utils import z64, u64
+from OFS.Image import File
+
+import migrate_zodb
+from migrate_zodb import DescarregadorBlobs, ler_estado, trecho_do_atributo, ReferenciaPersistente
+
+# Acima do limiar: o OFS guarda em cadeia de Pdata (pedaços de 64 KB)
+CONTEUDO = bytes(range(256)) * 1300
+LIMIAR = 256 * 1024
+
+
+class DescarregadorBlobsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fs_caminho = os.path.join(self.dir, 'sapl_documentos.fs')
+        self.blob_dir = os.path.join(self.dir, 'blobs')
+
+    def tearDown(self):
+        transaction.abort()
+        shutil.rmtree(self.dir)
+
+    def _gravar(self, preparar):
+        """Grava um File na raiz; preparar(file) define o conteúdo. Retorna o oid"""
+        db = DB(FileStorage(self.fs_caminho))
+        try:
+            conn = db.open()
+            file = File('documento', '', b'')
+            conn.root()['documento'] = file
+            transaction.commit()
+            preparar(file)
+            transaction.commit()
+            oid = file._p_oid
+            conn.close()
+        finally:
+            db.close()
+        return oid
+
+    def _com_cadeia(self, file):
+        # _read_data do OFS: com _p_jar, o conteúdo vira uma cadeia de Pdata
+        file.data, file.size = file._read_data(CONTEUDO)
+
+    def _descarregar(self, oid, limiar=LIMIAR):
+        source = FileStorage(self.fs_caminho, read_only=True)
+        self.addCleanup(source.close)
+        descarregador = DescarregadorBlobs(source, self.blob_dir, limiar)
+        data, tid = source.load(oid)
+        proximo_oid = descarregador.proximo_oid
+        registros = descarregador.descarregar(oid, tid, data, {z64})
+        return source, descarregador, data, registros, proximo_oid
+
+    def _arquivos_blob(self):
+        return [nome for _, _, nomes in os.walk(self.blob_dir)
+                for nome in nomes if nome.endswith('.blob')]
+
+    def test_trecho_do_atributo_cadeia_de_pdata(self):
+        oid = self._gravar(self._com_cadeia)
+        source = FileStorage(self.fs_caminho, read_only=True)
+        self.addCleanup(source.close)
+        data, _ = source.load(oid)
+        inicio, fim = trecho_do_atributo(data, 'data')
+        # O trecho é a referência persistente ao primeiro Pdata da cadeia
+        self.assertIn(ler_estado(data)['data'].oid, data[inicio:fim])
+        self.assertEqual(data[fim - 1:fim], b'Q')
+
+    def test_estado_trocado_aponta_para_o_novo_oid(self):
+        oid = self._gravar(self._com_cadeia)
+        source, descarregador, data, registros, proximo_oid = self._descarregar(oid)
+
+        self.assertEqual(len(registros), 3)
+        (oid_file, _, novo), (pdata_oid, _, pdata), (blob_oid, tid, registro_blob) = registros
+        self.assertEqual(oid_file, oid)
+        self.assertEqual(u64(blob_oid), proximo_oid)
+        self.assertEqual(u64(pdata_oid), proximo_oid + 1)
+
+        antes, depois = ler_estado(data), ler_estado(novo)
+        self.assertEqual(set(depois), set(antes))
+        self.assertIsInstance(depois['data'], ReferenciaPersistente)
+        self.assertEqual(depois['data'].oid, pdata_oid)
+        self.assertEqual(depois['data'].ref[1].__module__, 'Products.CMFDefault.BlobPdata')
+        for nome in set(antes) - {'data'}:
+            self.assertEqual(repr(depois[nome]), repr(antes[nome]))
+
+        self.assertEqual(ler_estado(pdata)['blob'].oid, blob_oid)
+        with open(descarregador.blobs.getBlobFilename(blob_oid, tid), 'rb') as arquivo:
+            self.assertEqual(arquivo.read(), CONTEUDO)
+        self.assertEqual(descarregador.descarregados, 1)
+        self.assertGreater(descarregador.pdatas_substituidos, 1)
+
+    def test_file_trocado_carrega_do_blob(self):
+        oid = self._gravar(self._com_cadeia)
+        source, descarregador, _, registros, _ = self._descarregar(oid)
+        raiz, _ = source.load(z64)
+
+        # Restaura raiz + File trocado + BlobPdata + Blob, como o destino da migração
+        destino = FileStorage(os.path.join(self.dir, 'destino.fs'),
+                              blob_dir=os.path.join(self.dir, 'destino_blobs'))
+        tid = registros[0][1]
+        txn = TransactionMetaData()
+        destino.tpc_begin(txn, tid)
+        destino.restore(z64, tid, raiz, '', None, txn)
+        for oid_registro, tid_registro, data_registro in registros:
+            if data_registro == migrate_zodb.REGISTRO_BLOB:
+                nome_blob = descarregador.blobs.getBlobFilename(oid_registro, tid_registro)
+                destino.restoreBlob(oid_registro, tid, data_registro, nome_blob, None, txn)
+            else:
+                destino.restore(oid_registro, tid, data_registro, '', None, txn)
+        destino.tpc_vote(txn)
+        destino.tpc_finish(txn)
+
+        db = DB(destino)
+        try:
+            conn = db.open()
+            file = conn.root()['documento']
+            self.assertEqual(type(file.data).__name__, 'BlobPdata')
+            self.assertEqual(file.data._p_oid, registros[1][0])
+            self.assertEqual(bytes(file.data), CONTEUDO)
+            self.assertEqual(file.size, len(CONTEUDO))
+            conn.close()
+        finally:
+            db.close()
+
+    def test_memoize_mantem_o_registro(self):
+        oid = self._gravar(self._com_cadeia)
+        source = FileStorage(self.fs_caminho, read_only=True)
+        self.addCleanup(source.close)
+        data, tid = source.load(oid)
+        # Registro de um File em pickle protocolo 4 (com MEMOIZE)
+        data = pickle.dumps((File, None), 4) + pickle.dumps(
+            {'data': CONTEUDO, 'size': len(CONTEUDO), 'title': ''}, 4)
+        self.assertIsNone(trecho_do_atributo(data, 'data'))
+
+        descarregador = DescarregadorBlobs(source, self.blob_dir, LIMIAR)
+        proximo_oid = descarregador.proximo_oid
+        self.assertIsNone(descarregador.descarregar(oid, tid, data, {z64}))
+        self.assertEqual(descarregador.ignorados, 1)
+        self.assertEqual(descarregador.proximo_oid, proximo_oid)
+        self.assertEqual(self._arquivos_blob(), [])
+
+    def test_conteudo_abaixo_do_limiar_desfaz(self):
+        # 'size' informa mais do que a cadeia realmente guarda
+        def preparar(file):
+            self._com_cadeia(file)
+            file.size = LIMIAR
+        oid = self._gravar(preparar)
+        _, descarregador, _, registros, proximo_oid = self._descarregar(oid, limiar=len(CONTEUDO) + 1)
+        self.assertIsNone(registros)
+        self.assertEqual(descarregador.proximo_oid, proximo_oid)
+        self.assertEqual(descarregador.ignorados, 0)
+        self.assertEqual(descarregador.descarregados, 0)
+        self.assertEqual(self._arquivos_blob(), [])
+
+    def test_memo_do_trecho_removido_mantem_o_registro(self):
+        # 'data' e 'conteudo_original' são o mesmo bytes: o segundo vira BINGET
+        # de um memo definido no trecho removido
+        def preparar(file):
+            file.data = CONTEUDO
+            file.size = len(CONTEUDO)
+            file.conteudo_original = CONTEUDO
+        oid = self._gravar(preparar)
+        _, descarregador, _, registros, proximo_oid = self._descarregar(oid)
+        self.assertIsNone(registros)
+        self.assertEqual(descarregador.ignorados, 1)
+        self.assertEqual(descarregador.proximo_oid, proximo_oid)
+        self.assertEqual(self._arquivos_blob(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()